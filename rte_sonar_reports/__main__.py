@@ -3,14 +3,77 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import argparse
+import collections
 import configparser
 import logging
 import os.path
+import sys
 
-from rte_sonar_reports import pdf
+from rte_sonar_reports import formats
+from rte_sonar_reports.cache import ResponseCache, ModuleSnapshotStore, MetricHistoryStore, DEFAULT_TTL, DEFAULT_MAX_SIZE
+from rte_sonar_reports.checks import check_prescription
 from rte_sonar_reports.loaders import ApplicationLoader
+from rte_sonar_reports.prescription_validator import PrescriptionStatus, current_datetime_in_paris_timezone, \
+    report_generation_datetime
+from rte_sonar_reports.rendering import render_reports, DEFAULT_RENDER_WORKERS
+from rte_sonar_reports.service import serve, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_WORKERS, DEFAULT_QUEUE_SIZE, \
+    SERVICE_BRANCH_CACHE_TTL
 
 LOGGER = logging.getLogger(__name__)
+APPLICATION_FILE_EXTENSIONS = (".yml", ".yaml")
+CHECK_EXIT_CODES = {
+    PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED: 0,
+    PrescriptionStatus.ONLY_CURRENT_CRITERIA_VALIDATED: 10,
+    PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED: 20
+}
+CHECK_ERROR_EXIT_CODE = 3
+
+
+def get_batch_application_files(batch_path):
+    if os.path.isdir(batch_path):
+        return [os.path.join(batch_path, file_name) for file_name in sorted(os.listdir(batch_path))
+                if file_name.endswith(APPLICATION_FILE_EXTENSIONS)]
+    with open(batch_path) as manifest:
+        return [os.path.join(os.path.dirname(batch_path), line.strip()) for line in manifest
+                if line.strip() and not line.strip().startswith("#")]
+
+
+def get_batch_output_file(output_directory_path, application_file_path, report_format=formats.PDF_FORMAT):
+    return os.path.join(output_directory_path, os.path.splitext(os.path.basename(application_file_path))[0]
+                        + formats.REPORT_FORMAT_EXTENSIONS[report_format])
+
+
+def get_conflicting_batch_application_files(application_file_paths):
+    application_files_by_output_name = collections.defaultdict(list)
+    for application_file_path in application_file_paths:
+        application_files_by_output_name[os.path.splitext(os.path.basename(application_file_path))[0]].append(application_file_path)
+    return [application_files for application_files in application_files_by_output_name.values() if len(application_files) > 1]
+
+
+def parse_report_formats(report_formats):
+    parsed_report_formats = list(dict.fromkeys(report_format.strip().lower() for report_format in report_formats.split(",")))
+    unknown_report_formats = [report_format for report_format in parsed_report_formats
+                              if report_format not in formats.REPORT_FORMAT_EXTENSIONS]
+    if unknown_report_formats:
+        raise argparse.ArgumentTypeError(f"unknown report formats {', '.join(unknown_report_formats)}, "
+                                         f"expected a comma separated list of {', '.join(formats.REPORT_FORMAT_EXTENSIONS)}")
+    return parsed_report_formats
+
+
+def check(application_loader, application_file_path):
+    try:
+        with open(application_file_path) as application_file:
+            prescription_status, failing_criterias = check_prescription(application_loader, application_file.read(),
+                                                                        current_datetime_in_paris_timezone())
+    except Exception:
+        LOGGER.exception(f"Prescription status of application described in file '{application_file_path}' could not be checked")
+        return CHECK_ERROR_EXIT_CODE
+    finally:
+        application_loader.close()
+    print(formats.PRESCRIPTION_STATUS_MESSAGE[prescription_status])
+    for criteria in failing_criterias:
+        print(f"- {criteria.label} : non validé (applicable à partir du {criteria.criteria_start_date.date()})")
+    return CHECK_EXIT_CODES[prescription_status]
 
 
 def main():
@@ -20,23 +83,105 @@ def main():
         description="""Generate PDF reports used as requirements for deployment
         of an application in RTE production environments.""",
     )
-    parser.add_argument("-a", "--application", required=True, help="Application description YAML file")
+    applications_group = parser.add_mutually_exclusive_group(required=True)
+    applications_group.add_argument("-a", "--application", help="Application description YAML file")
+    applications_group.add_argument("-b", "--batch",
+                                    help="Directory of application description YAML files, or manifest file listing them one per line")
+    applications_group.add_argument("--serve", action="store_true",
+                                    help="Serve reports of application descriptions posted to a local HTTP API")
     parser.add_argument("-c", "--config", required=True, help="Sonar server configuration INI file")
-    parser.add_argument("-o", "--output", required=True, help="Output PDF file")
+    parser.add_argument("--check", action="store_true",
+                        help="Only compute the prescription status of the application, exiting with 0 when all criteria are "
+                             "validated, 10 when only current criteria are validated, 20 otherwise and 3 when the check fails")
+    parser.add_argument("-o", "--output", help="Output report file, or output directory in batch mode")
+    parser.add_argument("-f", "--format", type=parse_report_formats, default=[formats.PDF_FORMAT],
+                        help=f"Comma separated list of report formats among {', '.join(formats.REPORT_FORMAT_EXTENSIONS)}. "
+                             f"Defaults to pdf. With several formats, the output file extension is replaced by each format one")
+    parser.add_argument("--force", action="store_true",
+                        help="Generate reports even when their fingerprint shows that their Sonar indicators are unchanged")
+    parser.add_argument("--cache", help="SQLite file used to cache Sonar responses between runs")
+    parser.add_argument("--cache-ttl", type=int, default=DEFAULT_TTL,
+                        help="Duration in seconds during which cached Sonar responses are used without revalidation")
+    parser.add_argument("--cache-max-size", type=int, default=DEFAULT_MAX_SIZE // (1024 * 1024),
+                        help="Maximum size in MB of cached Sonar responses, least recently used ones being evicted first")
+    parser.add_argument("--snapshots",
+                        help="SQLite file storing module indicators, reused as long as modules are not analysed again by Sonar")
+    parser.add_argument("--history",
+                        help="SQLite file storing the measures history of modules, only new analyses being retrieved on each run, "
+                             "and adding a trends section to PDF reports")
+    parser.add_argument("--render-workers", type=int, default=DEFAULT_RENDER_WORKERS,
+                        help="Number of processes rendering reports in parallel in batch mode. Defaults to the number of CPUs")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Address listened to in serve mode")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port listened to in serve mode")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of reports generated simultaneously in serve mode")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Number of report requests waiting for a worker in serve mode before new ones are rejected")
     args = parser.parse_args()
+    if args.check and not args.application:
+        parser.error("argument --check: only allowed with argument -a/--application")
+    if not args.serve and not args.check and not args.output:
+        parser.error("the following arguments are required: -o/--output")
 
-    application_file_path = os.path.abspath(args.application)
     config_file_path = os.path.abspath(args.config)
-    output_file_path = os.path.abspath(args.output)
+    output_file_path = os.path.abspath(args.output) if args.output else None
 
-    LOGGER.info(f"Generating Sonar report based on application description file '{application_file_path}'")
+    if args.serve:
+        application_file_paths = []
+        LOGGER.info(f"Sonar reports will be served on http://{args.host}:{args.port}")
+    elif args.batch:
+        application_file_paths = [os.path.abspath(file_path) for file_path in get_batch_application_files(os.path.abspath(args.batch))]
+        conflicting_application_files = get_conflicting_batch_application_files(application_file_paths)
+        if conflicting_application_files:
+            parser.error("argument -b/--batch: application description files would overwrite each other's reports: "
+                         + "; ".join(", ".join(application_files) for application_files in conflicting_application_files))
+        LOGGER.info(f"Generating Sonar reports of {len(application_file_paths)} applications listed in '{os.path.abspath(args.batch)}'")
+        LOGGER.info(f"Output reports will be exported in directory '{output_file_path}'")
+    elif args.check:
+        application_file_paths = [os.path.abspath(args.application)]
+        LOGGER.info(f"Checking prescription status of application described in file '{application_file_paths[0]}'")
+    else:
+        application_file_paths = [os.path.abspath(args.application)]
+        LOGGER.info(f"Generating Sonar report based on application description file '{application_file_paths[0]}'")
+        LOGGER.info(f"Output report will be exported in file '{output_file_path}'")
     LOGGER.info(f"Sonar configuration used define in file '{config_file_path}'")
-    LOGGER.info(f"Output report will be exported in file '{output_file_path}'")
 
     sonar_configs = configparser.ConfigParser()
     sonar_configs.read(config_file_path)
-    application = ApplicationLoader(sonar_configs).load_file(application_file_path)
-    pdf.export(output_file_path, application)
+    response_cache = None
+    if args.cache:
+        LOGGER.info(f"Sonar responses cached in file '{os.path.abspath(args.cache)}'")
+        response_cache = ResponseCache(os.path.abspath(args.cache), ttl=args.cache_ttl,
+                                       max_size=args.cache_max_size * 1024 * 1024)
+    snapshot_store = None
+    if args.snapshots:
+        LOGGER.info(f"Module indicators snapshots stored in file '{os.path.abspath(args.snapshots)}'")
+        snapshot_store = ModuleSnapshotStore(os.path.abspath(args.snapshots))
+    history_store = None
+    if args.history:
+        LOGGER.info(f"Module measures history stored in file '{os.path.abspath(args.history)}'")
+        history_store = MetricHistoryStore(os.path.abspath(args.history))
+    if args.serve:
+        serve(ApplicationLoader(sonar_configs, branch_cache_ttl=SERVICE_BRANCH_CACHE_TTL, response_cache=response_cache,
+                                snapshot_store=snapshot_store, history_store=history_store),
+              args.host, args.port, args.workers, args.queue_size)
+        return
+    if args.check:
+        sys.exit(check(ApplicationLoader(sonar_configs, response_cache=response_cache), application_file_paths[0]))
+    applications = ApplicationLoader(sonar_configs, response_cache=response_cache, snapshot_store=snapshot_store,
+                                     history_store=history_store) \
+        .load_files(application_file_paths)
+    generation_date = report_generation_datetime()
+    if not args.batch:
+        for report_format in args.format:
+            formats.export(formats.get_output_path(output_file_path, report_format), applications[0], report_format, generation_date,
+                           args.force)
+        return
+    os.makedirs(output_file_path, exist_ok=True)
+    render_reports([(get_batch_output_file(output_file_path, application_file_path, report_format), application, report_format)
+                    for application_file_path, application in zip(application_file_paths, applications)
+                    for report_format in args.format],
+                   generation_date, args.render_workers, args.force)
 
 
 if __name__ == '__main__':
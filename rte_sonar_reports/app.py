@@ -2,6 +2,7 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import functools
 from enum import Enum
 from ordered_enum import OrderedEnum
 
@@ -15,6 +16,36 @@ def calculate_coverage_in_percent(lines_to_cover, uncovered_lines, conditions_to
     return round(100 * calculated_coverage_in_pu, 1)
 
 
+def calculate_coverage_in_percent_or_none(lines_to_cover, uncovered_lines, conditions_to_cover, uncovered_conditions):
+    if lines_to_cover + conditions_to_cover == 0:
+        return None
+    return calculate_coverage_in_percent(lines_to_cover, uncovered_lines, conditions_to_cover, uncovered_conditions)
+
+
+def memoized_aggregate(method):
+    @functools.wraps(method)
+    def memoized_method(self):
+        if method.__name__ not in self.aggregates:
+            self.aggregates[method.__name__] = method(self)
+        return self.aggregates[method.__name__]
+    return memoized_method
+
+
+class MemoizedAggregates:
+    __slots__ = ("aggregates",)
+
+    def __init__(self):
+        object.__setattr__(self, "aggregates", {})
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        self.invalidate_aggregates()
+
+    def invalidate_aggregates(self):
+        if self.aggregates:
+            self.aggregates.clear()
+
+
 class Rating(OrderedEnum):
     NOT_CALCULATED = 0
     A = 1
@@ -24,37 +55,52 @@ class Rating(OrderedEnum):
     E = 5
 
 
-class Application:
+class Application(MemoizedAggregates):
+    __slots__ = ("name", "version", "modules")
+
     def __init__(self, name, version):
+        super().__init__()
         self.name = name
         self.version = version
-        self.modules = []
+        self.modules = ()
+
+    @staticmethod
+    def from_dict(application_dict):
+        app = Application(application_dict["name"], application_dict["version"])
+        for module_dict in application_dict["modules"]:
+            app.add_module(Module.from_dict(module_dict))
+        return app
+
+    def to_dict(self):
+        return {"name": self.name, "version": self.version, "modules": [module.to_dict() for module in self.modules]}
 
     def add_module(self, module):
-        self.modules.append(module)
+        module.application = self
+        self.modules += (module,)
 
+    @memoized_aggregate
     def worst_non_dependency_security_rating(self):
         return max([module.non_dependency_security_rating() for module in self.modules])
 
+    @memoized_aggregate
     def worst_dependency_security_rating(self):
         return max([module.dependency_security_rating() for module in self.modules])
 
+    @memoized_aggregate
     def worst_maintainability_rating(self):
         return max([module.maintainability_rating for module in self.modules])
 
+    @memoized_aggregate
     def aggregated_backend_coverage(self):
         backend_modules = [module for module in self.modules if module.module_type == Module.Type.BACKEND]
         lines_to_cover = sum([backend_module.lines_to_cover for backend_module in backend_modules])
         uncovered_lines = sum([backend_module.uncovered_lines for backend_module in backend_modules])
         conditions_to_cover = sum([backend_module.conditions_to_cover for backend_module in backend_modules])
         uncovered_conditions = sum([backend_module.uncovered_conditions for backend_module in backend_modules])
-        if lines_to_cover + conditions_to_cover == 0:
-            return None
-        return calculate_coverage_in_percent(lines_to_cover, uncovered_lines, conditions_to_cover, uncovered_conditions)
+        return calculate_coverage_in_percent_or_none(lines_to_cover, uncovered_lines, conditions_to_cover, uncovered_conditions)
 
 
-def rating_from_vulnerability(vulnerability):
-    severity = vulnerability[ISSUES_SEVERITY_KEY]
+def rating_from_severity(severity):
     if severity == "INFO":
         return Rating.A
     elif severity == "MINOR":
@@ -69,7 +115,60 @@ def rating_from_vulnerability(vulnerability):
         return Rating.A
 
 
-class Module:
+def rating_from_vulnerability(vulnerability):
+    return rating_from_severity(vulnerability[ISSUES_SEVERITY_KEY])
+
+
+def worst_rating_from_severity_counts(severity_counts):
+    ratings = [rating_from_severity(severity) for severity, count in severity_counts.items() if count > 0]
+    if not ratings:
+        return Rating.A
+    return max(ratings)
+
+
+class VulnerabilitySummary:
+
+    def __init__(self, dependency_severity_counts=None, non_dependency_severity_counts=None):
+        self.dependency_severity_counts = dict(dependency_severity_counts) if dependency_severity_counts else {}
+        self.non_dependency_severity_counts = dict(non_dependency_severity_counts) if non_dependency_severity_counts else {}
+
+    @staticmethod
+    def from_vulnerabilities(vulnerabilities):
+        summary = VulnerabilitySummary()
+        summary.add_vulnerabilities(vulnerabilities)
+        return summary
+
+    @staticmethod
+    def from_dict(summary_dict):
+        return VulnerabilitySummary(summary_dict["dependency_severity_counts"], summary_dict["non_dependency_severity_counts"])
+
+    def to_dict(self):
+        return {"dependency_severity_counts": dict(self.dependency_severity_counts),
+                "non_dependency_severity_counts": dict(self.non_dependency_severity_counts)}
+
+    def add_vulnerability(self, vulnerability):
+        if vulnerability[ISSUES_RULE_KEY] == DEPENDENCY_VULNERABILITY_RULE:
+            severity_counts = self.dependency_severity_counts
+        else:
+            severity_counts = self.non_dependency_severity_counts
+        severity = vulnerability[ISSUES_SEVERITY_KEY]
+        severity_counts[severity] = severity_counts.get(severity, 0) + 1
+
+    def add_vulnerabilities(self, vulnerabilities):
+        for vulnerability in vulnerabilities:
+            self.add_vulnerability(vulnerability)
+
+    def non_dependency_security_rating(self):
+        return worst_rating_from_severity_counts(self.non_dependency_severity_counts)
+
+    def dependency_security_rating(self):
+        return worst_rating_from_severity_counts(self.dependency_severity_counts)
+
+
+class Module(MemoizedAggregates):
+    __slots__ = ("module_type", "name", "branch_name", "coverage", "maintainability_rating", "lines_to_cover",
+                 "uncovered_lines", "conditions_to_cover", "uncovered_conditions", "vulnerabilities",
+                 "vulnerability_summary", "history", "application")
 
     class Type(Enum):
         BACKEND = 0
@@ -83,7 +182,11 @@ class Module:
                  uncovered_lines=0,
                  conditions_to_cover=0,
                  uncovered_conditions=0,
-                 vulnerabilities=None):
+                 vulnerabilities=None,
+                 vulnerability_summary=None,
+                 history=None):
+        super().__init__()
+        object.__setattr__(self, "application", None)
         self.module_type = module_type
         self.name = name
         self.branch_name = branch_name
@@ -94,8 +197,39 @@ class Module:
         self.conditions_to_cover = conditions_to_cover
         self.uncovered_conditions = uncovered_conditions
         self.vulnerabilities = vulnerabilities
+        self.vulnerability_summary = vulnerability_summary
+        self.history = history
+
+    @staticmethod
+    def from_dict(module_dict):
+        vulnerability_summary = module_dict["vulnerability_summary"]
+        return Module(module_dict["name"], branch_name=module_dict["branch_name"], module_type=Module.Type[module_dict["module_type"]],
+                      coverage=module_dict["coverage"], maintainability_rating=Rating[module_dict["maintainability_rating"]],
+                      lines_to_cover=module_dict["lines_to_cover"], uncovered_lines=module_dict["uncovered_lines"],
+                      conditions_to_cover=module_dict["conditions_to_cover"], uncovered_conditions=module_dict["uncovered_conditions"],
+                      vulnerability_summary=VulnerabilitySummary.from_dict(vulnerability_summary) if vulnerability_summary else None,
+                      history=module_dict["history"])
+
+    def to_dict(self):
+        vulnerability_summary = self.vulnerability_summary
+        if vulnerability_summary is None and self.vulnerabilities is not None:
+            vulnerability_summary = VulnerabilitySummary.from_vulnerabilities(self.vulnerabilities)
+        return {"name": self.name, "branch_name": self.branch_name, "module_type": self.module_type.name,
+                "coverage": self.coverage, "maintainability_rating": self.maintainability_rating.name,
+                "lines_to_cover": self.lines_to_cover, "uncovered_lines": self.uncovered_lines,
+                "conditions_to_cover": self.conditions_to_cover, "uncovered_conditions": self.uncovered_conditions,
+                "vulnerability_summary": vulnerability_summary.to_dict() if vulnerability_summary else None,
+                "history": self.history}
+
+    def invalidate_aggregates(self):
+        super().invalidate_aggregates()
+        if self.application is not None:
+            self.application.invalidate_aggregates()
 
+    @memoized_aggregate
     def non_dependency_security_rating(self):
+        if self.vulnerability_summary is not None:
+            return self.vulnerability_summary.non_dependency_security_rating()
         if self.vulnerabilities is None:
             return Rating.NOT_CALCULATED
         non_dependency_vulnerabilities_rating = [rating_from_vulnerability(vulnerability) for vulnerability in self.vulnerabilities if
@@ -104,7 +238,10 @@ class Module:
             return Rating.A
         return max(non_dependency_vulnerabilities_rating)
 
+    @memoized_aggregate
     def dependency_security_rating(self):
+        if self.vulnerability_summary is not None:
+            return self.vulnerability_summary.dependency_security_rating()
         if self.vulnerabilities is None:
             return Rating.NOT_CALCULATED
         dependency_vulnerabilities_rating = [rating_from_vulnerability(vulnerability) for vulnerability in self.vulnerabilities if
@@ -113,7 +250,7 @@ class Module:
             return Rating.A
         return max(dependency_vulnerabilities_rating)
 
+    @memoized_aggregate
     def calculated_coverage(self):
-        if self.lines_to_cover + self.conditions_to_cover == 0:
-            return None
-        return calculate_coverage_in_percent(self.lines_to_cover, self.uncovered_lines, self.conditions_to_cover, self.uncovered_conditions)
\ No newline at end of file
+        return calculate_coverage_in_percent_or_none(self.lines_to_cover, self.uncovered_lines, self.conditions_to_cover,
+                                                     self.uncovered_conditions)
\ No newline at end of file
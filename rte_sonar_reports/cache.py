@@ -0,0 +1,169 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+DEFAULT_TTL = 3600
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class CachedResponse:
+    def __init__(self, body, etag, last_modified, is_fresh):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.is_fresh = is_fresh
+
+    def revalidation_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                         key TEXT PRIMARY KEY,
+                                         body TEXT NOT NULL,
+                                         etag TEXT,
+                                         last_modified TEXT,
+                                         size INTEGER NOT NULL,
+                                         stored_at REAL NOT NULL,
+                                         last_access REAL NOT NULL)""")
+
+    @staticmethod
+    def make_key(server, path, params):
+        serialized_request = json.dumps([server, path, sorted((str(key), str(value)) for key, value in params.items())])
+        return hashlib.sha256(serialized_request.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                                          (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        body, etag, last_modified, stored_at = row
+        return CachedResponse(body, etag, last_modified, self.ttl is None or now - stored_at <= self.ttl)
+
+    def put(self, key, body, etag=None, last_modified=None):
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("""INSERT OR REPLACE INTO responses (key, body, etag, last_modified, size, stored_at, last_access)
+                                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                                    (key, body, etag, last_modified, len(body.encode()), now, now))
+            self.evict()
+
+    def refresh(self, key):
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE responses SET stored_at = ?, last_access = ? WHERE key = ?", (now, now, key))
+
+    def evict(self):
+        evicted = self.connection.execute("""DELETE FROM responses WHERE key IN (
+                                               SELECT key FROM (
+                                                 SELECT key, SUM(size) OVER (ORDER BY last_access DESC, stored_at DESC) AS cumulated_size
+                                                 FROM responses)
+                                               WHERE cumulated_size > ?)""", (self.max_size,)).rowcount
+        if evicted:
+            LOGGER.debug(f"{evicted} least recently used responses evicted from cache '{self.path}'")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class ModuleSnapshotStore:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS module_snapshots (
+                                         server TEXT NOT NULL,
+                                         project_key TEXT NOT NULL,
+                                         branch TEXT NOT NULL,
+                                         analysis_date TEXT NOT NULL,
+                                         snapshot TEXT NOT NULL,
+                                         PRIMARY KEY (server, project_key, branch))""")
+
+    def get(self, server, project_key, branch_name, analysis_date):
+        with self.lock:
+            row = self.connection.execute("""SELECT snapshot FROM module_snapshots
+                                             WHERE server = ? AND project_key = ? AND branch = ? AND analysis_date = ?""",
+                                          (server, project_key, branch_name, analysis_date)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, server, project_key, branch_name, analysis_date, snapshot):
+        with self.lock, self.connection:
+            self.connection.execute("""INSERT OR REPLACE INTO module_snapshots (server, project_key, branch, analysis_date, snapshot)
+                                       VALUES (?, ?, ?, ?, ?)""",
+                                    (server, project_key, branch_name, analysis_date, json.dumps(snapshot)))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class MetricHistoryStore:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS metric_history (
+                                         server TEXT NOT NULL,
+                                         project_key TEXT NOT NULL,
+                                         branch TEXT NOT NULL,
+                                         metric TEXT NOT NULL,
+                                         date TEXT NOT NULL,
+                                         value TEXT NOT NULL,
+                                         PRIMARY KEY (server, project_key, branch, metric, date))""")
+
+    def last_date(self, server, project_key, branch_name):
+        with self.lock:
+            row = self.connection.execute("""SELECT MAX(date) FROM metric_history
+                                             WHERE server = ? AND project_key = ? AND branch = ?""",
+                                          (server, project_key, branch_name)).fetchone()
+        return row[0]
+
+    def add(self, server, project_key, branch_name, points):
+        with self.lock, self.connection:
+            self.connection.executemany("""INSERT OR REPLACE INTO metric_history (server, project_key, branch, metric, date, value)
+                                           VALUES (?, ?, ?, ?, ?, ?)""",
+                                        [(server, project_key, branch_name, metric_key, date, value) for date, metric_key, value in points])
+
+    def get(self, server, project_key, branch_name):
+        with self.lock:
+            rows = self.connection.execute("""SELECT metric, date, value FROM metric_history
+                                              WHERE server = ? AND project_key = ? AND branch = ?
+                                              ORDER BY date""",
+                                           (server, project_key, branch_name)).fetchall()
+        history = {}
+        for metric_key, date, value in rows:
+            history.setdefault(metric_key, []).append([date, value])
+        return history
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
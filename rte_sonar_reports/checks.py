@@ -0,0 +1,87 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from rte_sonar_reports.app import Application, Module
+from rte_sonar_reports.prescription_validator import PrescriptionStatus, get_all_criterias, VULNERABILITIES_REQUIREMENT, \
+    MEASURES_REQUIREMENT, BACKEND_MEASURES_REQUIREMENT
+
+LOGGER = logging.getLogger(__name__)
+
+
+class PrescriptionCheck:
+
+    def __init__(self, application_loader, application_description):
+        self.application_loader = application_loader
+        self.application_description = application_description
+        self.module_descriptions = application_loader.get_module_descriptions(application_description)
+        self.usable_indexes = [index for index, module in enumerate(self.module_descriptions)
+                               if application_loader.is_sonar_config_usable(module)]
+        self.branch_names = dict()
+        self.indicators = dict()
+        self.vulnerability_summaries = dict()
+        self.fulfilled_requirements = set()
+
+    def run(self, date):
+        prescription_status = PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED
+        failing_criterias = []
+        with ThreadPoolExecutor(max_workers=self.application_loader.max_workers) as executor:
+            self.resolve_branch_names(executor)
+            for criteria in sorted(get_all_criterias(), key=lambda criteria: date < criteria.criteria_start_date):
+                for requirement in criteria.requirements:
+                    self.fulfill(executor, requirement)
+                if criteria.is_validated(self.create_application()):
+                    continue
+                failing_criterias.append(criteria)
+                if date >= criteria.criteria_start_date:
+                    return PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED, failing_criterias
+                prescription_status = PrescriptionStatus.ONLY_CURRENT_CRITERIA_VALIDATED
+        return prescription_status, failing_criterias
+
+    def resolve_branch_names(self, executor):
+        usable_modules = [self.module_descriptions[index] for index in self.usable_indexes]
+        self.application_loader.resolve_default_branches(executor, usable_modules)
+        self.branch_names = dict(zip(self.usable_indexes, executor.map(self.application_loader.get_branch_name, usable_modules)))
+
+    def fulfill(self, executor, requirement):
+        if requirement in self.fulfilled_requirements:
+            return
+        LOGGER.info(f"Retrieving Sonar {requirement.replace('_', ' ')} required by prescription criteria")
+        if requirement == VULNERABILITIES_REQUIREMENT:
+            self.fetch_vulnerability_summaries(executor)
+        elif requirement == MEASURES_REQUIREMENT:
+            self.fetch_indicators(executor, self.usable_indexes)
+        elif requirement == BACKEND_MEASURES_REQUIREMENT:
+            self.fetch_indicators(executor, [index for index in self.usable_indexes
+                                             if self.application_loader.get_type(self.module_descriptions[index]) == Module.Type.BACKEND])
+        self.fulfilled_requirements.add(requirement)
+
+    def fetch_indicators(self, executor, indexes):
+        indexes = [index for index in indexes if index not in self.indicators]
+        modules = [self.module_descriptions[index] for index in indexes]
+        default_branch_indicators = self.application_loader.get_default_branch_indicators(executor, modules)
+        self.indicators.update(zip(indexes, executor.map(
+            lambda index: self.application_loader.get_indicators(self.module_descriptions[index], self.branch_names[index],
+                                                                 default_branch_indicators), indexes)))
+
+    def fetch_vulnerability_summaries(self, executor):
+        def get_vulnerability_summary(index):
+            module = self.module_descriptions[index]
+            return self.application_loader.sonar_clients.get(module["sonar_config"]) \
+                .get_non_dependency_vulnerability_summary(module["project_key"], self.branch_names[index])
+        self.vulnerability_summaries.update(zip(self.usable_indexes, executor.map(get_vulnerability_summary, self.usable_indexes)))
+
+    def create_application(self):
+        app = Application(self.application_description["name"], self.application_description["version"])
+        for index, module in enumerate(self.module_descriptions):
+            app.add_module(self.application_loader.create_module(module, self.branch_names.get(index, module.get("branch")),
+                                                                 self.indicators.get(index, dict()), None,
+                                                                 self.vulnerability_summaries.get(index)))
+        return app
+
+
+def check_prescription(application_loader, yaml_content, date):
+    return PrescriptionCheck(application_loader, application_loader.parse(yaml_content)).run(date)
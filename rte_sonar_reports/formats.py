@@ -0,0 +1,258 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import functools
+import hashlib
+import html
+import json
+import logging
+import os.path
+from importlib import metadata
+
+from rte_sonar_reports.app import Rating, Module
+from rte_sonar_reports.prescription_validator import PrescriptionStatus, get_all_criterias, get_all_criterias_plan, \
+    report_generation_datetime
+
+LOGGER = logging.getLogger(__name__)
+PDF_FORMAT = "pdf"
+JSON_FORMAT = "json"
+HTML_FORMAT = "html"
+MARKDOWN_FORMAT = "markdown"
+FINGERPRINT_EXTENSION = ".fingerprint"
+FINGERPRINT_VERSION = 2
+REPORT_FORMAT_EXTENSIONS = {
+    PDF_FORMAT: ".pdf",
+    JSON_FORMAT: ".json",
+    HTML_FORMAT: ".html",
+    MARKDOWN_FORMAT: ".md"
+}
+RATING_COLORS = {
+    Rating.A: "#6cd46c",
+    Rating.B: "#c6e056",
+    Rating.C: "#f4d348",
+    Rating.D: "#f69d53",
+    Rating.E: "#f0878e",
+    Rating.NOT_CALCULATED: "#d3d3d3"
+}
+RATING_MESSAGE = {
+    Rating.A: "A",
+    Rating.B: "B",
+    Rating.C: "C",
+    Rating.D: "D",
+    Rating.E: "E",
+    Rating.NOT_CALCULATED: "N/A"
+}
+MODULE_TYPE_NAMES = {
+    Module.Type.BACKEND: "backend",
+    Module.Type.FRONTEND: "frontend",
+    Module.Type.OTHER: "other"
+}
+PRESCRIPTION_STATUS_MESSAGE = {
+    PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED: "Tous les critères, actuels et futurs, sont validés",
+    PrescriptionStatus.ONLY_CURRENT_CRITERIA_VALIDATED: "Seuls les critères actuellement applicables sont validés",
+    PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED: "Des critères actuellement applicables ne sont pas validés"
+}
+
+
+def convert_percentage_to_rating(percentage):
+    saturated_integer = max(min(int(percentage / 20), 4), 0)
+    return Rating(5-saturated_integer)
+
+
+def rating_value(rating):
+    return None if rating == Rating.NOT_CALCULATED else rating.name
+
+
+def report_data(app, generation_date):
+    plan = get_all_criterias_plan()
+    validations = plan.evaluate(app)
+    return {
+        "application": {"name": app.name, "version": app.version},
+        "generation_date": generation_date.isoformat(),
+        "prescription_status": plan.prescription_status(validations, generation_date).name,
+        "criteria": [{"name": criteria.name,
+                      "label": criteria.label,
+                      "start_date": criteria.criteria_start_date.isoformat(),
+                      "applicable": generation_date >= criteria.criteria_start_date,
+                      "validated": validations[criteria.name]} for criteria in plan.criterias],
+        "summary": {"security_rating": rating_value(app.worst_non_dependency_security_rating()),
+                    "dependency_security_rating": rating_value(app.worst_dependency_security_rating()),
+                    "backend_coverage": app.aggregated_backend_coverage(),
+                    "maintainability_rating": rating_value(app.worst_maintainability_rating())},
+        "modules": [{"name": module.name,
+                     "branch": module.branch_name,
+                     "type": MODULE_TYPE_NAMES[module.module_type],
+                     "security_rating": rating_value(module.non_dependency_security_rating()),
+                     "dependency_security_rating": rating_value(module.dependency_security_rating()),
+                     "coverage": module.calculated_coverage(),
+                     "maintainability_rating": rating_value(module.maintainability_rating)} for module in app.modules]
+    }
+
+
+def rating_message(rating):
+    return RATING_MESSAGE[Rating[rating]] if rating else RATING_MESSAGE[Rating.NOT_CALCULATED]
+
+
+def coverage_message(coverage):
+    return f"{coverage}%" if coverage is not None else RATING_MESSAGE[Rating.NOT_CALCULATED]
+
+
+def criteria_message(criteria):
+    if criteria["validated"]:
+        return "Validé"
+    return "Non validé" if criteria["applicable"] else f"Non validé (applicable à partir du {criteria['start_date'][:10]})"
+
+
+def convert_to_json(data):
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def convert_to_markdown(data):
+    summary = data["summary"]
+    lines = [f"# Rapport d'analyse Sonar de l'application \"{data['application']['name']}\" version {data['application']['version']}",
+             "",
+             f"Généré le {data['generation_date']}",
+             "",
+             "## Récapitulatif",
+             "",
+             f"**{PRESCRIPTION_STATUS_MESSAGE[PrescriptionStatus[data['prescription_status']]]}**",
+             "",
+             "| Sécurité | Couverture du backend | Maintenabilité |",
+             "|---|---|---|",
+             f"| {rating_message(summary['security_rating'])} | {coverage_message(summary['backend_coverage'])} "
+             f"| {rating_message(summary['maintainability_rating'])} |",
+             "",
+             "| Critère | Statut |",
+             "|---|---|"]
+    lines += [f"| {criteria['label']} | {criteria_message(criteria)} |" for criteria in data["criteria"]]
+    lines += ["",
+              "## Détail par module",
+              "",
+              "| Nom | Branche | Type | Sécurité | Dépendances | Couverture | Maintenabilité |",
+              "|---|---|---|---|---|---|---|"]
+    lines += [f"| {markdown_escape(module['name'])} | {markdown_escape(module['branch'] or '')} | {module['type']} "
+              f"| {rating_message(module['security_rating'])} | {rating_message(module['dependency_security_rating'])} "
+              f"| {coverage_message(module['coverage'])} | {rating_message(module['maintainability_rating'])} |"
+              for module in data["modules"]]
+    return "\n".join(lines) + "\n"
+
+
+def markdown_escape(text):
+    return text.replace("|", "\\|")
+
+
+def html_rating_cell(rating):
+    color = RATING_COLORS[Rating[rating]] if rating else RATING_COLORS[Rating.NOT_CALCULATED]
+    return f'<td class="rating" style="background-color: {color}">{rating_message(rating)}</td>'
+
+
+def html_coverage_cell(coverage):
+    color = RATING_COLORS[convert_percentage_to_rating(coverage)] if coverage is not None else RATING_COLORS[Rating.NOT_CALCULATED]
+    return f'<td class="rating" style="background-color: {color}">{coverage_message(coverage)}</td>'
+
+
+def convert_to_html(data):
+    summary = data["summary"]
+    title = f"Rapport d'analyse Sonar de l'application \"{data['application']['name']}\" version {data['application']['version']}"
+    criteria_rows = "".join(f"<tr><td>{html.escape(criteria['label'])}</td><td>{html.escape(criteria_message(criteria))}</td></tr>"
+                            for criteria in data["criteria"])
+    module_rows = "".join(f"<tr><td>{html.escape(module['name'])}</td><td>{html.escape(module['branch'] or '')}</td>"
+                          f"<td>{module['type']}</td>{html_rating_cell(module['security_rating'])}"
+                          f"{html_rating_cell(module['dependency_security_rating'])}{html_coverage_cell(module['coverage'])}"
+                          f"{html_rating_cell(module['maintainability_rating'])}</tr>"
+                          for module in data["modules"])
+    return f"""<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>
+body {{ font-family: sans-serif; }}
+table {{ border-collapse: collapse; margin-bottom: 1em; }}
+th, td {{ padding: 0.2em 0.6em; border: 1px solid #d3d3d3; }}
+td.rating {{ text-align: center; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(title)}</h1>
+<p>Généré le {html.escape(data['generation_date'])}</p>
+<h2>Récapitulatif</h2>
+<p class="prescription-status {data['prescription_status'].lower()}"><strong>{PRESCRIPTION_STATUS_MESSAGE[PrescriptionStatus[data['prescription_status']]]}</strong></p>
+<table>
+<tr><th>Sécurité</th><th>Couverture du backend</th><th>Maintenabilité</th></tr>
+<tr>{html_rating_cell(summary['security_rating'])}{html_coverage_cell(summary['backend_coverage'])}{html_rating_cell(summary['maintainability_rating'])}</tr>
+</table>
+<table>
+<tr><th>Critère</th><th>Statut</th></tr>
+{criteria_rows}
+</table>
+<h2>Détail par module</h2>
+<table>
+<tr><th>Nom</th><th>Branche</th><th>Type</th><th>Sécurité</th><th>Dépendances</th><th>Couverture</th><th>Maintenabilité</th></tr>
+{module_rows}
+</table>
+</body>
+</html>
+"""
+
+
+TEXT_CONVERTERS = {
+    JSON_FORMAT: convert_to_json,
+    HTML_FORMAT: convert_to_html,
+    MARKDOWN_FORMAT: convert_to_markdown
+}
+
+
+def get_output_path(output_path, report_format):
+    extension = REPORT_FORMAT_EXTENSIONS[report_format]
+    return output_path if output_path.endswith(extension) else os.path.splitext(output_path)[0] + extension
+
+
+@functools.lru_cache(maxsize=None)
+def package_version():
+    try:
+        return metadata.version("rte-sonar-reports")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def report_fingerprint(app, report_format, generation_date):
+    fingerprint_content = {"version": FINGERPRINT_VERSION,
+                           "package_version": package_version(),
+                           "format": report_format,
+                           "criteria": [criteria.to_dict() for criteria in get_all_criterias()],
+                           "application": app.to_dict(),
+                           "applicable_criteria": [criteria.name for criteria in get_all_criterias()
+                                                   if generation_date >= criteria.criteria_start_date]}
+    return hashlib.sha256(json.dumps(fingerprint_content, sort_keys=True).encode()).hexdigest()
+
+
+def get_fingerprint_path(output_path):
+    return output_path + FINGERPRINT_EXTENSION
+
+
+def is_report_up_to_date(output_path, fingerprint):
+    if not os.path.exists(output_path) or not os.path.exists(get_fingerprint_path(output_path)):
+        return False
+    with open(get_fingerprint_path(output_path)) as fingerprint_file:
+        return fingerprint_file.read().strip() == fingerprint
+
+
+def export(output_path, app, report_format, generation_date=None, force=False):
+    if generation_date is None:
+        generation_date = report_generation_datetime()
+    fingerprint = report_fingerprint(app, report_format, generation_date)
+    if not force and is_report_up_to_date(output_path, fingerprint):
+        LOGGER.info(f"Sonar indicators of application {app.name} version {app.version} are unchanged, report '{output_path}' is kept")
+        return False
+    if report_format == PDF_FORMAT:
+        from rte_sonar_reports import pdf
+        pdf.export(output_path, app, generation_date)
+    else:
+        LOGGER.info(f"""Generating Sonar indicators {report_format} report for application {app.name} version {app.version}""")
+        with open(output_path, "w", encoding="utf-8") as output_file:
+            output_file.write(TEXT_CONVERTERS[report_format](report_data(app, generation_date)))
+    with open(get_fingerprint_path(output_path), "w") as fingerprint_file:
+        fingerprint_file.write(fingerprint)
+    return True
@@ -0,0 +1,60 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from rte_sonar_reports.app import Rating, Module, calculate_coverage_in_percent_or_none
+from rte_sonar_reports.sonar import get_rating_from_sonar_api_string_value, MAINTAINABILITY_RATING_METRIC_KEY, LINES_TO_COVER_METRIC_KEY, UNCOVERED_LINES_METRIC_KEY, \
+    CONDITIONS_TO_COVER_METRIC_KEY, UNCOVERED_CONDITIONS_METRIC_KEY
+
+TREND_DAYS_COUNT = 6
+COVERAGE_METRIC_KEYS = [LINES_TO_COVER_METRIC_KEY, UNCOVERED_LINES_METRIC_KEY, CONDITIONS_TO_COVER_METRIC_KEY,
+                        UNCOVERED_CONDITIONS_METRIC_KEY]
+
+
+def trend_days(app, days_count=TREND_DAYS_COUNT):
+    days = {date[:10] for module in app.modules if module.history
+            for points in module.history.values() for date, _ in points}
+    return sorted(days)[-days_count:]
+
+
+def indicators_at(history, days):
+    points = sorted((date, metric_key, value) for metric_key, metric_points in (history or {}).items() for date, value in metric_points)
+    indicators = {}
+    indicators_by_day = []
+    index = 0
+    for day in days:
+        while index < len(points) and points[index][0][:10] <= day:
+            indicators[points[index][1]] = points[index][2]
+            index += 1
+        indicators_by_day.append(dict(indicators) if indicators else None)
+    return indicators_by_day
+
+
+def coverage_counts(indicators):
+    return [int(float(indicators.get(metric_key, 0))) for metric_key in COVERAGE_METRIC_KEYS]
+
+
+def maintainability_rating_from_indicators(indicators):
+    if not indicators or MAINTAINABILITY_RATING_METRIC_KEY not in indicators:
+        return Rating.NOT_CALCULATED
+    return get_rating_from_sonar_api_string_value(indicators[MAINTAINABILITY_RATING_METRIC_KEY])
+
+
+def module_coverage_trend(module, days):
+    return [calculate_coverage_in_percent_or_none(*coverage_counts(indicators)) if indicators else None
+            for indicators in indicators_at(module.history, days)]
+
+
+def module_maintainability_trend(module, days):
+    return [maintainability_rating_from_indicators(indicators) for indicators in indicators_at(module.history, days)]
+
+
+def aggregated_backend_coverage_trend(app, days):
+    counts_by_day = [[0, 0, 0, 0] for _ in days]
+    for module in app.modules:
+        if module.module_type != Module.Type.BACKEND:
+            continue
+        for day_counts, indicators in zip(counts_by_day, indicators_at(module.history, days)):
+            if indicators:
+                day_counts[:] = [total + count for total, count in zip(day_counts, coverage_counts(indicators))]
+    return [calculate_coverage_in_percent_or_none(*day_counts) for day_counts in counts_by_day]
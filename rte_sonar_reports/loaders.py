@@ -2,25 +2,98 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import functools
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
 
 from importlib_resources import read_text
-from jsonschema import validate
 import yaml
 
-from rte_sonar_reports.app import Application, Module, Rating
-from rte_sonar_reports.sonar import SonarClient, \
+from rte_sonar_reports.app import Application, Module, Rating, VulnerabilitySummary
+from rte_sonar_reports.sonar import SonarClientRegistry, BranchCache, serialize_indicators, deserialize_indicators, \
+    analysis_date_from_branches, \
     MAINTAINABILITY_RATING_METRIC_KEY, LINES_TO_COVER_METRIC_KEY, UNCOVERED_LINES_METRIC_KEY, \
     CONDITIONS_TO_COVER_METRIC_KEY, UNCOVERED_CONDITIONS_METRIC_KEY
+from rte_sonar_reports.yaml_loader import YAML_LOADER
 
-APPLICATION_DESCRIPTION_SCHEMA = yaml.safe_load(read_text("rte_sonar_reports", "application_description_schema.yml"))
 LOGGER = logging.getLogger(__name__)
+DEFAULT_MAX_WORKERS = 8
+
+
+@functools.lru_cache(maxsize=None)
+def get_application_description_validator():
+    from jsonschema.validators import validator_for
+    schema = yaml.load(read_text("rte_sonar_reports", "application_description_schema.yml"), Loader=YAML_LOADER)
+    return validator_for(schema)(schema)
+
+
+def validate_application_description(application_description_content):
+    from jsonschema.exceptions import best_match
+    error = best_match(get_application_description_validator().iter_errors(application_description_content))
+    if error is not None:
+        raise error
+
+
+class SonarCall:
+
+    def __init__(self, sonar_config_name, method_name, *args):
+        self.sonar_config_name = sonar_config_name
+        self.method_name = method_name
+        self.args = args
+
+    def apply(self, sonar_clients):
+        return getattr(sonar_clients.get(self.sonar_config_name), self.method_name)(*self.args)
+
+
+def run_sonar_plan(plan, run_calls):
+    results = None
+    while True:
+        try:
+            calls = plan.send(results)
+        except StopIteration as stop:
+            return stop.value
+        results = run_calls(calls)
+
+
+async def run_sonar_plan_async(plan, run_calls):
+    results = None
+    while True:
+        try:
+            calls = plan.send(results)
+        except StopIteration as stop:
+            return stop.value
+        results = await run_calls(calls)
 
 
 class ApplicationLoader:
 
-    def __init__(self, sonar_configs):
+    class VulnerabilityFetchMode(Enum):
+        FACETS = 0
+        DETAILS = 1
+        STREAMED = 2
+
+    VULNERABILITY_FETCH_METHODS = {
+        VulnerabilityFetchMode.FACETS: "get_vulnerability_summary",
+        VulnerabilityFetchMode.DETAILS: "get_all_vulnerabilities_sorted",
+        VulnerabilityFetchMode.STREAMED: "get_streamed_vulnerability_summary",
+    }
+
+    def __init__(self, sonar_configs, max_workers=DEFAULT_MAX_WORKERS, branch_cache_ttl=None,
+                 vulnerability_fetch_mode=VulnerabilityFetchMode.FACETS, batch_measures=True, response_cache=None,
+                 snapshot_store=None, history_store=None):
         self.sonar_configs = sonar_configs
+        self.snapshot_store = snapshot_store
+        self.history_store = history_store
+        self.batch_measures = batch_measures
+        self.vulnerability_fetch_mode = vulnerability_fetch_mode
+        self.max_workers = max_workers
+        self.branch_cache = BranchCache(branch_cache_ttl)
+        self.response_cache = response_cache
+        self.sonar_clients = SonarClientRegistry(sonar_configs, self.branch_cache, response_cache)
+
+    def close(self):
+        self.sonar_clients.close()
 
     @staticmethod
     def get_type(module_description):
@@ -39,49 +112,277 @@ class ApplicationLoader:
             return self.load(f.read())
 
     def load(self, yaml_content):
-        application_description_content = yaml.safe_load(yaml_content)
-        validate(application_description_content, APPLICATION_DESCRIPTION_SCHEMA)
-        application_description = application_description_content["application"]
+        application_description = self.parse(yaml_content)
+        return self.create_application(application_description,
+                                       self.fetch_all_sonar_indicators(self.get_module_descriptions(application_description)))
+
+    async def load_async(self, yaml_content):
+        import asyncio
+        from rte_sonar_reports.sonar_async import AsyncSonarClientRegistry
+        application_description = self.parse(yaml_content)
+        sonar_clients = AsyncSonarClientRegistry(self.sonar_configs, self.branch_cache, self.response_cache)
+        try:
+            all_sonar_indicators = await run_sonar_plan_async(
+                self.plan_all_sonar_indicators(self.get_module_descriptions(application_description)),
+                lambda calls: asyncio.gather(*[call.apply(sonar_clients) for call in calls]))
+        finally:
+            await sonar_clients.close()
+        return self.create_application(application_description, all_sonar_indicators)
+
+    @staticmethod
+    def parse(yaml_content):
+        application_description_content = yaml.load(yaml_content, Loader=YAML_LOADER)
+        validate_application_description(application_description_content)
+        return application_description_content["application"]
+
+    @staticmethod
+    def get_module_descriptions(application_description):
+        if "modules" not in application_description:
+            return []
+        if application_description["modules"] is None:
+            return []
+        return application_description["modules"]
+
+    def load_files(self, files):
+        yaml_contents = []
+        for file in files:
+            with open(file) as f:
+                yaml_contents.append(f.read())
+        return self.load_all(yaml_contents)
+
+    def load_all(self, yaml_contents):
+        application_descriptions = [self.parse(yaml_content) for yaml_content in yaml_contents]
+        unique_module_descriptions = list({self.get_fetch_key(module): module
+                                           for application_description in application_descriptions
+                                           for module in self.get_module_descriptions(application_description)}.values())
+        LOGGER.info(f"Retrieving Sonar indicators of {len(unique_module_descriptions)} distinct modules for {len(application_descriptions)} applications")
+        sonar_indicators_by_fetch_key = dict(zip([self.get_fetch_key(module) for module in unique_module_descriptions],
+                                                 self.fetch_all_sonar_indicators(unique_module_descriptions)))
+        return [self.create_application(application_description,
+                                        [sonar_indicators_by_fetch_key[self.get_fetch_key(module)]
+                                         for module in self.get_module_descriptions(application_description)])
+                for application_description in application_descriptions]
+
+    @staticmethod
+    def get_fetch_key(module):
+        return module.get("sonar_config"), module.get("project_key"), module.get("branch")
+
+    def create_application(self, application_description, all_sonar_indicators):
         app = Application(application_description["name"], application_description["version"])
-        self.add_modules(app, application_description)
+        for module, sonar_indicators in zip(self.get_module_descriptions(application_description), all_sonar_indicators):
+            app.add_module(self.create_module(module, *sonar_indicators, history=self.get_history(module, sonar_indicators[0])))
         return app
 
-    def add_modules(self, app, application_description):
-        if "modules" not in application_description:
+    def run_sonar_plan(self, executor, plan):
+        return run_sonar_plan(plan, lambda calls: list(executor.map(lambda call: call.apply(self.sonar_clients), calls)))
+
+    def fetch_all_sonar_indicators(self, module_descriptions):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return self.run_sonar_plan(executor, self.plan_all_sonar_indicators(module_descriptions))
+
+    def plan_all_sonar_indicators(self, module_descriptions):
+        latest_analyses = yield from self.plan_latest_analyses(module_descriptions)
+        all_sonar_indicators = self.get_reused_sonar_indicators(module_descriptions, latest_analyses)
+        indexes_to_fetch = [index for index in range(len(module_descriptions)) if index not in all_sonar_indicators]
+        modules_to_fetch = [module_descriptions[index] for index in indexes_to_fetch]
+        yield from self.plan_default_branches(modules_to_fetch)
+        default_branch_indicators = yield from self.plan_default_branch_indicators(modules_to_fetch)
+        fetched_sonar_indicators = yield from self.plan_sonar_indicators(modules_to_fetch, default_branch_indicators)
+        for index, sonar_indicators in zip(indexes_to_fetch, fetched_sonar_indicators):
+            all_sonar_indicators[index] = sonar_indicators
+            self.store_snapshot(module_descriptions[index], latest_analyses.get(index), sonar_indicators)
+        all_sonar_indicators = [all_sonar_indicators[index] for index in range(len(module_descriptions))]
+        yield from self.plan_histories(module_descriptions, [sonar_indicators[0] for sonar_indicators in all_sonar_indicators])
+        return all_sonar_indicators
+
+    def resolve_default_branches(self, executor, module_descriptions):
+        self.run_sonar_plan(executor, self.plan_default_branches(module_descriptions))
+
+    def plan_default_branches(self, module_descriptions):
+        yield [SonarCall(sonar_config_name, "find_default_branches", project_keys)
+               for sonar_config_name, project_keys in self.get_project_keys_without_branch(module_descriptions).items()]
+
+    def get_default_branch_indicators(self, executor, module_descriptions):
+        return self.run_sonar_plan(executor, self.plan_default_branch_indicators(module_descriptions))
+
+    def plan_default_branch_indicators(self, module_descriptions):
+        projects_on_default_branch = self.get_project_keys_on_default_branch(module_descriptions)
+        all_indicators_by_project = yield [SonarCall(sonar_config_name, "get_all_default_branch_indicators", project_keys)
+                                           for sonar_config_name, project_keys in projects_on_default_branch.items()]
+        default_branch_indicators = dict()
+        for sonar_config_name, indicators_by_project in zip(projects_on_default_branch, all_indicators_by_project):
+            default_branch_indicators.update(self.get_default_branch_indicators_keys(sonar_config_name, indicators_by_project))
+        return default_branch_indicators
+
+    def plan_sonar_indicators(self, module_descriptions, default_branch_indicators):
+        branch_names = [module["branch"] if "branch" in module else None for module in module_descriptions]
+        usable_indexes = [index for index, module in enumerate(module_descriptions) if self.is_sonar_config_usable(module)]
+        indexes_without_branch = [index for index in usable_indexes if not branch_names[index]]
+        resolved_branch_names = yield [SonarCall(module_descriptions[index]["sonar_config"], "find_default_branch",
+                                                 module_descriptions[index]["project_key"]) for index in indexes_without_branch]
+        for index, branch_name in zip(indexes_without_branch, resolved_branch_names):
+            branch_names[index] = branch_name
+        all_indicators = dict()
+        indicators_calls = dict()
+        for index in usable_indexes:
+            module = module_descriptions[index]
+            LOGGER.info(
+                f"""Retrieving Sonar indicators for module '{module["name"]}' on Sonar configuration '{module["sonar_config"]}' with project key '{module["project_key"]}'""")
+            fetch_key = (module["sonar_config"], module["project_key"], branch_names[index])
+            if default_branch_indicators and fetch_key in default_branch_indicators:
+                all_indicators[index] = default_branch_indicators[fetch_key]
+            else:
+                indicators_calls[index] = SonarCall(module["sonar_config"], "get_all_indicators", module["project_key"], branch_names[index])
+        vulnerabilities_calls = [SonarCall(module_descriptions[index]["sonar_config"], self.VULNERABILITY_FETCH_METHODS[self.vulnerability_fetch_mode],
+                                           module_descriptions[index]["project_key"], branch_names[index]) for index in usable_indexes]
+        results = yield list(indicators_calls.values()) + vulnerabilities_calls
+        all_indicators.update(zip(indicators_calls, results))
+        all_vulnerabilities = dict(zip(usable_indexes, results[len(indicators_calls):]))
+        all_sonar_indicators = []
+        for index, branch_name in enumerate(branch_names):
+            if index not in all_vulnerabilities:
+                all_sonar_indicators.append((branch_name, dict(), None, None))
+            elif self.vulnerability_fetch_mode == ApplicationLoader.VulnerabilityFetchMode.DETAILS:
+                all_sonar_indicators.append((branch_name, all_indicators[index], all_vulnerabilities[index], None))
+            else:
+                all_sonar_indicators.append((branch_name, all_indicators[index], None, all_vulnerabilities[index]))
+        return all_sonar_indicators
+
+    def plan_latest_analyses(self, module_descriptions):
+        if self.snapshot_store is None:
+            return dict()
+        projects = list(dict.fromkeys((module["sonar_config"], module["project_key"])
+                                      for module in module_descriptions if self.has_usable_sonar_config(module)))
+        all_branches = yield [SonarCall(sonar_config_name, "probe_project_branches", project_key)
+                              for sonar_config_name, project_key in projects]
+        branches_by_project = dict(zip(projects, all_branches))
+        latest_analyses = dict()
+        for index, module in enumerate(module_descriptions):
+            if not self.has_usable_sonar_config(module):
+                continue
+            if "branch" in module:
+                branch_name = module["branch"]
+            else:
+                branch_name = self.branch_cache.get(self.get_server(module), module["project_key"])[1]
+            branches = branches_by_project[(module["sonar_config"], module["project_key"])]
+            latest_analyses[index] = (branch_name, analysis_date_from_branches(branches, branch_name))
+        return latest_analyses
+
+    def get_reused_sonar_indicators(self, module_descriptions, latest_analyses):
+        reused_sonar_indicators = dict()
+        for index, (branch_name, analysis_date) in latest_analyses.items():
+            if analysis_date is None:
+                continue
+            module = module_descriptions[index]
+            snapshot = self.snapshot_store.get(self.get_server(module), module["project_key"], branch_name, analysis_date)
+            if snapshot is None:
+                continue
+            if self.vulnerability_fetch_mode == ApplicationLoader.VulnerabilityFetchMode.DETAILS and snapshot["vulnerabilities"] is None:
+                continue
+            LOGGER.info(f"""Module '{module["name"]}' has not been analysed since {analysis_date}, previously retrieved Sonar indicators are reused""")
+            vulnerability_summary = snapshot["vulnerability_summary"]
+            reused_sonar_indicators[index] = (branch_name, deserialize_indicators(snapshot["indicators"]), snapshot["vulnerabilities"],
+                                              VulnerabilitySummary.from_dict(vulnerability_summary) if vulnerability_summary else None)
+        return reused_sonar_indicators
+
+    def store_snapshot(self, module, latest_analysis, sonar_indicators):
+        if self.snapshot_store is None or latest_analysis is None:
             return
-        if application_description["modules"] is None:
+        branch_name, indicators, vulnerabilities, vulnerability_summary = sonar_indicators
+        analysed_branch_name, analysis_date = latest_analysis
+        if analysis_date is None or analysed_branch_name != branch_name:
             return
-        for module in application_description["modules"]:
-            branch_name, indicators, vulnerabilities = self.get_all_sonar_indicators(module)
-            maintainability_rating = indicators[MAINTAINABILITY_RATING_METRIC_KEY] if MAINTAINABILITY_RATING_METRIC_KEY in indicators else Rating.NOT_CALCULATED
-            lines_to_cover = indicators[LINES_TO_COVER_METRIC_KEY] if LINES_TO_COVER_METRIC_KEY in indicators else 0
-            uncovered_lines = indicators[UNCOVERED_LINES_METRIC_KEY] if UNCOVERED_LINES_METRIC_KEY in indicators else 0
-            conditions_to_cover = indicators[CONDITIONS_TO_COVER_METRIC_KEY] if CONDITIONS_TO_COVER_METRIC_KEY in indicators else 0
-            uncovered_conditions = indicators[UNCOVERED_CONDITIONS_METRIC_KEY] if UNCOVERED_CONDITIONS_METRIC_KEY in indicators else 0
-            app.add_module(Module(module["name"], branch_name=branch_name, module_type=self.get_type(module),
-                                  maintainability_rating=maintainability_rating, lines_to_cover=lines_to_cover,
-                                  uncovered_lines=uncovered_lines, conditions_to_cover=conditions_to_cover,
-                                  uncovered_conditions=uncovered_conditions, vulnerabilities=vulnerabilities))
-
-    def get_all_sonar_indicators(self, module):
-        branch_name = module["branch"] if "branch" in module else None
-        indicators = dict()
+        self.snapshot_store.put(self.get_server(module), module["project_key"], branch_name, analysis_date,
+                                {"indicators": serialize_indicators(indicators),
+                                 "vulnerabilities": vulnerabilities,
+                                 "vulnerability_summary": vulnerability_summary.to_dict() if vulnerability_summary else None})
+
+    def plan_histories(self, module_descriptions, branch_names):
+        if self.history_store is None:
+            return
+        histories = list(dict.fromkeys((module["sonar_config"], module["project_key"], branch_name)
+                                       for module, branch_name in zip(module_descriptions, branch_names)
+                                       if branch_name and self.has_usable_sonar_config(module)))
+        LOGGER.info(f"Retrieving new Sonar measures history points of {len(histories)} projects")
+        last_dates = [self.history_store.last_date(self.sonar_configs[sonar_config_name]["base_url"], project_key, branch_name)
+                      for sonar_config_name, project_key, branch_name in histories]
+        all_points = yield [SonarCall(sonar_config_name, "get_measures_history", project_key, branch_name, last_date)
+                            for (sonar_config_name, project_key, branch_name), last_date in zip(histories, last_dates)]
+        for (sonar_config_name, project_key, branch_name), points in zip(histories, all_points):
+            LOGGER.debug(f"{len(points)} new measures history points retrieved for project '{project_key}' on branch '{branch_name}'")
+            self.history_store.add(self.sonar_configs[sonar_config_name]["base_url"], project_key, branch_name, points)
+
+    def get_history(self, module, branch_name):
+        if self.history_store is None or not branch_name or not self.has_usable_sonar_config(module):
+            return None
+        return self.history_store.get(self.get_server(module), module["project_key"], branch_name)
+
+    def get_server(self, module):
+        return self.sonar_configs[module["sonar_config"]]["base_url"]
+
+    def get_project_keys_without_branch(self, module_descriptions):
+        project_keys_by_sonar_config = dict()
+        for module in module_descriptions:
+            if "branch" in module or not self.has_usable_sonar_config(module):
+                continue
+            project_keys_by_sonar_config.setdefault(module["sonar_config"], []).append(module["project_key"])
+        return project_keys_by_sonar_config
+
+    def get_project_keys_on_default_branch(self, module_descriptions):
+        project_keys_by_sonar_config = dict()
+        if not self.batch_measures:
+            return project_keys_by_sonar_config
+        for module in module_descriptions:
+            if not self.has_usable_sonar_config(module):
+                continue
+            found, default_branch_name = self.branch_cache.get(self.get_server(module), module["project_key"])
+            if not found or default_branch_name is None:
+                continue
+            if "branch" in module and module["branch"] != default_branch_name:
+                continue
+            project_keys_by_sonar_config.setdefault(module["sonar_config"], []).append(module["project_key"])
+        return project_keys_by_sonar_config
+
+    def get_default_branch_indicators_keys(self, sonar_config_name, indicators_by_project):
+        base_url = self.sonar_configs[sonar_config_name]["base_url"]
+        return {(sonar_config_name, project_key, self.branch_cache.get(base_url, project_key)[1]): indicators
+                for project_key, indicators in indicators_by_project.items()}
+
+    def create_module(self, module, branch_name, indicators, vulnerabilities, vulnerability_summary, history=None):
+        maintainability_rating = indicators[MAINTAINABILITY_RATING_METRIC_KEY] if MAINTAINABILITY_RATING_METRIC_KEY in indicators else Rating.NOT_CALCULATED
+        lines_to_cover = indicators[LINES_TO_COVER_METRIC_KEY] if LINES_TO_COVER_METRIC_KEY in indicators else 0
+        uncovered_lines = indicators[UNCOVERED_LINES_METRIC_KEY] if UNCOVERED_LINES_METRIC_KEY in indicators else 0
+        conditions_to_cover = indicators[CONDITIONS_TO_COVER_METRIC_KEY] if CONDITIONS_TO_COVER_METRIC_KEY in indicators else 0
+        uncovered_conditions = indicators[UNCOVERED_CONDITIONS_METRIC_KEY] if UNCOVERED_CONDITIONS_METRIC_KEY in indicators else 0
+        return Module(module["name"], branch_name=branch_name, module_type=self.get_type(module),
+                      maintainability_rating=maintainability_rating, lines_to_cover=lines_to_cover,
+                      uncovered_lines=uncovered_lines, conditions_to_cover=conditions_to_cover,
+                      uncovered_conditions=uncovered_conditions, vulnerabilities=vulnerabilities,
+                      vulnerability_summary=vulnerability_summary, history=history)
+
+    def has_usable_sonar_config(self, module):
+        return "sonar_config" in module and "project_key" in module \
+            and module["sonar_config"] in self.sonar_configs and bool(self.sonar_configs[module["sonar_config"]])
+
+    def is_sonar_config_usable(self, module):
         if "sonar_config" not in module or "project_key" not in module:
             LOGGER.error(f"""Module '{module["name"]}' definition is not complete, its indicators cannot be retrieved.""")
-            return branch_name, indicators, None
+            return False
         if module["sonar_config"] not in self.sonar_configs:
             LOGGER.error(f"""Module '{module["name"]}' is based on Sonar configuration '{module["sonar_config"]}' which has not been defined. Its indicators cannot be retrieved.""")
-            return branch_name, indicators, None
-        sonar_config = self.sonar_configs[module["sonar_config"]]
-        project_key = module["project_key"]
-        if not sonar_config:
+            return False
+        if not self.sonar_configs[module["sonar_config"]]:
             LOGGER.error(f"""Module '{module["name"]}' is based on Sonar configuration '{module["sonar_config"]}' which is not well defined. Its indicators cannot be retrieved.""")
-            return branch_name, indicators, None
-        sonar_client = SonarClient(sonar_config)
-        if not branch_name:
-            branch_name = sonar_client.find_default_branch(project_key)
-        LOGGER.info(
-            f"""Retrieving Sonar indicators for module '{module["name"]}' on Sonar configuration '{sonar_config.name}' with project key '{project_key}'""")
-        indicators = sonar_client.get_all_indicators(project_key, branch_name)
-        vulnerabilities = sonar_client.get_all_vulnerabilities_sorted(project_key, branch_name)
-        return branch_name, indicators, vulnerabilities
+            return False
+        return True
+
+    def get_branch_name(self, module):
+        if "branch" in module:
+            return module["branch"]
+        return self.sonar_clients.get(module["sonar_config"]).find_default_branch(module["project_key"])
+
+    def get_indicators(self, module, branch_name, default_branch_indicators=None):
+        fetch_key = (module["sonar_config"], module["project_key"], branch_name)
+        if default_branch_indicators and fetch_key in default_branch_indicators:
+            return default_branch_indicators[fetch_key]
+        return self.sonar_clients.get(module["sonar_config"]).get_all_indicators(module["project_key"], branch_name)
@@ -2,50 +2,67 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
-import datetime
+import functools
 import logging
-
-import pytz
+import os.path
+import re
 
 import importlib_resources
+from reportlab.graphics import renderPDF
 from reportlab.lib.enums import TA_CENTER
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Image, Spacer, Paragraph, Table
+from reportlab.platypus import SimpleDocTemplate, Image, Spacer, Paragraph, Table, LongTable
 from svglib.svglib import svg2rlg
 
 from rte_sonar_reports.app import Rating, Module
-from rte_sonar_reports.prescription_validator import PrescriptionStatus, compute_prescription_status
+from rte_sonar_reports.formats import RATING_COLORS, RATING_MESSAGE, convert_percentage_to_rating
+from rte_sonar_reports.history import trend_days, module_coverage_trend, module_maintainability_trend, \
+    aggregated_backend_coverage_trend
+from rte_sonar_reports.prescription_validator import PrescriptionStatus, compute_prescription_status, \
+    report_generation_datetime
 
 STYLES = getSampleStyleSheet()
-RATING_COLORS = {
-    Rating.A: "#6cd46c",
-    Rating.B: "#c6e056",
-    Rating.C: "#f4d348",
-    Rating.D: "#f69d53",
-    Rating.E: "#f0878e",
-    Rating.NOT_CALCULATED: "#d3d3d3"
-}
-RATING_MESSAGE = {
-    Rating.A: "A",
-    Rating.B: "B",
-    Rating.C: "C",
-    Rating.D: "D",
-    Rating.E: "E",
-    Rating.NOT_CALCULATED: "N/A"
-}
 TRAFFIC_LIGHT_IMAGE = {
     PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED: "traffic_green.svg",
     PrescriptionStatus.ONLY_CURRENT_CRITERIA_VALIDATED: "traffic_orange.svg",
     PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED: "traffic_red.svg"
 }
+RTE_LOGO_IMAGE = "RTE_logo.svg"
 LOGGER = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def load_svg_asset(asset_name):
+    with importlib_resources.path(__package__, asset_name) as asset_path:
+        return svg2rlg(asset_path)
+
+
+def load_all_svg_assets():
+    for asset_name in (RTE_LOGO_IMAGE, *TRAFFIC_LIGHT_IMAGE.values()):
+        load_svg_asset(asset_name)
+
+
+class SvgAssetImage(Image):
+
+    def __init__(self, asset_name, width, height, hAlign="CENTER"):
+        super().__init__(load_svg_asset(asset_name), width=width, height=height, hAlign=hAlign, kind="proportional")
+        self.form_name = f"{re.sub(r'[^0-9A-Za-z]', '_', os.path.splitext(asset_name)[0])}_{round(self.drawWidth)}x{round(self.drawHeight)}"
+
+    def draw(self):
+        if not self.canv.hasForm(self.form_name):
+            self.canv.beginForm(self.form_name, upperx=self.drawWidth, uppery=self.drawHeight)
+            self.canv.scale(self.drawWidth / self.imageWidth, self.drawHeight / self.imageHeight)
+            renderPDF.draw(self._drawing, self.canv, 0, 0)
+            self.canv.endForm()
+        self.canv.saveState()
+        self.canv.translate(getattr(self, "_offs_x", 0), getattr(self, "_offs_y", 0))
+        self.canv.doForm(self.form_name)
+        self.canv.restoreState()
+
+
 def add_rte_logo(report):
-    with importlib_resources.path(__package__, "RTE_logo.svg") as rte_logo_path:
-        rte_logo = svg2rlg(rte_logo_path)
-        report.append(Image(rte_logo, width=2.5*cm, height=2.5*cm, hAlign="RIGHT", kind="proportional"))
+    report.append(SvgAssetImage(RTE_LOGO_IMAGE, width=2.5*cm, height=2.5*cm, hAlign="RIGHT"))
 
 
 def add_space(report):
@@ -59,9 +76,7 @@ def add_title(report, app):
 
 def add_traffic_light(report, app, generation_date):
     prescription_status = compute_prescription_status(app, generation_date)
-    with importlib_resources.path(__package__, TRAFFIC_LIGHT_IMAGE.get(prescription_status)) as traffic_light_img_path:
-        traffic_light_img = svg2rlg(traffic_light_img_path)
-        report.append(Image(traffic_light_img, width=2.5*cm, height=2.5*cm, kind="proportional"))
+    report.append(SvgAssetImage(TRAFFIC_LIGHT_IMAGE.get(prescription_status), width=2.5*cm, height=2.5*cm))
 
 
 def add_abstract(report, app, generation_date):
@@ -85,69 +100,97 @@ def convert_module_type(module_type):
         return "Autre"
 
 
-def convert_rating(rating, parent):
-    color = RATING_COLORS.get(rating) if rating in RATING_COLORS else RATING_COLORS[Rating.NOT_CALCULATED]
-    message = RATING_MESSAGE.get(rating) if rating in RATING_MESSAGE else RATING_MESSAGE[Rating.NOT_CALCULATED]
+@functools.lru_cache(maxsize=None)
+def get_cell_style(parent, color):
+    return ParagraphStyle(name=f"{parent}_{color}",
+                          parent=STYLES[parent],
+                          backColor=color,
+                          borderPadding=0,
+                          borderRadius=0.1 * cm,
+                          borderColor=color,
+                          borderWidth=1,
+                          alignment=TA_CENTER)
 
-    local_style = ParagraphStyle(name='local_style',
-                                 parent=STYLES[parent],
-                                 backColor=color,
-                                 borderPadding=0,
-                                 borderRadius=0.1 * cm,
-                                 borderColor=color,
-                                 borderWidth=1,
-                                 alignment=TA_CENTER)
-    return Paragraph(message, style=local_style)
+
+@functools.lru_cache(maxsize=None)
+def get_rating_cell_template(rating, parent):
+    if rating not in RATING_COLORS or rating not in RATING_MESSAGE:
+        rating = Rating.NOT_CALCULATED
+    return RATING_MESSAGE[rating], get_cell_style(parent, RATING_COLORS[rating])
 
 
-def convert_percentage_to_rating(percentage):
-    saturated_integer = max(min(int(percentage / 20), 4), 0)
-    return Rating(5-saturated_integer)
+def convert_rating(rating, parent):
+    message, style = get_rating_cell_template(rating, parent)
+    return Paragraph(message, style=style)
 
 
 def convert_coverage(coverage, parent):
     if coverage is None:
-        color = RATING_COLORS[Rating.NOT_CALCULATED]
-        message = "N/A"
+        message, style = get_rating_cell_template(Rating.NOT_CALCULATED, parent)
     else:
-        color = RATING_COLORS[convert_percentage_to_rating(coverage)]
-        message = f"{coverage}%"
-
-    local_style = ParagraphStyle(name='local_style',
-                                 parent=STYLES[parent],
-                                 backColor=color,
-                                 borderPadding=0,
-                                 borderRadius=0.1 * cm,
-                                 borderColor=color,
-                                 borderWidth=1,
-                                 alignment=TA_CENTER)
-    return Paragraph(message, style=local_style)
+        message, style = f"{coverage}%", get_cell_style(parent, RATING_COLORS[convert_percentage_to_rating(coverage)])
+    return Paragraph(message, style=style)
 
 
 def convert_text(text):
     return Paragraph(text, style=STYLES["Normal"])
 
 
+def detail_rows(app):
+    for module in app.modules:
+        yield [convert_text(module.name),
+               convert_text(module.branch_name),
+               convert_module_type(module.module_type),
+               convert_rating(module.non_dependency_security_rating(), 'Normal'),
+               convert_rating(module.dependency_security_rating(), 'Normal'),
+               convert_coverage(module.calculated_coverage(), 'Normal'),
+               convert_rating(module.maintainability_rating, 'Normal'), ]
+
+
 def add_detail(report, app):
     report.append(Paragraph("Détail par module", style=STYLES["Heading1"]))
     columns_headers = ["Nom", "Branche", "Type", "Sécurité", "Dépendances", "Couverture", "Maintenabilité"]
     data = [columns_headers]
+    data.extend(detail_rows(app))
     number_of_modules = len(app.modules)
     number_of_columns = len(columns_headers)
-    for module in app.modules:
-        data.append([convert_text(module.name),
-                     convert_text(module.branch_name),
-                     convert_module_type(module.module_type),
-                     convert_rating(module.non_dependency_security_rating(), 'Normal'),
-                     convert_rating(module.dependency_security_rating(), 'Normal'),
-                     convert_coverage(module.calculated_coverage(), 'Normal'),
-                     convert_rating(module.maintainability_rating, 'Normal'), ])
 
     local_style = [('FONTSIZE', (0, 0), (number_of_columns-1, number_of_modules), 8),
                    ("LINEABOVE", (0, 0), (number_of_columns-1, 1), 1, "black"),
                    ("LINEBEFORE", (1, 1), (number_of_columns-1, number_of_modules), 1, "black"),
                    ("VALIGN", (0, 0), (number_of_columns-1, number_of_modules), "MIDDLE"),]
-    report.append(Table(data, style=local_style, colWidths=[4*cm, 4*cm, 2*cm, 2*cm, 2*cm, 2*cm,2*cm]))
+    report.append(LongTable(data, style=local_style, colWidths=[4*cm, 4*cm, 2*cm, 2*cm, 2*cm, 2*cm,2*cm], repeatRows=1))
+
+
+def trend_table(data):
+    number_of_rows = len(data) - 1
+    number_of_columns = len(data[0])
+    local_style = [('FONTSIZE', (0, 0), (number_of_columns-1, number_of_rows), 8),
+                   ("LINEABOVE", (0, 0), (number_of_columns-1, 1), 1, "black"),
+                   ("LINEBEFORE", (1, 1), (number_of_columns-1, number_of_rows), 1, "black"),
+                   ("VALIGN", (0, 0), (number_of_columns-1, number_of_rows), "MIDDLE"),]
+    return LongTable(data, style=local_style, colWidths=[6*cm] + [2*cm] * (number_of_columns-1), repeatRows=1)
+
+
+def add_trends(report, app):
+    days = trend_days(app)
+    if not days:
+        return
+    modules = [module for module in app.modules if module.history]
+    columns_headers = ["Nom"] + [f"{day[8:10]}/{day[5:7]}/{day[:4]}" for day in days]
+    report.append(Paragraph("Tendances", style=STYLES["Heading1"]))
+    report.append(Paragraph("Couverture", style=STYLES["Heading2"]))
+    coverage_data = [columns_headers,
+                     [convert_text("Couverture agrégée du backend")]
+                     + [convert_coverage(coverage, 'Normal') for coverage in aggregated_backend_coverage_trend(app, days)]]
+    coverage_data.extend([convert_text(module.name)] + [convert_coverage(coverage, 'Normal') for coverage in module_coverage_trend(module, days)]
+                         for module in modules)
+    report.append(trend_table(coverage_data))
+    report.append(Paragraph("Maintenabilité", style=STYLES["Heading2"]))
+    maintainability_data = [columns_headers]
+    maintainability_data.extend([convert_text(module.name)] + [convert_rating(rating, 'Normal') for rating in module_maintainability_trend(module, days)]
+                                for module in modules)
+    report.append(trend_table(maintainability_data))
 
 
 def add_generation_date(report, generation_date):
@@ -158,10 +201,11 @@ def add_generation_date(report, generation_date):
     report.append(Paragraph(f"Généré le {generation_date_rendered}", style=local_style))
 
 
-def export(output_path, app):
+def export(output_path, app, generation_date=None):
     LOGGER.info(f"""Generating Sonar indicators report for application {app.name} version {app.version}""")
-    generation_date = datetime.datetime.now(pytz.timezone('Europe/Paris'))
-    doc = SimpleDocTemplate(output_path)
+    if generation_date is None:
+        generation_date = report_generation_datetime()
+    doc = SimpleDocTemplate(output_path, invariant=1)
     report = []
     add_rte_logo(report)
     add_space(report)
@@ -171,4 +215,5 @@ def export(output_path, app):
     add_abstract(report, app, generation_date)
     add_space(report)
     add_detail(report, app)
+    add_trends(report, app)
     doc.build(report)
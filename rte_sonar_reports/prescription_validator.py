@@ -2,40 +2,176 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import functools
+import os
 from datetime import datetime
 from enum import Enum
 
 import pytz
+import yaml
+from importlib_resources import read_text
 
-from rte_sonar_reports.app import Rating
+from rte_sonar_reports.app import Rating, Module, calculate_coverage_in_percent_or_none
+from rte_sonar_reports.yaml_loader import YAML_LOADER
+
+CRITERIA_FILE_VERSION = 1
+SOURCE_DATE_EPOCH_VARIABLE = "SOURCE_DATE_EPOCH"
+VULNERABILITIES_REQUIREMENT = "vulnerabilities"
+MEASURES_REQUIREMENT = "measures"
+BACKEND_MEASURES_REQUIREMENT = "backend_measures"
+SECURITY_RATING_METRIC = "security_rating"
+DEPENDENCY_SECURITY_RATING_METRIC = "dependency_security_rating"
+MAINTAINABILITY_RATING_METRIC = "maintainability_rating"
+COVERAGE_METRIC = "coverage"
 
 
 def datetime_in_paris_timezone(year, month, day):
     return pytz.timezone('Europe/Paris').localize(datetime(year, month, day))
 
 
+def current_datetime_in_paris_timezone():
+    return datetime.now(pytz.timezone('Europe/Paris'))
+
+
+def report_generation_datetime():
+    source_date_epoch = os.getenv(SOURCE_DATE_EPOCH_VARIABLE)
+    if source_date_epoch:
+        return datetime.fromtimestamp(int(source_date_epoch), pytz.timezone('Europe/Paris'))
+    return current_datetime_in_paris_timezone()
+
+
+class WorstRatingAggregate:
+
+    def __init__(self, module_rating):
+        self.module_rating = module_rating
+        self.value = Rating.NOT_CALCULATED
+
+    def add(self, module):
+        self.value = max(self.value, self.module_rating(module))
+
+
+class CoverageAggregate:
+
+    def __init__(self):
+        self.lines_to_cover = 0
+        self.uncovered_lines = 0
+        self.conditions_to_cover = 0
+        self.uncovered_conditions = 0
+
+    def add(self, module):
+        self.lines_to_cover += module.lines_to_cover
+        self.uncovered_lines += module.uncovered_lines
+        self.conditions_to_cover += module.conditions_to_cover
+        self.uncovered_conditions += module.uncovered_conditions
+
+    @property
+    def value(self):
+        return calculate_coverage_in_percent_or_none(self.lines_to_cover, self.uncovered_lines, self.conditions_to_cover,
+                                                     self.uncovered_conditions)
+
+
+RATING_METRICS = {
+    SECURITY_RATING_METRIC: (lambda module: module.non_dependency_security_rating(), VULNERABILITIES_REQUIREMENT),
+    DEPENDENCY_SECURITY_RATING_METRIC: (lambda module: module.dependency_security_rating(), VULNERABILITIES_REQUIREMENT),
+    MAINTAINABILITY_RATING_METRIC: (lambda module: module.maintainability_rating, MEASURES_REQUIREMENT),
+}
+
+
 class Criteria:
-    def __init__(self, criteria_start_date, criteria_validation_method):
+    def __init__(self, name, criteria_start_date, metric, threshold, module_types=None, label=None):
+        if metric not in RATING_METRICS and metric != COVERAGE_METRIC:
+            raise ValueError(f"Criteria '{name}' is based on unknown metric '{metric}'")
+        self.name = name
+        self.label = label or name
         self.criteria_start_date = criteria_start_date
-        self.criteria_validation_method = criteria_validation_method
-
-    def criteria_start_date(self):
-        return self.criteria_start_date
+        self.metric = metric
+        self.threshold = Rating[threshold] if metric in RATING_METRICS else threshold
+        self.module_types = frozenset(module_types) if module_types else None
+
+    @property
+    def aggregate_key(self):
+        return self.metric, self.module_types
+
+    @property
+    def requirements(self):
+        if self.metric in RATING_METRICS:
+            return [RATING_METRICS[self.metric][1]]
+        if self.module_types == {Module.Type.BACKEND}:
+            return [BACKEND_MEASURES_REQUIREMENT]
+        return [MEASURES_REQUIREMENT]
+
+    def create_aggregate(self):
+        if self.metric in RATING_METRICS:
+            return WorstRatingAggregate(RATING_METRICS[self.metric][0])
+        return CoverageAggregate()
+
+    def is_satisfied(self, value):
+        if self.metric in RATING_METRICS:
+            return value <= self.threshold
+        return value is None or value >= self.threshold
 
     def is_validated(self, app):
-        return self.criteria_validation_method(app)
+        return CriteriaPlan([self]).evaluate(app)[self.name]
+
+    def to_dict(self):
+        return {"name": self.name, "label": self.label, "start_date": self.criteria_start_date.isoformat(), "metric": self.metric,
+                "threshold": self.threshold.name if isinstance(self.threshold, Rating) else self.threshold,
+                "module_types": sorted(module_type.name for module_type in self.module_types) if self.module_types else None}
+
+
+class CriteriaPlan:
+    def __init__(self, criterias):
+        self.criterias = list(criterias)
+        self.aggregate_factories = {criteria.aggregate_key: criteria.create_aggregate for criteria in self.criterias}
+
+    def compute_aggregates(self, modules):
+        aggregates = {aggregate_key: create_aggregate() for aggregate_key, create_aggregate in self.aggregate_factories.items()}
+        for module in modules:
+            for (_, module_types), aggregate in aggregates.items():
+                if module_types is None or module.module_type in module_types:
+                    aggregate.add(module)
+        return {aggregate_key: aggregate.value for aggregate_key, aggregate in aggregates.items()}
+
+    def evaluate(self, app):
+        aggregates = self.compute_aggregates(app.modules)
+        return {criteria.name: criteria.is_satisfied(aggregates[criteria.aggregate_key]) for criteria in self.criterias}
+
+    def prescription_status(self, validations, date):
+        worst_criteria = PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED
+        for criteria in self.criterias:
+            if not validations[criteria.name]:
+                if date >= criteria.criteria_start_date:
+                    return PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED
+                else:
+                    worst_criteria = PrescriptionStatus.ONLY_CURRENT_CRITERIA_VALIDATED
+        return worst_criteria
+
+
+def parse_criterias(criteria_file_content):
+    criteria_description = yaml.load(criteria_file_content, Loader=YAML_LOADER)
+    if criteria_description.get("version") != CRITERIA_FILE_VERSION:
+        raise ValueError(f"Unsupported prescription criteria file version {criteria_description.get('version')}, "
+                         f"expected {CRITERIA_FILE_VERSION}")
+    return [Criteria(criteria["name"],
+                     pytz.timezone('Europe/Paris').localize(datetime.strptime(criteria["start_date"], "%Y-%m-%d")),
+                     criteria["metric"], criteria["threshold"],
+                     [Module.Type[module_type.upper()] for module_type in criteria.get("module_types", [])],
+                     criteria.get("label"))
+            for criteria in criteria_description["criteria"]]
+
 
+@functools.lru_cache(maxsize=None)
+def get_all_criterias():
+    return tuple(parse_criterias(read_text("rte_sonar_reports", "prescription_criteria.yml")))
 
-SECURITY_CRITERIA_START_DATE = datetime_in_paris_timezone(2024, 11, 1)
-SECURITY_CRITERIA = Criteria(SECURITY_CRITERIA_START_DATE, lambda app : app.worst_non_dependency_security_rating() <= Rating.A)
 
-TEST_COVERAGE_CRITERIA_START_DATE = datetime_in_paris_timezone(2025, 3, 1)
-TEST_COVERAGE_CRITERIA = Criteria(TEST_COVERAGE_CRITERIA_START_DATE, lambda app : app.aggregated_backend_coverage() is None or app.aggregated_backend_coverage() >= 60)
+@functools.lru_cache(maxsize=None)
+def get_all_criterias_plan():
+    return CriteriaPlan(get_all_criterias())
 
-MAINTAINABILITY_CRITERIA_START_DATE = datetime_in_paris_timezone(2025, 9, 1)
-MAINTAINABILITY_CRITERIA = Criteria(MAINTAINABILITY_CRITERIA_START_DATE, lambda app : app.worst_maintainability_rating() <= Rating.A)
 
-ALL_CRITERIAS = [SECURITY_CRITERIA, TEST_COVERAGE_CRITERIA, MAINTAINABILITY_CRITERIA]
+def get_criteria(name):
+    return next(criteria for criteria in get_all_criterias() if criteria.name == name)
 
 
 class PrescriptionStatus(Enum):
@@ -45,11 +181,5 @@ class PrescriptionStatus(Enum):
 
 
 def compute_prescription_status(app, date):
-    worst_criteria = PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED
-    for criteria in ALL_CRITERIAS:
-        if not criteria.is_validated(app):
-            if date >= criteria.criteria_start_date:
-                return PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED
-            else:
-                worst_criteria = PrescriptionStatus.ONLY_CURRENT_CRITERIA_VALIDATED
-    return worst_criteria
+    plan = get_all_criterias_plan()
+    return plan.prescription_status(plan.evaluate(app), date)
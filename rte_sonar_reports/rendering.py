@@ -0,0 +1,39 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from rte_sonar_reports import formats
+from rte_sonar_reports.app import Application
+
+LOGGER = logging.getLogger(__name__)
+DEFAULT_RENDER_WORKERS = os.cpu_count() or 1
+
+
+def warm_up_render_worker():
+    logging.basicConfig(level=os.getenv("LOGLEVEL", "INFO").upper())
+    from rte_sonar_reports import pdf
+    pdf.load_all_svg_assets()
+
+
+def render_report_snapshot(output_path, application_snapshot, report_format, generation_date):
+    formats.export(output_path, Application.from_dict(application_snapshot), report_format, generation_date, force=True)
+    return output_path
+
+
+def render_reports(report_tasks, generation_date, workers=DEFAULT_RENDER_WORKERS, force=False):
+    report_tasks = [(output_path, app, report_format) for output_path, app, report_format in report_tasks
+                    if force or not formats.is_report_up_to_date(output_path, formats.report_fingerprint(app, report_format, generation_date))]
+    if workers <= 1 or len(report_tasks) <= 1:
+        for output_path, app, report_format in report_tasks:
+            formats.export(output_path, app, report_format, generation_date, force=True)
+        return [output_path for output_path, _, _ in report_tasks]
+    LOGGER.info(f"Rendering {len(report_tasks)} reports with {min(workers, len(report_tasks))} worker processes")
+    snapshots = {id(app): app.to_dict() for _, app, _ in report_tasks}
+    with ProcessPoolExecutor(max_workers=min(workers, len(report_tasks)), initializer=warm_up_render_worker) as executor:
+        futures = [executor.submit(render_report_snapshot, output_path, snapshots[id(app)], report_format, generation_date)
+                   for output_path, app, report_format in report_tasks]
+        return [future.result() for future in futures]
@@ -0,0 +1,152 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+
+from rte_sonar_reports.prescription_validator import compute_prescription_status, current_datetime_in_paris_timezone
+from rte_sonar_reports.sonar import SonarApiError
+
+LOGGER = logging.getLogger(__name__)
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 16
+MAX_REQUEST_SIZE = 1024 * 1024
+QUEUE_FULL_RETRY_AFTER = 1
+SERVICE_BRANCH_CACHE_TTL = 600
+
+
+class ReportService:
+
+    def __init__(self, application_loader, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.application_loader = application_loader
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-worker")
+        self.admissions = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, function, *args):
+        if not self.admissions.acquire(blocking=False):
+            return None
+        return self.executor.submit(self.run_admitted, function, *args)
+
+    def run_admitted(self, function, *args):
+        try:
+            return function(*args)
+        finally:
+            self.admissions.release()
+
+    def generate_report(self, yaml_content):
+        from rte_sonar_reports import pdf
+        app = self.application_loader.load(yaml_content)
+        output = io.BytesIO()
+        pdf.export(output, app)
+        return output.getvalue()
+
+    def get_prescription_status(self, yaml_content):
+        app = self.application_loader.load(yaml_content)
+        prescription_status = compute_prescription_status(app, current_datetime_in_paris_timezone())
+        return json.dumps({"name": app.name, "version": app.version,
+                           "prescription_status": prescription_status.name}).encode()
+
+    def warm_up(self):
+        from rte_sonar_reports import pdf
+        pdf.load_all_svg_assets()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.application_loader.close()
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    ROUTES = {
+        "/reports": ("generate_report", "application/pdf"),
+        "/prescription-status": ("get_prescription_status", "application/json"),
+    }
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_error_json(404, f"Unknown resource '{self.path}'")
+            return
+        self.send_body(200, "application/json", json.dumps({"status": "UP"}).encode())
+
+    def do_POST(self):
+        from jsonschema.exceptions import ValidationError
+        if self.path not in self.ROUTES:
+            self.send_error_json(404, f"Unknown resource '{self.path}'")
+            return
+        try:
+            content_length = int(self.headers.get("Content-Length", 0))
+            if content_length < 0:
+                raise ValueError(f"negative value {content_length}")
+        except ValueError as e:
+            self.send_error_json(400, f"Invalid Content-Length header: {e}")
+            return
+        if content_length > MAX_REQUEST_SIZE:
+            self.send_error_json(413, f"Application description is larger than {MAX_REQUEST_SIZE} bytes")
+            return
+        try:
+            yaml_content = self.rfile.read(content_length).decode()
+        except UnicodeDecodeError as e:
+            self.send_error_json(400, f"Application description is not valid UTF-8: {e}")
+            return
+        method_name, content_type = self.ROUTES[self.path]
+        future = self.server.report_service.submit(getattr(self.server.report_service, method_name), yaml_content)
+        if future is None:
+            self.send_error_json(503, "Too many pending reports, retry later", {"Retry-After": str(QUEUE_FULL_RETRY_AFTER)})
+            return
+        try:
+            body = future.result()
+        except (yaml.YAMLError, ValidationError) as e:
+            self.send_error_json(400, f"Invalid application description: {e}")
+            return
+        except SonarApiError as e:
+            self.send_error_json(502, str(e))
+            return
+        except Exception:
+            LOGGER.exception(f"Report request on {self.path} failed")
+            self.send_error_json(500, "Report generation failed")
+            return
+        self.send_body(200, content_type, body)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_body(status, "application/json", json.dumps({"error": message}).encode(), headers)
+
+    def send_body(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOGGER.info(f"{self.address_string()} - {format % args}")
+
+
+class ReportServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, report_service):
+        super().__init__(server_address, ReportRequestHandler)
+        self.report_service = report_service
+
+
+def serve(application_loader, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+    report_service = ReportService(application_loader, workers, queue_size)
+    report_service.warm_up()
+    with ReportServer((host, port), report_service) as server:
+        LOGGER.info(f"Serving Sonar reports on http://{host}:{server.server_address[1]} with {workers} workers")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            LOGGER.info("Stopping Sonar reports service")
+        finally:
+            report_service.close()
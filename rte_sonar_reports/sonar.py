@@ -2,102 +2,577 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import json
 import logging
 import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
-import requests
-
-from rte_sonar_reports.app import Rating
+from rte_sonar_reports.app import Rating, VulnerabilitySummary, DEPENDENCY_VULNERABILITY_RULE, \
+    worst_rating_from_severity_counts
+from rte_sonar_reports.cache import ResponseCache
+from rte_sonar_reports.throttling import AdaptiveRateLimiter, RETRY_STATUS_CODES, retry_after_delay, backoff_delay
 
 LOGGER = logging.getLogger(__name__)
+POOL_SIZE_CONFIG_KEY = "pool_size"
+DEFAULT_POOL_SIZE = 10
+MAX_CONCURRENCY_CONFIG_KEY = "max_concurrency"
+DEFAULT_MAX_CONCURRENCY = 4
+REQUESTS_PER_SECOND_CONFIG_KEY = "requests_per_second"
+MAX_RETRIES_CONFIG_KEY = "max_retries"
+DEFAULT_MAX_RETRIES = 5
+PAGE_SIZE_CONFIG_KEY = "page_size"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MEASURES_SEARCH_CHUNK_SIZE = 50
+SEARCH_RESULTS_LIMIT = 10000
+HISTORY_PAGE_SIZE = 1000
+ISSUE_SEVERITIES = ["BLOCKER", "CRITICAL", "MAJOR", "MINOR", "INFO"]
+SEARCH_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+SEARCH_WINDOW_START = datetime(2000, 1, 1, tzinfo=timezone.utc)
+SEVERITIES_FACET = "severities"
 MAINTAINABILITY_RATING_METRIC_KEY = "sqale_rating"
 LINES_TO_COVER_METRIC_KEY = "lines_to_cover"
 UNCOVERED_LINES_METRIC_KEY = "uncovered_lines"
 CONDITIONS_TO_COVER_METRIC_KEY = "conditions_to_cover"
 UNCOVERED_CONDITIONS_METRIC_KEY = "uncovered_conditions"
 
+CACHEABLE_API_PATHS = ["/api/measures/component",
+                       "/api/measures/search",
+                       "/api/issues/search",
+                       "/api/project_branches/list"]
+
+PROJECT_REQUEST_PARAM_KEYS = ["component", "componentKeys", "projectKeys", "project"]
+
 ALL_METRIC_KEYS = [MAINTAINABILITY_RATING_METRIC_KEY,
                    LINES_TO_COVER_METRIC_KEY,
                    UNCOVERED_LINES_METRIC_KEY,
                    CONDITIONS_TO_COVER_METRIC_KEY,
                    UNCOVERED_CONDITIONS_METRIC_KEY]
 
-class SonarClient:
+
+def get_rating_from_sonar_api_string_value(value):
+    return Rating(int(float(value)))
+
+
+def indicators_request_params(project_key, branch_name):
+    request_params = {"component": project_key, "metricKeys": ",".join(ALL_METRIC_KEYS)}
+    if branch_name:
+        request_params["branch"] = branch_name
+    return request_params
+
+
+def indicators_from_measures(measures):
+    values = {}
+    for metric_key in ALL_METRIC_KEYS:
+        associated_measures = [measure for measure in measures if measure["metric"] == metric_key]
+        values[metric_key] = associated_measures[0]["value"] if associated_measures else 0
+    return {
+        MAINTAINABILITY_RATING_METRIC_KEY: get_rating_from_sonar_api_string_value(values[MAINTAINABILITY_RATING_METRIC_KEY]),
+        LINES_TO_COVER_METRIC_KEY: int(values[LINES_TO_COVER_METRIC_KEY]),
+        UNCOVERED_LINES_METRIC_KEY: int(values[UNCOVERED_LINES_METRIC_KEY]),
+        CONDITIONS_TO_COVER_METRIC_KEY: int(values[CONDITIONS_TO_COVER_METRIC_KEY]),
+        UNCOVERED_CONDITIONS_METRIC_KEY: int(values[UNCOVERED_CONDITIONS_METRIC_KEY])
+    }
+
+
+def indicators_search_request_params(project_keys):
+    return {"projectKeys": ",".join(project_keys), "metricKeys": ",".join(ALL_METRIC_KEYS)}
+
+
+def indicators_by_project_from_measures(project_keys, measures):
+    measures_by_project = {project_key: [] for project_key in project_keys}
+    for measure in measures:
+        if measure["component"] in measures_by_project:
+            measures_by_project[measure["component"]].append(measure)
+    return {project_key: indicators_from_measures(project_measures)
+            for project_key, project_measures in measures_by_project.items()}
+
+
+def history_request_params(project_key, branch_name, from_date=None, page=1):
+    request_params = {"component": project_key, "metrics": ",".join(ALL_METRIC_KEYS), "ps": HISTORY_PAGE_SIZE, "p": page}
+    if branch_name:
+        request_params["branch"] = branch_name
+    if from_date:
+        request_params["from"] = from_date
+    return request_params
+
+
+def history_points_from_measures(measures, after_date=None):
+    points = []
+    for measure in measures:
+        for point in measure["history"]:
+            if "value" not in point:
+                continue
+            date = datetime.strptime(point["date"], SEARCH_DATE_FORMAT).astimezone(timezone.utc).strftime(SEARCH_DATE_FORMAT)
+            if after_date is None or date > after_date:
+                points.append((date, measure["metric"], point["value"]))
+    return points
+
+
+def history_next_pages(response_obj):
+    return list(range(2, math.ceil(response_obj["paging"]["total"] / HISTORY_PAGE_SIZE) + 1))
+
+
+def history_points_from_responses(responses, after_date=None):
+    return [point for response_obj in responses for point in history_points_from_measures(response_obj["measures"], after_date)]
+
+
+def project_keys_chunks(project_keys):
+    unique_project_keys = list(dict.fromkeys(project_keys))
+    return [unique_project_keys[index:index + MEASURES_SEARCH_CHUNK_SIZE]
+            for index in range(0, len(unique_project_keys), MEASURES_SEARCH_CHUNK_SIZE)]
+
+
+def serialize_indicators(indicators):
+    return {metric_key: value.value if isinstance(value, Rating) else value for metric_key, value in indicators.items()}
+
+
+def deserialize_indicators(serialized_indicators):
+    return {metric_key: Rating(value) if metric_key == MAINTAINABILITY_RATING_METRIC_KEY else value
+            for metric_key, value in serialized_indicators.items()}
+
+
+def vulnerabilities_request_params(project_key, branch_name, page_size=DEFAULT_PAGE_SIZE):
+    request_params = {"componentKeys": project_key, "resolved": "false", "types": "VULNERABILITY", "ps": page_size}
+    if branch_name:
+        request_params["branch"] = branch_name
+    return request_params
+
+
+def vulnerability_facets_request_params(project_key, branch_name, rule=None):
+    request_params = vulnerabilities_request_params(project_key, branch_name, page_size=1)
+    request_params["facets"] = SEVERITIES_FACET
+    if rule:
+        request_params["rules"] = rule
+    return request_params
+
+
+def severity_counts_from_facets(response_obj, url):
+    for facet in response_obj.get("facets", []):
+        if facet["property"] == SEVERITIES_FACET:
+            severity_counts = {value["val"]: value["count"] for value in facet["values"]}
+            if sum(severity_counts.values()) != response_obj["total"]:
+                raise SonarApiError(url, 200, f"{SEVERITIES_FACET} facet counts {severity_counts} do not add up to {response_obj['total']} issues")
+            return severity_counts
+    raise SonarApiError(url, 200, f"{SEVERITIES_FACET} facet is missing from the response")
+
+
+def vulnerability_summary_from_severity_counts(all_severity_counts, dependency_severity_counts):
+    non_dependency_severity_counts = {severity: count - dependency_severity_counts.get(severity, 0)
+                                      for severity, count in all_severity_counts.items()}
+    return VulnerabilitySummary(dependency_severity_counts, non_dependency_severity_counts)
+
+
+def number_of_pages(response_obj):
+    return math.ceil(response_obj["total"] / response_obj["ps"])
+
+
+def next_pages_request_params(request_params, response_obj):
+    last_page_num = min(number_of_pages(response_obj), SEARCH_RESULTS_LIMIT // response_obj["ps"])
+    return [{**request_params, "p": page_num} for page_num in range(2, last_page_num + 1)]
+
+
+def creation_window_request_params(request_params, created_after, created_before):
+    request_params = {key: value for key, value in request_params.items() if key not in ("createdAfter", "createdBefore")}
+    if created_after:
+        request_params["createdAfter"] = created_after.strftime(SEARCH_DATE_FORMAT)
+    if created_before:
+        request_params["createdBefore"] = created_before.strftime(SEARCH_DATE_FORMAT)
+    return request_params
+
+
+def search_slices_request_params(request_params):
+    if "severities" not in request_params:
+        return [{**request_params, "severities": severity} for severity in ISSUE_SEVERITIES]
+    created_after = datetime.strptime(request_params["createdAfter"], SEARCH_DATE_FORMAT) \
+        if "createdAfter" in request_params else None
+    created_before = datetime.strptime(request_params["createdBefore"], SEARCH_DATE_FORMAT) \
+        if "createdBefore" in request_params else None
+    window_start = created_after or SEARCH_WINDOW_START
+    window_end = created_before or datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=1)
+    window_middle = window_start + timedelta(seconds=(window_end - window_start).total_seconds() // 2)
+    if window_middle <= window_start:
+        return []
+    return [creation_window_request_params(request_params, created_after, window_middle),
+            creation_window_request_params(request_params, window_middle, created_before)]
+
+
+def unique_issues(issues_slices):
+    issues = []
+    issue_keys = set()
+    for issues_slice in issues_slices:
+        for issue in issues_slice:
+            if "key" in issue:
+                if issue["key"] in issue_keys:
+                    continue
+                issue_keys.add(issue["key"])
+            issues.append(issue)
+    return issues
+
+
+def search_truncation_warning(request_params):
+    return f"More than {SEARCH_RESULTS_LIMIT} issues match {request_params}, only the first ones are retrieved"
+
+
+def issue_search_plan(request_params, response_obj):
+    if response_obj["total"] > SEARCH_RESULTS_LIMIT:
+        slices_request_params = search_slices_request_params(request_params)
+        if slices_request_params:
+            LOGGER.debug(f"{response_obj['total']} issues match {request_params}, search split in {len(slices_request_params)} slices")
+            return slices_request_params, []
+        LOGGER.warning(search_truncation_warning(request_params))
+    return [], next_pages_request_params(request_params, response_obj)
+
+
+def issues_from_pages(pages):
+    return [issue for page in pages for issue in page["issues"]]
+
+
+def request_batches(all_request_params, batch_size):
+    return [all_request_params[batch_start:batch_start + batch_size] for batch_start in range(0, len(all_request_params), batch_size)]
+
+
+def branches_request_params(project_key):
+    return {"project": project_key}
+
+
+def main_branch_from_branches(project_key, branches):
+    main_branches = [branch for branch in branches if branch["isMain"]]
+    if len(main_branches) == 0:
+        LOGGER.error(f"No main branches found for project {project_key}")
+        return None
+    elif len(main_branches) > 1:
+        first_main_branch = main_branches[0]["name"]
+        LOGGER.warning(f"Multiple main branches found for project {project_key}, using first one {first_main_branch}")
+        return first_main_branch
+    else:
+        main_branch = main_branches[0]["name"]
+        LOGGER.info(f"Main branch for project {project_key} is {main_branch}")
+        return main_branch
+
+
+def request_project_keys(params):
+    return sorted({project_key for param_key in PROJECT_REQUEST_PARAM_KEYS if param_key in params
+                   for project_key in str(params[param_key]).split(",")})
+
+
+def analysis_dates_from_branches(branches):
+    return {branch["name"]: branch.get("analysisDate") for branch in branches}
+
+
+def analysis_date_from_branches(branches, branch_name):
+    for branch in branches:
+        if branch["name"] == branch_name:
+            return branch.get("analysisDate")
+    return None
+
+
+def sonar_config_value(sonar_config, key, default):
+    return int(sonar_config.get(key, default))
+
+
+def sonar_config_requests_per_second(sonar_config):
+    return float(sonar_config[REQUESTS_PER_SECOND_CONFIG_KEY]) if REQUESTS_PER_SECOND_CONFIG_KEY in sonar_config else None
+
+
+def sonar_config_page_size(sonar_config):
+    return max(1, min(sonar_config_value(sonar_config, PAGE_SIZE_CONFIG_KEY, DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+class SonarApiError(Exception):
+    def __init__(self, url, status_code, reason):
+        super().__init__(f"Sonar API request '{url}' failed with status {status_code}: {reason}")
+        self.url = url
+        self.status_code = status_code
+
+
+def throttling_delay(retry_after, attempt):
+    delay = retry_after_delay(retry_after)
+    return delay if delay is not None else backoff_delay(attempt)
+
+
+def raise_for_sonar_status(url, status_code, body):
+    if status_code >= 400:
+        raise SonarApiError(url, status_code, body[:200])
+
+
+class JsonRequestPlan:
+
+    def __init__(self, path, params, response_cache=None, cache_key=None):
+        self.path = path
+        self.params = params
+        self.response_cache = response_cache
+        self.cache_key = cache_key
+        self.cached_response = response_cache.get(cache_key) if cache_key is not None else None
+
+    @property
+    def is_fresh(self):
+        return self.cached_response is not None and self.cached_response.is_fresh
+
+    @property
+    def headers(self):
+        return self.cached_response.revalidation_headers() if self.cached_response is not None else None
+
+    def cached_response_obj(self):
+        LOGGER.debug(f"Cached response used for {self.path} with parameters {self.params}")
+        return json.loads(self.cached_response.body)
+
+    def response_obj(self, status_code, headers, body):
+        if status_code == 304 and self.cached_response is not None:
+            LOGGER.debug(f"Cached response revalidated for {self.path} with parameters {self.params}")
+            self.response_cache.refresh(self.cache_key)
+            return json.loads(self.cached_response.body)
+        if self.cache_key is not None:
+            self.response_cache.put(self.cache_key, body, headers.get("ETag"), headers.get("Last-Modified"))
+        response_obj = json.loads(body)
+        LOGGER.debug(f"{response_obj}")
+        return response_obj
+
+
+class BranchCache:
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.entries = {}
+        self.resolution_locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, server, project_key):
+        with self.lock:
+            entry = self.entries.get((server, project_key))
+        if entry is None:
+            return False, None
+        resolution_time, branch_name = entry
+        if self.ttl is not None and time.monotonic() - resolution_time > self.ttl:
+            return False, None
+        return True, branch_name
+
+    def put(self, server, project_key, branch_name):
+        with self.lock:
+            self.entries[(server, project_key)] = (time.monotonic(), branch_name)
+
+    def get_or_resolve(self, server, project_key, resolve):
+        with self.lock:
+            resolution_lock = self.resolution_locks.setdefault((server, project_key), threading.Lock())
+        with resolution_lock:
+            found, branch_name = self.get(server, project_key)
+            if not found:
+                branch_name = resolve(project_key)
+                self.put(server, project_key, branch_name)
+            return branch_name
+
+
+class BaseSonarClient:
 
     EMPTY_PASSWORD_FIELD = ""
 
-    def __init__(self, sonar_config):
+    def __init__(self, sonar_config, branch_cache=None, response_cache=None):
         self.base_url = sonar_config["base_url"]
-        self.auth = (sonar_config["token"], SonarClient.EMPTY_PASSWORD_FIELD) if "token" in sonar_config else None
+        self.token = sonar_config["token"] if "token" in sonar_config else None
+        self.response_cache = response_cache
+        self.cache_identity = [self.base_url, self.token]
+        self.pool_size = sonar_config_value(sonar_config, POOL_SIZE_CONFIG_KEY, DEFAULT_POOL_SIZE)
+        self.max_concurrency = sonar_config_value(sonar_config, MAX_CONCURRENCY_CONFIG_KEY, DEFAULT_MAX_CONCURRENCY)
+        self.page_size = sonar_config_page_size(sonar_config)
+        self.max_retries = sonar_config_value(sonar_config, MAX_RETRIES_CONFIG_KEY, DEFAULT_MAX_RETRIES)
+        self.rate_limiter = AdaptiveRateLimiter(sonar_config_requests_per_second(sonar_config))
+        self.branch_cache = branch_cache if branch_cache is not None else BranchCache()
+        self.analysis_dates = {}
+
+    def plan_json_request(self, path, params, use_cache=True):
+        if self.response_cache is None or not use_cache or path not in CACHEABLE_API_PATHS:
+            return JsonRequestPlan(path, params)
+        cache_identity = self.cache_identity + [[project_key, self.analysis_dates[project_key]] for project_key in request_project_keys(params)
+                                                if project_key in self.analysis_dates]
+        return JsonRequestPlan(path, params, self.response_cache, ResponseCache.make_key(cache_identity, path, params))
+
+    def severity_counts(self, response_obj):
+        return severity_counts_from_facets(response_obj, self.base_url + "/api/issues/search")
+
+    def record_analysis_dates(self, project_key, branches):
+        self.analysis_dates[project_key] = analysis_dates_from_branches(branches)
+        self.branch_cache.put(self.base_url, project_key, main_branch_from_branches(project_key, branches))
+
+    def is_throttled(self, path, status_code, retry_after, attempt):
+        if status_code not in RETRY_STATUS_CODES:
+            self.rate_limiter.on_success()
+            return False
+        delay = throttling_delay(retry_after, attempt)
+        self.rate_limiter.on_throttled(delay)
+        LOGGER.warning(f"Sonar server {self.base_url} answered {status_code} to {path} request (attempt {attempt + 1}), "
+                       f"throttling for {delay:.1f}s")
+        return True
+
+
+class SonarClient(BaseSonarClient):
+
+    def __init__(self, sonar_config, branch_cache=None, response_cache=None):
+        super().__init__(sonar_config, branch_cache, response_cache)
+        self.auth = (self.token, SonarClient.EMPTY_PASSWORD_FIELD) if self.token is not None else None
+        self.concurrency_limiter = threading.BoundedSemaphore(self.max_concurrency)
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        self.session.headers.update({"Accept": "application/json"})
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def get_json(self, path, params, use_cache=True):
+        request_plan = self.plan_json_request(path, params, use_cache)
+        if request_plan.is_fresh:
+            return request_plan.cached_response_obj()
+        response = self.request(path, params, request_plan.headers)
+        return request_plan.response_obj(response.status_code, response.headers, response.text)
+
+    def request(self, path, params, headers=None):
+        for attempt in range(self.max_retries + 1):
+            delay = self.rate_limiter.reserve()
+            if delay > 0:
+                time.sleep(delay)
+            with self.concurrency_limiter:
+                response = self.session.get(self.base_url + path, params=params, headers=headers)
+            LOGGER.debug(f"Response {response}")
+            if not self.is_throttled(path, response.status_code, response.headers.get("Retry-After"), attempt):
+                break
+        raise_for_sonar_status(response.url, response.status_code, response.text)
+        return response
 
     @staticmethod
     def get_rating_from_sonar_api_string_value(value):
-        return Rating(int(float(value)))
+        return get_rating_from_sonar_api_string_value(value)
 
     def get_all_indicators(self, project_key, branch_name):
-        request_params = {"component": project_key, "metricKeys": ",".join(ALL_METRIC_KEYS)}
-        request_params["branch"] = branch_name if branch_name else self.find_default_branch(project_key)
-
-        response = requests.get(self.base_url + "/api/measures/component",
-                                params=request_params,
-                                auth=self.auth)
-        LOGGER.debug(f"Response {response}")
-        LOGGER.debug(f"{response.json()}")
-        component = response.json()["component"]
-        values = {}
-        for metric_key in ALL_METRIC_KEYS:
-            associated_measures = [measure for measure in component["measures"] if measure["metric"] == metric_key]
-            values[metric_key] = associated_measures[0]["value"] if associated_measures else 0
-        return {
-            MAINTAINABILITY_RATING_METRIC_KEY: self.get_rating_from_sonar_api_string_value(values[MAINTAINABILITY_RATING_METRIC_KEY]),
-            LINES_TO_COVER_METRIC_KEY: int(values[LINES_TO_COVER_METRIC_KEY]),
-            UNCOVERED_LINES_METRIC_KEY: int(values[UNCOVERED_LINES_METRIC_KEY]),
-            CONDITIONS_TO_COVER_METRIC_KEY: int(values[CONDITIONS_TO_COVER_METRIC_KEY]),
-            UNCOVERED_CONDITIONS_METRIC_KEY: int(values[UNCOVERED_CONDITIONS_METRIC_KEY])
-        }
+        if not branch_name:
+            branch_name = self.find_default_branch(project_key)
+        component = self.get_json("/api/measures/component", indicators_request_params(project_key, branch_name))["component"]
+        return indicators_from_measures(component["measures"])
+
+    def get_all_default_branch_indicators(self, project_keys):
+        chunks = project_keys_chunks(project_keys)
+        if not chunks:
+            return {}
+        indicators_by_project = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(chunks))) as executor:
+            for chunk, response_obj in zip(chunks, executor.map(
+                    lambda chunk: self.get_json("/api/measures/search", indicators_search_request_params(chunk)), chunks)):
+                indicators_by_project.update(indicators_by_project_from_measures(chunk, response_obj["measures"]))
+        return indicators_by_project
 
     def get_all_vulnerabilities_sorted(self, project_key, branch_name):
-        request_params = {"componentKeys": project_key, "resolved": "false", "types": "VULNERABILITY"}
-        request_params["branch"] = branch_name if branch_name else self.find_default_branch(project_key)
-
-        response = requests.get(self.base_url + "/api/issues/search",
-                                params=request_params,
-                                auth=self.auth)
-        LOGGER.debug(f"Response {response}")
-        LOGGER.debug(f"{response.json()}")
-        response_obj = response.json()
-        number_of_vulnerabilities = response_obj["total"]
-        number_of_vulnerabilities_per_page = response_obj["ps"]
-        vulnerabilities = []
-        vulnerabilities += response_obj["issues"]
-        for page_num in range(2, math.ceil(number_of_vulnerabilities / number_of_vulnerabilities_per_page) + 1):
-            request_params["p"] = page_num
-            response = requests.get(self.base_url + "/api/issues/search",
-                                    params=request_params,
-                                    auth=self.auth)
-            LOGGER.debug(f"Response {response}")
-            LOGGER.debug(f"{response.json()}")
-            response_obj = response.json()
-            vulnerabilities += response_obj["issues"]
-        return vulnerabilities
+        if not branch_name:
+            branch_name = self.find_default_branch(project_key)
+        return self.search_issues(vulnerabilities_request_params(project_key, branch_name, self.page_size))
+
+    def get_issues_page(self, request_params):
+        return self.get_json("/api/issues/search", request_params)
+
+    def search_issues(self, request_params):
+        response_obj = self.get_issues_page(request_params)
+        slices_request_params, next_pages_params = issue_search_plan(request_params, response_obj)
+        if slices_request_params:
+            return unique_issues(self.map_concurrently(self.search_issues, slices_request_params))
+        return issues_from_pages([response_obj] + self.map_concurrently(self.get_issues_page, next_pages_params))
+
+    def iter_issue_pages(self, request_params):
+        response_obj = self.get_issues_page(request_params)
+        slices_request_params, next_pages_params = issue_search_plan(request_params, response_obj)
+        if slices_request_params:
+            for slice_request_params in slices_request_params:
+                yield from self.iter_issue_pages(slice_request_params)
+            return
+        yield response_obj["issues"]
+        for next_pages_batch in request_batches(next_pages_params, self.max_concurrency):
+            for next_page in self.map_concurrently(self.get_issues_page, next_pages_batch):
+                yield next_page["issues"]
+
+    def get_streamed_vulnerability_summary(self, project_key, branch_name):
+        if not branch_name:
+            branch_name = self.find_default_branch(project_key)
+        vulnerability_summary = VulnerabilitySummary()
+        for issues in self.iter_issue_pages(vulnerabilities_request_params(project_key, branch_name, self.page_size)):
+            vulnerability_summary.add_vulnerabilities(issues)
+        return vulnerability_summary
+
+    def get_measures_history(self, project_key, branch_name, after_date=None):
+        response_obj = self.get_json("/api/measures/search_history", history_request_params(project_key, branch_name, after_date))
+        return history_points_from_responses([response_obj] + self.map_concurrently(
+            lambda page: self.get_json("/api/measures/search_history", history_request_params(project_key, branch_name, after_date, page)),
+            history_next_pages(response_obj)), after_date)
+
+    def map_concurrently(self, function, items):
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as executor:
+            return list(executor.map(function, items))
+
+    def get_vulnerability_summary(self, project_key, branch_name):
+        if not branch_name:
+            branch_name = self.find_default_branch(project_key)
+        all_vulnerabilities = self.get_json("/api/issues/search",
+                                            vulnerability_facets_request_params(project_key, branch_name))
+        dependency_vulnerabilities = self.get_json("/api/issues/search",
+                                                   vulnerability_facets_request_params(project_key, branch_name, DEPENDENCY_VULNERABILITY_RULE))
+        return vulnerability_summary_from_severity_counts(self.severity_counts(all_vulnerabilities),
+                                                          self.severity_counts(dependency_vulnerabilities))
+
+    def get_non_dependency_vulnerability_summary(self, project_key, branch_name):
+        if not branch_name:
+            branch_name = self.find_default_branch(project_key)
+        all_severity_counts = self.severity_counts(
+            self.get_json("/api/issues/search", vulnerability_facets_request_params(project_key, branch_name)))
+        if worst_rating_from_severity_counts(all_severity_counts) <= Rating.A:
+            return VulnerabilitySummary(non_dependency_severity_counts=all_severity_counts)
+        dependency_vulnerabilities = self.get_json("/api/issues/search",
+                                                   vulnerability_facets_request_params(project_key, branch_name, DEPENDENCY_VULNERABILITY_RULE))
+        return vulnerability_summary_from_severity_counts(all_severity_counts, self.severity_counts(dependency_vulnerabilities))
 
     def find_default_branch(self, project_key):
-        request_params = {"project": project_key}
-        response = requests.get(self.base_url + "/api/project_branches/list",
-                                params=request_params,
-                                auth=self.auth)
-        LOGGER.debug(f"Response {response}")
-        LOGGER.debug(f"{response.json()}")
-        main_branches = [branch for branch in response.json()["branches"] if branch["isMain"]]
-        if len(main_branches) == 0:
-            LOGGER.error(f"No main branches found for project {project_key}")
-            return None
-        elif len(main_branches) > 1:
-            first_main_branch = main_branches[0]["name"]
-            LOGGER.warning(f"Multiple main branches found for project {project_key}, using first one {first_main_branch}")
-            return first_main_branch
-        else:
-            main_branch = main_branches[0]["name"]
-            LOGGER.info(f"Main branch for project {project_key} is {main_branch}")
-            return main_branch
+        return self.branch_cache.get_or_resolve(self.base_url, project_key, self.fetch_default_branch)
+
+    def find_default_branches(self, project_keys):
+        unique_project_keys = list(dict.fromkeys(project_keys))
+        if not unique_project_keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(unique_project_keys))) as executor:
+            return dict(zip(unique_project_keys, executor.map(self.find_default_branch, unique_project_keys)))
+
+    def fetch_default_branch(self, project_key):
+        return main_branch_from_branches(project_key, self.get_project_branches(project_key))
+
+    def get_project_branches(self, project_key, use_cache=True):
+        return self.get_json("/api/project_branches/list", branches_request_params(project_key), use_cache)["branches"]
+
+    def probe_project_branches(self, project_key):
+        branches = self.get_project_branches(project_key, use_cache=False)
+        self.record_analysis_dates(project_key, branches)
+        return branches
+
+
+class SonarClientRegistry:
+
+    def __init__(self, sonar_configs, branch_cache=None, response_cache=None):
+        self.sonar_configs = sonar_configs
+        self.branch_cache = branch_cache if branch_cache is not None else BranchCache()
+        self.response_cache = response_cache
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def get(self, sonar_config_name):
+        with self.lock:
+            if sonar_config_name not in self.clients:
+                self.clients[sonar_config_name] = SonarClient(self.sonar_configs[sonar_config_name], self.branch_cache,
+                                                              self.response_cache)
+            return self.clients[sonar_config_name]
 
+    def close(self):
+        for client in self.clients.values():
+            client.close()
+        self.clients.clear()
@@ -0,0 +1,184 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import asyncio
+import base64
+import logging
+
+import aiohttp
+
+from rte_sonar_reports.app import VulnerabilitySummary, DEPENDENCY_VULNERABILITY_RULE
+from rte_sonar_reports.sonar import BaseSonarClient, BranchCache, raise_for_sonar_status, \
+    indicators_request_params, indicators_from_measures, vulnerabilities_request_params, \
+    branches_request_params, main_branch_from_branches, \
+    vulnerability_facets_request_params, vulnerability_summary_from_severity_counts, \
+    indicators_search_request_params, indicators_by_project_from_measures, project_keys_chunks, \
+    issue_search_plan, issues_from_pages, request_batches, unique_issues, \
+    history_request_params, history_next_pages, history_points_from_responses
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncSonarClient(BaseSonarClient):
+
+    def __init__(self, sonar_config, branch_cache=None, response_cache=None):
+        super().__init__(sonar_config, branch_cache, response_cache)
+        self.headers = {"Accept": "application/json"}
+        if self.token is not None:
+            credentials = f"{self.token}:{AsyncSonarClient.EMPTY_PASSWORD_FIELD}".encode()
+            self.headers["Authorization"] = f"Basic {base64.b64encode(credentials).decode()}"
+        self.concurrency_limiter = asyncio.BoundedSemaphore(self.max_concurrency)
+        self.branch_resolutions = {}
+        self.session = None
+
+    def get_session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(headers=self.headers,
+                                                 connector=aiohttp.TCPConnector(limit=self.pool_size))
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get_json(self, path, params, use_cache=True):
+        request_plan = self.plan_json_request(path, params, use_cache)
+        if request_plan.is_fresh:
+            return request_plan.cached_response_obj()
+        status, response_headers, body = await self.request(path, params, request_plan.headers)
+        return request_plan.response_obj(status, response_headers, body)
+
+    async def request(self, path, params, headers=None):
+        for attempt in range(self.max_retries + 1):
+            delay = self.rate_limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with self.concurrency_limiter:
+                async with self.get_session().get(self.base_url + path, params=params, headers=headers) as response:
+                    LOGGER.debug(f"Response {response}")
+                    status, response_headers, body = response.status, response.headers, await response.text()
+                    url = str(response.url)
+            if not self.is_throttled(path, status, response_headers.get("Retry-After"), attempt):
+                break
+        raise_for_sonar_status(url, status, body)
+        return status, response_headers, body
+
+    async def get_all_indicators(self, project_key, branch_name):
+        if not branch_name:
+            branch_name = await self.find_default_branch(project_key)
+        response_obj = await self.get_json("/api/measures/component", indicators_request_params(project_key, branch_name))
+        return indicators_from_measures(response_obj["component"]["measures"])
+
+    async def get_all_default_branch_indicators(self, project_keys):
+        chunks = project_keys_chunks(project_keys)
+        responses = await self.map_concurrently(lambda chunk: self.get_json("/api/measures/search", indicators_search_request_params(chunk)),
+                                                chunks)
+        indicators_by_project = {}
+        for chunk, response_obj in zip(chunks, responses):
+            indicators_by_project.update(indicators_by_project_from_measures(chunk, response_obj["measures"]))
+        return indicators_by_project
+
+    async def get_all_vulnerabilities_sorted(self, project_key, branch_name):
+        if not branch_name:
+            branch_name = await self.find_default_branch(project_key)
+        return await self.search_issues(vulnerabilities_request_params(project_key, branch_name, self.page_size))
+
+    async def get_issues_page(self, request_params):
+        return await self.get_json("/api/issues/search", request_params)
+
+    async def search_issues(self, request_params):
+        response_obj = await self.get_issues_page(request_params)
+        slices_request_params, next_pages_params = issue_search_plan(request_params, response_obj)
+        if slices_request_params:
+            return unique_issues(await self.map_concurrently(self.search_issues, slices_request_params))
+        return issues_from_pages([response_obj] + await self.map_concurrently(self.get_issues_page, next_pages_params))
+
+    async def iter_issue_pages(self, request_params):
+        response_obj = await self.get_issues_page(request_params)
+        slices_request_params, next_pages_params = issue_search_plan(request_params, response_obj)
+        if slices_request_params:
+            for slice_request_params in slices_request_params:
+                async for issues in self.iter_issue_pages(slice_request_params):
+                    yield issues
+            return
+        yield response_obj["issues"]
+        for next_pages_batch in request_batches(next_pages_params, self.max_concurrency):
+            for next_page in await self.map_concurrently(self.get_issues_page, next_pages_batch):
+                yield next_page["issues"]
+
+    async def get_streamed_vulnerability_summary(self, project_key, branch_name):
+        if not branch_name:
+            branch_name = await self.find_default_branch(project_key)
+        vulnerability_summary = VulnerabilitySummary()
+        async for issues in self.iter_issue_pages(vulnerabilities_request_params(project_key, branch_name, self.page_size)):
+            vulnerability_summary.add_vulnerabilities(issues)
+        return vulnerability_summary
+
+    async def get_vulnerability_summary(self, project_key, branch_name):
+        if not branch_name:
+            branch_name = await self.find_default_branch(project_key)
+        all_vulnerabilities, dependency_vulnerabilities = await asyncio.gather(
+            self.get_json("/api/issues/search", vulnerability_facets_request_params(project_key, branch_name)),
+            self.get_json("/api/issues/search", vulnerability_facets_request_params(project_key, branch_name, DEPENDENCY_VULNERABILITY_RULE)))
+        return vulnerability_summary_from_severity_counts(self.severity_counts(all_vulnerabilities),
+                                                          self.severity_counts(dependency_vulnerabilities))
+
+    async def get_measures_history(self, project_key, branch_name, after_date=None):
+        response_obj = await self.get_json("/api/measures/search_history", history_request_params(project_key, branch_name, after_date))
+        return history_points_from_responses([response_obj] + await self.map_concurrently(
+            lambda page: self.get_json("/api/measures/search_history", history_request_params(project_key, branch_name, after_date, page)),
+            history_next_pages(response_obj)), after_date)
+
+    @staticmethod
+    async def map_concurrently(function, items):
+        return list(await asyncio.gather(*[function(item) for item in items]))
+
+    async def find_default_branch(self, project_key):
+        found, branch_name = self.branch_cache.get(self.base_url, project_key)
+        if found:
+            return branch_name
+        if project_key not in self.branch_resolutions:
+            self.branch_resolutions[project_key] = asyncio.ensure_future(self.fetch_default_branch(project_key))
+        try:
+            branch_name = await self.branch_resolutions[project_key]
+        finally:
+            self.branch_resolutions.pop(project_key, None)
+        self.branch_cache.put(self.base_url, project_key, branch_name)
+        return branch_name
+
+    async def find_default_branches(self, project_keys):
+        unique_project_keys = list(dict.fromkeys(project_keys))
+        branch_names = await asyncio.gather(*[self.find_default_branch(project_key) for project_key in unique_project_keys])
+        return dict(zip(unique_project_keys, branch_names))
+
+    async def fetch_default_branch(self, project_key):
+        return main_branch_from_branches(project_key, await self.get_project_branches(project_key))
+
+    async def get_project_branches(self, project_key, use_cache=True):
+        return (await self.get_json("/api/project_branches/list", branches_request_params(project_key), use_cache))["branches"]
+
+    async def probe_project_branches(self, project_key):
+        branches = await self.get_project_branches(project_key, use_cache=False)
+        self.record_analysis_dates(project_key, branches)
+        return branches
+
+
+class AsyncSonarClientRegistry:
+
+    def __init__(self, sonar_configs, branch_cache=None, response_cache=None):
+        self.sonar_configs = sonar_configs
+        self.branch_cache = branch_cache if branch_cache is not None else BranchCache()
+        self.response_cache = response_cache
+        self.clients = {}
+
+    def get(self, sonar_config_name):
+        if sonar_config_name not in self.clients:
+            self.clients[sonar_config_name] = AsyncSonarClient(self.sonar_configs[sonar_config_name], self.branch_cache,
+                                                                   self.response_cache)
+        return self.clients[sonar_config_name]
+
+    async def close(self):
+        await asyncio.gather(*[client.close() for client in self.clients.values()])
+        self.clients.clear()
@@ -0,0 +1,68 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import email.utils
+import random
+import threading
+import time
+
+RETRY_STATUS_CODES = [429, 502, 503, 504]
+BACKOFF_BASE_DELAY = 0.5
+BACKOFF_MAX_DELAY = 60
+MIN_RATE_RATIO = 0.05
+RATE_INCREASE_RATIO = 0.05
+THROTTLING_RATE_DECREASE_RATIO = 0.5
+
+
+def retry_after_delay(retry_after):
+    if not retry_after:
+        return None
+    try:
+        return min(BACKOFF_MAX_DELAY, max(0.0, float(retry_after)))
+    except ValueError:
+        pass
+    try:
+        retry_date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return min(BACKOFF_MAX_DELAY, max(0.0, retry_date.timestamp() - time.time()))
+
+
+def backoff_delay(attempt):
+    return random.uniform(0, min(BACKOFF_MAX_DELAY, BACKOFF_BASE_DELAY * 2 ** attempt))
+
+
+class AdaptiveRateLimiter:
+
+    def __init__(self, requests_per_second=None):
+        self.max_rate = requests_per_second
+        self.rate = requests_per_second
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            pause_delay = max(0.0, self.paused_until - now)
+            if self.rate is None:
+                return pause_delay
+            self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1
+            token_delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(pause_delay, token_delay)
+
+    def on_success(self):
+        if self.max_rate is None:
+            return
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_INCREASE_RATIO)
+
+    def on_throttled(self, delay):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            if self.max_rate is not None:
+                self.rate = max(self.max_rate * MIN_RATE_RATIO, self.rate * THROTTLING_RATE_DECREASE_RATIO)
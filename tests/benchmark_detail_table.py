@@ -0,0 +1,48 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import io
+import sys
+import time
+import tracemalloc
+
+from rte_sonar_reports import pdf
+from rte_sonar_reports.app import Application, Module, Rating
+
+MODULE_COUNTS = [100, 1000, 10000]
+
+
+def create_application(module_count):
+    app = Application("Benchmark application", "1.0.0")
+    for index in range(module_count):
+        app.add_module(Module(f"Module {index}", branch_name="main", module_type=Module.Type(index % 3),
+                              maintainability_rating=Rating(index % 5 + 1), lines_to_cover=100 + index,
+                              uncovered_lines=index % 100, vulnerabilities=[{"rule": "any", "severity": "MINOR"}]))
+    return app
+
+
+def export(app):
+    output = io.BytesIO()
+    pdf.export(output, app)
+    return output.getvalue()
+
+
+def benchmark(module_count):
+    app = create_application(module_count)
+    start = time.perf_counter()
+    report = export(app)
+    duration = time.perf_counter() - start
+    tracemalloc.start()
+    export(app)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak_memory, len(report)
+
+
+if __name__ == '__main__':
+    module_counts = [int(module_count) for module_count in sys.argv[1:]] or MODULE_COUNTS
+    print(f"{'Modules':>8} | {'Build time (s)':>14} | {'Peak memory (MB)':>16} | {'PDF size (kB)':>13}")
+    for module_count in module_counts:
+        duration, peak_memory, pdf_size = benchmark(module_count)
+        print(f"{module_count:>8} | {duration:>14.2f} | {peak_memory / 1024 / 1024:>16.1f} | {pdf_size / 1024:>13.0f}")
@@ -163,7 +163,8 @@ def example_report_generation_with_mocks(mocker):
                                   """)
     sonar_configs = configparser.ConfigParser()
     sonar_configs.read("sonar_config_example.ini")
-    app = ApplicationLoader(sonar_configs).load_file("application_description_example.yml")
+    app = ApplicationLoader(sonar_configs, vulnerability_fetch_mode=ApplicationLoader.VulnerabilityFetchMode.DETAILS) \
+        .load_file("application_description_example.yml")
     pdf.export("report_example.pdf", app)
     images = convert_from_path("report_example.pdf", size=(1000, None))
     images[0].save("report_example.png")
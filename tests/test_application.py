@@ -4,6 +4,8 @@
 
 import math
 
+import pytest
+
 from rte_sonar_reports.app import Application, Module, Rating, DEPENDENCY_VULNERABILITY_RULE
 
 TEST_APPLICATION_NAME = "My application"
@@ -156,3 +158,54 @@ def test_application_worst_maintainability_rating_is_the_worse_of_its_modules_se
     my_application.add_module(Module("Backend 3", maintainability_rating=Rating.NOT_CALCULATED))
     my_application.add_module(Module("Backend 4", maintainability_rating=Rating.A))
     assert my_application.worst_maintainability_rating() == Rating.B
+
+
+def test_application_aggregates_are_recomputed_when_a_module_is_added():
+    my_application = Application(TEST_APPLICATION_NAME, TEST_APPLICATION_VERSION)
+    my_application.add_module(Module("Backend 1", module_type=Module.Type.BACKEND, lines_to_cover=100, uncovered_lines=50,
+                                     vulnerabilities=[{"rule": "any", "severity": "MINOR"}]))
+    assert my_application.worst_non_dependency_security_rating() == Rating.B
+    assert my_application.aggregated_backend_coverage() == 50.0
+    my_application.add_module(Module("Backend 2", module_type=Module.Type.BACKEND, lines_to_cover=100, uncovered_lines=0,
+                                     vulnerabilities=[{"rule": "any", "severity": "MAJOR"}]))
+    assert my_application.worst_non_dependency_security_rating() == Rating.C
+    assert my_application.aggregated_backend_coverage() == 75.0
+
+
+def test_application_aggregates_are_recomputed_when_one_of_its_modules_changes():
+    my_module = Module("Backend", module_type=Module.Type.BACKEND, lines_to_cover=100, uncovered_lines=50,
+                       vulnerabilities=[{"rule": "any", "severity": "MINOR"}])
+    my_application = Application(TEST_APPLICATION_NAME, TEST_APPLICATION_VERSION)
+    my_application.add_module(my_module)
+    module_aggregates = my_module.aggregates
+    assert my_application.worst_non_dependency_security_rating() == Rating.B
+    assert my_application.aggregated_backend_coverage() == 50.0
+    my_module.vulnerabilities = [{"rule": "any", "severity": "BLOCKER"}]
+    my_module.uncovered_lines = 0
+    assert my_application.worst_non_dependency_security_rating() == Rating.E
+    assert my_application.aggregated_backend_coverage() == 100.0
+    assert my_module.aggregates is module_aggregates
+
+
+def test_application_modules_can_only_be_added_through_add_module():
+    my_application = Application(TEST_APPLICATION_NAME, TEST_APPLICATION_VERSION)
+    with pytest.raises(AttributeError):
+        my_application.modules.append(Module("Backend"))
+
+
+def test_application_snapshot_keeps_aggregated_indicators():
+    my_application = Application(TEST_APPLICATION_NAME, TEST_APPLICATION_VERSION)
+    my_application.add_module(Module("Backend 1", branch_name="main", module_type=Module.Type.BACKEND, lines_to_cover=100,
+                                     uncovered_lines=20, maintainability_rating=Rating.B,
+                                     vulnerabilities=[{"rule": DEPENDENCY_VULNERABILITY_RULE, "severity": "CRITICAL"},
+                                                      {"rule": "any", "severity": "MINOR"}]))
+    my_application.add_module(Module("Frontend 1", module_type=Module.Type.FRONTEND))
+    snapshot = Application.from_dict(my_application.to_dict())
+    assert (snapshot.name, snapshot.version) == (TEST_APPLICATION_NAME, TEST_APPLICATION_VERSION)
+    assert [(module.name, module.branch_name, module.module_type) for module in snapshot.modules] == \
+           [("Backend 1", "main", Module.Type.BACKEND), ("Frontend 1", None, Module.Type.FRONTEND)]
+    assert snapshot.worst_non_dependency_security_rating() == Rating.B
+    assert snapshot.worst_dependency_security_rating() == Rating.D
+    assert snapshot.worst_maintainability_rating() == Rating.B
+    assert snapshot.aggregated_backend_coverage() == 80.0
+    assert snapshot.modules[1].non_dependency_security_rating() == Rating.NOT_CALCULATED
@@ -2,12 +2,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import configparser
 import math
+import threading
+import time
 
 import pytest
 from jsonschema.exceptions import ValidationError
 
-from rte_sonar_reports.loaders import ApplicationLoader
+from rte_sonar_reports.loaders import ApplicationLoader, get_application_description_validator
 from rte_sonar_reports.app import Module, Rating
 
 
@@ -45,6 +48,10 @@ def test_loading_fails_in_case_of_module_without_name():
         """)
 
 
+def test_application_description_validator_is_built_once():
+    assert get_application_description_validator() is get_application_description_validator()
+
+
 def test_loading_application_with_no_module():
     app = ApplicationLoader({}).load("""
     application:
@@ -182,3 +189,73 @@ def test_loading_complete_application():
     assert app.modules[3].name == "Other module"
     assert app.modules[3].module_type == Module.Type.OTHER
     assert app.modules[3].branch_name == "main"
+
+
+def test_loading_application_with_modules_fetched_in_parallel_keeps_description_order(requests_mock):
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config]
+        base_url = https://my-sonar-test-url.com
+        max_concurrency = 2
+        """)
+    lock = threading.Lock()
+    in_flight_requests = []
+    max_in_flight_requests = []
+
+    def slow_response(body):
+        def callback(request, context):
+            with lock:
+                in_flight_requests.append(request)
+                max_in_flight_requests.append(len(in_flight_requests))
+            time.sleep(0.01)
+            with lock:
+                in_flight_requests.remove(request)
+            return body
+        return callback
+
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/component",
+                      text=slow_response("""{"component": {"key": "module", "measures": []}}"""))
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search",
+                      text=slow_response("""{"p": 1, "ps": 100, "total": 0, "issues": [], "facets": [{"property": "severities", "values": []}]}"""))
+    modules = "".join(f"""
+            - name: Module {index}
+              project_key: module_{index}
+              branch: main
+              sonar_config: Sonar config
+              type: backend""" for index in range(20))
+    app = ApplicationLoader(sonar_configs, max_workers=8).load(f"""
+        application:
+          name: My test application
+          version: 1.0.0
+          modules:{modules}
+        """)
+    assert [module.name for module in app.modules] == [f"Module {index}" for index in range(20)]
+    assert max(max_in_flight_requests) <= 2
+
+
+def test_loading_several_applications_fetches_shared_modules_once(requests_mock):
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config]
+        base_url = https://my-sonar-test-url.com
+        """)
+    requests_mock.get("https://my-sonar-test-url.com/api/project_branches/list",
+                      json={"branches": [{"name": "main", "isMain": True}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/search",
+                      json={"measures": [{"component": "shared_library", "metric": "lines_to_cover", "value": "100"}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search",
+                      json={"p": 1, "ps": 1, "total": 0, "issues": [], "facets": [{"property": "severities", "values": []}]})
+    apps = ApplicationLoader(sonar_configs).load_all([f"""
+        application:
+          name: Application {index}
+          version: 1.0.0
+          modules:
+            - name: Shared library
+              project_key: shared_library
+              sonar_config: Sonar config
+              type: backend
+        """ for index in range(3)])
+    assert [app.name for app in apps] == ["Application 0", "Application 1", "Application 2"]
+    assert all(app.modules[0].lines_to_cover == 100 for app in apps)
+    assert [request.path for request in requests_mock.request_history] == \
+           ["/api/project_branches/list", "/api/measures/search", "/api/issues/search", "/api/issues/search"]
@@ -0,0 +1,228 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import configparser
+import urllib.parse
+
+import pytest
+
+from rte_sonar_reports.app import Rating
+from rte_sonar_reports.cache import ResponseCache, ModuleSnapshotStore, MetricHistoryStore
+from rte_sonar_reports.loaders import ApplicationLoader
+from rte_sonar_reports.sonar import SonarClient, SonarApiError, LINES_TO_COVER_METRIC_KEY, UNCOVERED_LINES_METRIC_KEY
+
+FAKE_SONAR_CONFIG = {"base_url": "https://my-sonar-test-url.com",
+                     "token": "my_sonar_token"}
+BRANCHES_RESPONSE = {"branches": [{"name": "main", "isMain": True}]}
+
+
+def test_cache_key_depends_on_server_path_and_parameters():
+    key = ResponseCache.make_key(["https://sonar-1", "token"], "/api/issues/search", {"p": 1, "componentKeys": "a"})
+    assert key == ResponseCache.make_key(["https://sonar-1", "token"], "/api/issues/search", {"componentKeys": "a", "p": 1})
+    assert key != ResponseCache.make_key(["https://sonar-2", "token"], "/api/issues/search", {"p": 1, "componentKeys": "a"})
+    assert key != ResponseCache.make_key(["https://sonar-1", "other"], "/api/issues/search", {"p": 1, "componentKeys": "a"})
+    assert key != ResponseCache.make_key(["https://sonar-1", "token"], "/api/issues/search", {"p": 2, "componentKeys": "a"})
+
+
+def test_cache_entries_expire_after_ttl(tmp_path, monkeypatch):
+    current_time = [1000.0]
+    monkeypatch.setattr("rte_sonar_reports.cache.time.time", lambda: current_time[0])
+    response_cache = ResponseCache(str(tmp_path / "cache.db"), ttl=60)
+    response_cache.put("key", "{}")
+    current_time[0] += 60
+    assert response_cache.get("key").is_fresh
+    current_time[0] += 1
+    assert not response_cache.get("key").is_fresh
+    response_cache.refresh("key")
+    assert response_cache.get("key").is_fresh
+
+
+def test_cache_evicts_least_recently_used_entries_above_max_size(tmp_path, monkeypatch):
+    current_time = [1000.0]
+    monkeypatch.setattr("rte_sonar_reports.cache.time.time", lambda: current_time[0])
+    response_cache = ResponseCache(str(tmp_path / "cache.db"), max_size=25)
+    for key in ["first", "second"]:
+        current_time[0] += 1
+        response_cache.put(key, "0123456789")
+    current_time[0] += 1
+    response_cache.get("first")
+    current_time[0] += 1
+    response_cache.put("third", "0123456789")
+    assert response_cache.get("first") is not None
+    assert response_cache.get("second") is None
+    assert response_cache.get("third") is not None
+
+
+def test_sonar_client_uses_fresh_cached_responses_across_clients(tmp_path, requests_mock):
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/project_branches/list", json=BRANCHES_RESPONSE)
+    response_cache = ResponseCache(str(tmp_path / "cache.db"))
+    assert SonarClient(FAKE_SONAR_CONFIG, response_cache=response_cache).find_default_branch("my_project_key") == "main"
+    assert SonarClient(FAKE_SONAR_CONFIG, response_cache=response_cache).find_default_branch("my_project_key") == "main"
+    assert requests_mock.call_count == 1
+
+
+def test_sonar_client_revalidates_expired_cached_responses_with_etag(tmp_path, requests_mock, monkeypatch):
+    current_time = [1000.0]
+    monkeypatch.setattr("rte_sonar_reports.cache.time.time", lambda: current_time[0])
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/project_branches/list",
+                      [{"json": BRANCHES_RESPONSE, "headers": {"ETag": '"v1"'}},
+                       {"status_code": 304, "text": ""}])
+    response_cache = ResponseCache(str(tmp_path / "cache.db"), ttl=60)
+    assert SonarClient(FAKE_SONAR_CONFIG, response_cache=response_cache).find_default_branch("my_project_key") == "main"
+    current_time[0] += 120
+    assert SonarClient(FAKE_SONAR_CONFIG, response_cache=response_cache).find_default_branch("my_project_key") == "main"
+    assert requests_mock.call_count == 2
+    assert requests_mock.last_request.headers["If-None-Match"] == '"v1"'
+    assert response_cache.get(ResponseCache.make_key([FAKE_SONAR_CONFIG["base_url"], FAKE_SONAR_CONFIG["token"]],
+                                                     "/api/project_branches/list", {"project": "my_project_key"})).is_fresh
+
+
+def test_sonar_client_does_not_cache_error_responses(tmp_path, requests_mock):
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/project_branches/list",
+                      [{"status_code": 500, "json": {"errors": []}}, {"json": BRANCHES_RESPONSE}])
+    response_cache = ResponseCache(str(tmp_path / "cache.db"))
+    sonar_client = SonarClient(FAKE_SONAR_CONFIG, response_cache=response_cache)
+    with pytest.raises(SonarApiError):
+        sonar_client.get_json("/api/project_branches/list", {"project": "my_project_key"})
+    assert sonar_client.get_json("/api/project_branches/list", {"project": "my_project_key"}) == BRANCHES_RESPONSE
+    assert requests_mock.call_count == 2
+
+
+def test_application_loading_reuses_snapshots_of_modules_not_analysed_since_previous_run(tmp_path, requests_mock):
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config]
+        base_url = https://my-sonar-test-url.com
+        """)
+    analysis_dates = {"backend": "2025-01-01T10:00:00+0000", "frontend": "2025-01-01T10:00:00+0000"}
+    lines_to_cover = {"backend": "100", "frontend": "200"}
+
+    def project_branches(request, context):
+        return {"branches": [{"name": "main", "isMain": True, "analysisDate": analysis_dates[request.qs["project"][0]]}]}
+
+    def measures(request, context):
+        return {"measures": [{"component": project_key, "metric": LINES_TO_COVER_METRIC_KEY, "value": lines_to_cover[project_key]}
+                             for project_key in request.qs["projectkeys"][0].split(",")]}
+
+    requests_mock.get("https://my-sonar-test-url.com/api/project_branches/list", json=project_branches)
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/search", json=measures)
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search",
+                      json={"p": 1, "ps": 1, "total": 1, "issues": [],
+                            "facets": [{"property": "severities", "values": [{"val": "MAJOR", "count": 1}]}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search?rules=OWASP:UsingComponentWithKnownVulnerability",
+                      json={"p": 1, "ps": 1, "total": 0, "issues": [], "facets": [{"property": "severities", "values": []}]})
+    application_description = """
+        application:
+          name: My test application
+          version: 1.0.0
+          modules:
+            - name: Backend module
+              project_key: backend
+              sonar_config: Sonar config
+              type: backend
+            - name: Frontend module
+              project_key: frontend
+              sonar_config: Sonar config
+              type: frontend
+        """
+    snapshot_store = ModuleSnapshotStore(str(tmp_path / "snapshots.db"))
+    ApplicationLoader(sonar_configs, snapshot_store=snapshot_store).load(application_description)
+    requests_mock.reset_mock()
+    analysis_dates["frontend"] = "2025-02-01T10:00:00+0000"
+    lines_to_cover["backend"] = "150"
+    lines_to_cover["frontend"] = "250"
+    app = ApplicationLoader(sonar_configs, snapshot_store=snapshot_store).load(application_description)
+    assert [module.lines_to_cover for module in app.modules] == [100, 250]
+    assert [module.branch_name for module in app.modules] == ["main", "main"]
+    assert [module.non_dependency_security_rating() for module in app.modules] == [Rating.C, Rating.C]
+    assert {(request.path, request.qs.get("project", request.qs.get("projectkeys", request.qs.get("componentkeys")))[0])
+            for request in requests_mock.request_history} == {("/api/project_branches/list", "backend"),
+                                                              ("/api/project_branches/list", "frontend"),
+                                                              ("/api/measures/search", "frontend"),
+                                                              ("/api/issues/search", "frontend")}
+
+
+def test_application_loading_does_not_snapshot_cached_responses_of_a_previous_analysis(tmp_path, requests_mock):
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config]
+        base_url = https://my-sonar-test-url.com
+        """)
+    analysis_date = {"value": "2025-01-01T10:00:00+0000"}
+    uncovered_lines = {"value": "50"}
+    requests_mock.get("https://my-sonar-test-url.com/api/project_branches/list",
+                      json=lambda request, context: {"branches": [{"name": "main", "isMain": True, "analysisDate": analysis_date["value"]}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/search",
+                      json=lambda request, context: {"measures": [
+                          {"component": "backend", "metric": LINES_TO_COVER_METRIC_KEY, "value": "100"},
+                          {"component": "backend", "metric": UNCOVERED_LINES_METRIC_KEY, "value": uncovered_lines["value"]}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search",
+                      json={"p": 1, "ps": 1, "total": 0, "issues": [], "facets": [{"property": "severities", "values": []}]})
+    application_description = """
+        application:
+          name: My test application
+          version: 1.0.0
+          modules:
+            - name: Backend module
+              project_key: backend
+              sonar_config: Sonar config
+              type: backend
+        """
+    snapshot_store = ModuleSnapshotStore(str(tmp_path / "snapshots.db"))
+
+    def load():
+        response_cache = ResponseCache(str(tmp_path / "cache.db"), ttl=3600)
+        try:
+            return ApplicationLoader(sonar_configs, response_cache=response_cache, snapshot_store=snapshot_store).load(application_description)
+        finally:
+            response_cache.close()
+
+    assert load().modules[0].uncovered_lines == 50
+    analysis_date["value"] = "2025-02-01T10:00:00+0000"
+    uncovered_lines["value"] = "0"
+    assert load().modules[0].uncovered_lines == 0
+    (tmp_path / "cache.db").unlink()
+    assert load().modules[0].uncovered_lines == 0
+
+
+def test_application_loading_only_retrieves_history_points_newer_than_stored_ones(tmp_path, requests_mock):
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config]
+        base_url = https://my-sonar-test-url.com
+        """)
+    history = [("2025-01-01T11:00:00+0100", "100", "50"), ("2025-01-02T10:00:00+0000", "100", "20")]
+
+    def search_history(request, context):
+        from_date = urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query).get("from", [None])[0]
+        points = [point for point in history if from_date is None or point[0] >= from_date]
+        return {"paging": {"pageIndex": 1, "pageSize": 1000, "total": len(points)},
+                "measures": [{"metric": LINES_TO_COVER_METRIC_KEY, "history": [{"date": date, "value": lines} for date, lines, _ in points]},
+                             {"metric": UNCOVERED_LINES_METRIC_KEY, "history": [{"date": date, "value": uncovered} for date, _, uncovered in points]}]}
+
+    requests_mock.get("https://my-sonar-test-url.com/api/project_branches/list", json={"branches": [{"name": "main", "isMain": True}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/search", json={"measures": []})
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search", json={"p": 1, "ps": 1, "total": 0, "issues": [], "facets": [{"property": "severities", "values": []}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/search_history", json=search_history)
+    application_description = """
+        application:
+          name: My test application
+          version: 1.0.0
+          modules:
+            - name: Backend module
+              project_key: backend
+              sonar_config: Sonar config
+              type: backend
+        """
+    history_store = MetricHistoryStore(str(tmp_path / "history.db"))
+    app = ApplicationLoader(sonar_configs, history_store=history_store).load(application_description)
+    assert app.modules[0].history[UNCOVERED_LINES_METRIC_KEY] == [["2025-01-01T10:00:00+0000", "50"], ["2025-01-02T10:00:00+0000", "20"]]
+    history.append(("2025-01-03T10:00:00+0000", "200", "20"))
+    requests_mock.reset_mock()
+    app = ApplicationLoader(sonar_configs, history_store=history_store).load(application_description)
+    history_requests = [request for request in requests_mock.request_history if request.path == "/api/measures/search_history"]
+    assert [urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query)["from"] for request in history_requests] == \
+           [["2025-01-02T10:00:00+0000"]]
+    assert app.modules[0].history[LINES_TO_COVER_METRIC_KEY] == [["2025-01-01T10:00:00+0000", "100"], ["2025-01-02T10:00:00+0000", "100"],
+                                                                 ["2025-01-03T10:00:00+0000", "200"]]
@@ -0,0 +1,123 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import configparser
+import sys
+
+import pytest
+
+from rte_sonar_reports.__main__ import main, CHECK_EXIT_CODES, CHECK_ERROR_EXIT_CODE
+from rte_sonar_reports.checks import check_prescription
+from rte_sonar_reports.loaders import ApplicationLoader
+from rte_sonar_reports.prescription_validator import PrescriptionStatus, datetime_in_paris_timezone, get_criteria
+from rte_sonar_reports.sonar import MAINTAINABILITY_RATING_METRIC_KEY, LINES_TO_COVER_METRIC_KEY, UNCOVERED_LINES_METRIC_KEY
+
+SONAR_CONFIG = """
+    [Sonar config]
+    base_url = https://my-sonar-test-url.com
+    """
+APPLICATION_DESCRIPTION = """
+    application:
+      name: My test application
+      version: 1.0.0
+      modules:
+        - name: Backend module
+          project_key: backend
+          sonar_config: Sonar config
+          type: backend
+        - name: Frontend module
+          project_key: frontend
+          sonar_config: Sonar config
+          type: frontend
+    """
+
+
+def create_application_loader():
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string(SONAR_CONFIG)
+    return ApplicationLoader(sonar_configs)
+
+
+def stub_sonar(requests_mock, severity, maintainability_rating):
+    requests_mock.get("https://my-sonar-test-url.com/api/project_branches/list",
+                      json={"branches": [{"name": "main", "isMain": True}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search",
+                      json={"p": 1, "ps": 1, "total": 1, "issues": [],
+                            "facets": [{"property": "severities", "values": [{"val": severity, "count": 1}]}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search?rules=OWASP:UsingComponentWithKnownVulnerability",
+                      json={"p": 1, "ps": 1, "total": 0, "issues": [],
+                            "facets": [{"property": "severities", "values": [{"val": severity, "count": 0}]}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/search",
+                      json={"measures": [{"component": project_key, "metric": metric, "value": value}
+                                         for project_key in ("backend", "frontend")
+                                         for metric, value in ((MAINTAINABILITY_RATING_METRIC_KEY, maintainability_rating),
+                                                               (LINES_TO_COVER_METRIC_KEY, "100"),
+                                                               (UNCOVERED_LINES_METRIC_KEY, "10"))]})
+
+
+def test_check_stops_at_first_failing_current_criteria(requests_mock):
+    stub_sonar(requests_mock, "BLOCKER", "1.0")
+    prescription_status, failing_criterias = check_prescription(create_application_loader(), APPLICATION_DESCRIPTION,
+                                                                datetime_in_paris_timezone(2026, 1, 1))
+    assert prescription_status == PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED
+    assert failing_criterias == [get_criteria("security")]
+    assert not [request for request in requests_mock.request_history if request.path.startswith("/api/measures/")]
+
+
+def test_check_skips_dependency_vulnerabilities_when_no_vulnerability_is_above_info(requests_mock):
+    stub_sonar(requests_mock, "INFO", "1.0")
+    prescription_status, failing_criterias = check_prescription(create_application_loader(), APPLICATION_DESCRIPTION,
+                                                                datetime_in_paris_timezone(2026, 1, 1))
+    assert prescription_status == PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED
+    assert failing_criterias == []
+    issues_requests = [request for request in requests_mock.request_history if request.path == "/api/issues/search"]
+    assert len(issues_requests) == 2
+    assert all("rules" not in request.qs for request in issues_requests)
+    assert [request.qs["projectkeys"] for request in requests_mock.request_history if request.path.startswith("/api/measures/")] == \
+           [["backend"], ["frontend"]]
+
+
+def test_check_reports_failing_future_criteria(requests_mock):
+    stub_sonar(requests_mock, "INFO", "2.0")
+    prescription_status, failing_criterias = check_prescription(create_application_loader(), APPLICATION_DESCRIPTION,
+                                                                datetime_in_paris_timezone(2025, 6, 1))
+    assert prescription_status == PrescriptionStatus.ONLY_CURRENT_CRITERIA_VALIDATED
+    assert failing_criterias == [get_criteria("maintainability")]
+
+
+def test_command_line_check_exits_with_prescription_status(requests_mock, tmp_path, monkeypatch, capsys):
+    stub_sonar(requests_mock, "BLOCKER", "1.0")
+    (tmp_path / "application.yml").write_text(APPLICATION_DESCRIPTION)
+    (tmp_path / "sonar.ini").write_text(SONAR_CONFIG)
+    monkeypatch.setattr(sys, "argv", ["rte_sonar_reports", "-a", str(tmp_path / "application.yml"), "-c", str(tmp_path / "sonar.ini"),
+                                      "--check"])
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == CHECK_EXIT_CODES[PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED] == 20
+    assert "Sécurité" in capsys.readouterr().out
+    assert not list(tmp_path.glob("*.pdf"))
+
+
+def test_command_line_check_exits_with_dedicated_code_when_sonar_is_unavailable(requests_mock, tmp_path, monkeypatch):
+    requests_mock.get("https://my-sonar-test-url.com/api/project_branches/list", status_code=403)
+    (tmp_path / "application.yml").write_text(APPLICATION_DESCRIPTION)
+    (tmp_path / "sonar.ini").write_text(SONAR_CONFIG)
+    monkeypatch.setattr(sys, "argv", ["rte_sonar_reports", "-a", str(tmp_path / "application.yml"), "-c", str(tmp_path / "sonar.ini"),
+                                      "--check"])
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == CHECK_ERROR_EXIT_CODE
+    assert CHECK_ERROR_EXIT_CODE not in CHECK_EXIT_CODES.values()
+
+
+def test_command_line_check_ignores_source_date_epoch(requests_mock, tmp_path, monkeypatch):
+    stub_sonar(requests_mock, "INFO", "2.0")
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1735689600")
+    (tmp_path / "application.yml").write_text(APPLICATION_DESCRIPTION)
+    (tmp_path / "sonar.ini").write_text(SONAR_CONFIG)
+    monkeypatch.setattr(sys, "argv", ["rte_sonar_reports", "-a", str(tmp_path / "application.yml"), "-c", str(tmp_path / "sonar.ini"),
+                                      "--check"])
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == CHECK_EXIT_CODES[PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED]
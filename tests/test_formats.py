@@ -0,0 +1,93 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import json
+
+import pytest
+
+from rte_sonar_reports import formats
+from rte_sonar_reports.app import Application, Module, Rating
+from rte_sonar_reports.prescription_validator import datetime_in_paris_timezone, current_datetime_in_paris_timezone, \
+    report_generation_datetime, get_criteria
+
+
+def create_application():
+    app = Application("My <application>", "1.0.0")
+    app.add_module(Module("Backend | module", branch_name="main", module_type=Module.Type.BACKEND,
+                          maintainability_rating=Rating.B, lines_to_cover=100, uncovered_lines=50,
+                          vulnerabilities=[{"rule": "any", "severity": "INFO"}]))
+    app.add_module(Module("Frontend module", module_type=Module.Type.FRONTEND))
+    return app
+
+
+def test_report_data_contains_summary_modules_and_criteria():
+    data = formats.report_data(create_application(), datetime_in_paris_timezone(2025, 4, 1))
+    assert data["application"] == {"name": "My <application>", "version": "1.0.0"}
+    assert data["prescription_status"] == "CURRENT_CRITERIA_NOT_VALIDATED"
+    assert data["summary"] == {"security_rating": "A", "dependency_security_rating": "A",
+                               "backend_coverage": 50.0, "maintainability_rating": "B"}
+    assert data["criteria"] == [
+        {"name": "security", "label": "Sécurité", "start_date": "2024-11-01T00:00:00+01:00", "applicable": True, "validated": True},
+        {"name": "backend_coverage", "label": "Couverture du backend", "start_date": "2025-03-01T00:00:00+01:00", "applicable": True, "validated": False},
+        {"name": "maintainability", "label": "Maintenabilité", "start_date": "2025-09-01T00:00:00+02:00", "applicable": False, "validated": False}]
+    assert data["modules"][0] == {"name": "Backend | module", "branch": "main", "type": "backend", "security_rating": "A",
+                                  "dependency_security_rating": "A", "coverage": 50.0, "maintainability_rating": "B"}
+    assert data["modules"][1]["security_rating"] is None
+
+
+def test_export_writes_json_html_and_markdown_reports(tmp_path):
+    app = create_application()
+    generation_date = datetime_in_paris_timezone(2025, 4, 1)
+    for report_format in [formats.JSON_FORMAT, formats.HTML_FORMAT, formats.MARKDOWN_FORMAT]:
+        formats.export(str(tmp_path / f"report{formats.REPORT_FORMAT_EXTENSIONS[report_format]}"), app, report_format,
+                       generation_date)
+    assert json.loads((tmp_path / "report.json").read_text(encoding="utf-8")) == formats.report_data(app, generation_date)
+    html_report = (tmp_path / "report.html").read_text(encoding="utf-8")
+    assert "My &lt;application&gt;" in html_report
+    assert '<td class="rating" style="background-color: #c6e056">B</td>' in html_report
+    markdown_report = (tmp_path / "report.md").read_text(encoding="utf-8")
+    assert "| Backend \\| module | main | backend | A | A | 50.0% | B |" in markdown_report
+    assert "| Frontend module |  | frontend | N/A | N/A | N/A | N/A |" in markdown_report
+    assert "| Maintenabilité | Non validé (applicable à partir du 2025-09-01) |" in markdown_report
+
+
+def test_output_path_extension_matches_format():
+    assert formats.get_output_path("reports/my_application.pdf", formats.JSON_FORMAT) == "reports/my_application.json"
+    assert formats.get_output_path("reports/my_application.md", formats.MARKDOWN_FORMAT) == "reports/my_application.md"
+
+
+def test_export_is_skipped_when_report_fingerprint_is_unchanged(tmp_path):
+    output_path = str(tmp_path / "report.json")
+    generation_date = datetime_in_paris_timezone(2025, 4, 1)
+    assert formats.export(output_path, create_application(), formats.JSON_FORMAT, generation_date)
+    assert not formats.export(output_path, create_application(), formats.JSON_FORMAT, datetime_in_paris_timezone(2025, 4, 2))
+    assert formats.export(output_path, create_application(), formats.JSON_FORMAT, generation_date, force=True)
+    assert formats.export(output_path, create_application(), formats.JSON_FORMAT, datetime_in_paris_timezone(2025, 9, 1))
+    changed_app = create_application()
+    changed_app.modules[0].uncovered_lines = 10
+    assert formats.export(output_path, changed_app, formats.JSON_FORMAT, datetime_in_paris_timezone(2025, 9, 1))
+    assert json.loads((tmp_path / "report.json").read_text(encoding="utf-8"))["summary"]["backend_coverage"] == 90.0
+
+
+def test_generation_date_is_read_from_source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1735689600")
+    assert report_generation_datetime().isoformat() == "2025-01-01T01:00:00+01:00"
+    assert current_datetime_in_paris_timezone().year >= 2026
+
+
+
+@pytest.mark.parametrize("attribute, value", [("threshold", 40), ("metric", "maintainability_rating"), ("module_types", None),
+                                              ("criteria_start_date", datetime_in_paris_timezone(2025, 3, 2))])
+def test_report_fingerprint_changes_with_criteria_definitions(monkeypatch, attribute, value):
+    generation_date = datetime_in_paris_timezone(2025, 4, 1)
+    fingerprint = formats.report_fingerprint(create_application(), formats.JSON_FORMAT, generation_date)
+    monkeypatch.setattr(get_criteria("backend_coverage"), attribute, value)
+    assert formats.report_fingerprint(create_application(), formats.JSON_FORMAT, generation_date) != fingerprint
+
+
+def test_report_fingerprint_changes_with_package_version(monkeypatch):
+    generation_date = datetime_in_paris_timezone(2025, 4, 1)
+    fingerprint = formats.report_fingerprint(create_application(), formats.JSON_FORMAT, generation_date)
+    monkeypatch.setattr(formats, "package_version", lambda: "2099.1.0")
+    assert formats.report_fingerprint(create_application(), formats.JSON_FORMAT, generation_date) != fingerprint
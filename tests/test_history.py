@@ -0,0 +1,44 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from rte_sonar_reports.app import Application, Module, Rating
+from rte_sonar_reports.history import trend_days, module_coverage_trend, module_maintainability_trend, \
+    aggregated_backend_coverage_trend
+from rte_sonar_reports.sonar import MAINTAINABILITY_RATING_METRIC_KEY, LINES_TO_COVER_METRIC_KEY, UNCOVERED_LINES_METRIC_KEY
+
+
+def create_application():
+    app = Application("My application", "1.0.0")
+    app.add_module(Module("Backend 1", module_type=Module.Type.BACKEND,
+                          history={LINES_TO_COVER_METRIC_KEY: [["2025-01-01T10:00:00+0000", "100"], ["2025-01-03T10:00:00+0000", "100"]],
+                                   UNCOVERED_LINES_METRIC_KEY: [["2025-01-01T10:00:00+0000", "50"], ["2025-01-03T10:00:00+0000", "10"]],
+                                   MAINTAINABILITY_RATING_METRIC_KEY: [["2025-01-01T10:00:00+0000", "3.0"],
+                                                                       ["2025-01-03T10:00:00+0000", "1.0"]]}))
+    app.add_module(Module("Backend 2", module_type=Module.Type.BACKEND,
+                          history={LINES_TO_COVER_METRIC_KEY: [["2025-01-02T08:00:00+0000", "300"], ["2025-01-02T18:00:00+0000", "100"]],
+                                   UNCOVERED_LINES_METRIC_KEY: [["2025-01-02T08:00:00+0000", "0"], ["2025-01-02T18:00:00+0000", "0"]]}))
+    app.add_module(Module("Frontend", module_type=Module.Type.FRONTEND,
+                          history={LINES_TO_COVER_METRIC_KEY: [["2025-01-02T10:00:00+0000", "100"]],
+                                   UNCOVERED_LINES_METRIC_KEY: [["2025-01-02T10:00:00+0000", "100"]]}))
+    app.add_module(Module("Without history"))
+    return app
+
+
+def test_trend_days_are_the_latest_analysis_days():
+    assert trend_days(create_application()) == ["2025-01-01", "2025-01-02", "2025-01-03"]
+    assert trend_days(create_application(), days_count=2) == ["2025-01-02", "2025-01-03"]
+
+
+def test_module_trends_use_last_known_values_of_each_day():
+    app = create_application()
+    days = trend_days(app)
+    assert module_coverage_trend(app.modules[0], days) == [50.0, 50.0, 90.0]
+    assert module_coverage_trend(app.modules[1], days) == [None, 100.0, 100.0]
+    assert module_maintainability_trend(app.modules[0], days) == [Rating.C, Rating.C, Rating.A]
+    assert module_maintainability_trend(app.modules[3], days) == [Rating.NOT_CALCULATED] * 3
+
+
+def test_aggregated_backend_coverage_trend_only_sums_backend_modules():
+    app = create_application()
+    assert aggregated_backend_coverage_trend(app, trend_days(app)) == [50.0, 75.0, 95.0]
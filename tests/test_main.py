@@ -0,0 +1,84 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import argparse
+import json
+import subprocess
+import sys
+
+import pytest
+
+from rte_sonar_reports.__main__ import main, get_batch_application_files, get_batch_output_file, parse_report_formats
+
+
+def test_batch_application_files_are_listed_from_directory(tmp_path):
+    for file_name in ["b.yml", "a.yaml", "notes.txt"]:
+        (tmp_path / file_name).write_text("")
+    assert get_batch_application_files(str(tmp_path)) == [str(tmp_path / "a.yaml"), str(tmp_path / "b.yml")]
+
+
+def test_batch_application_files_are_listed_from_manifest(tmp_path):
+    (tmp_path / "manifest.txt").write_text("# Portfolio\napplications/a.yml\n\nb.yml\n")
+    assert get_batch_application_files(str(tmp_path / "manifest.txt")) == \
+           [str(tmp_path / "applications" / "a.yml"), str(tmp_path / "b.yml")]
+
+
+def test_batch_output_file_is_named_after_application_file():
+    assert get_batch_output_file("/reports", "/applications/my_application.yml") == "/reports/my_application.pdf"
+    assert get_batch_output_file("/reports", "/applications/my_application.yml", "markdown") == "/reports/my_application.md"
+
+
+def test_command_line_rejects_batch_application_files_with_same_report_name(tmp_path, monkeypatch, capsys, requests_mock):
+    for application_file in ["team_a/app.yml", "team_b/app.yml"]:
+        (tmp_path / application_file).parent.mkdir()
+        (tmp_path / application_file).write_text("")
+    (tmp_path / "manifest.txt").write_text("team_a/app.yml\nteam_b/app.yml\n")
+    monkeypatch.setattr(sys, "argv", ["rte_sonar_reports", "-b", str(tmp_path / "manifest.txt"), "-c", str(tmp_path / "sonar.ini"),
+                                      "-o", str(tmp_path / "reports")])
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+    assert exit_info.value.code == 2
+    assert "would overwrite each other's reports" in capsys.readouterr().err
+    assert not (tmp_path / "reports").exists()
+    assert not requests_mock.request_history
+
+
+def test_report_formats_are_parsed_from_comma_separated_list():
+    assert parse_report_formats("pdf, JSON,json") == ["pdf", "json"]
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_report_formats("pdf,docx")
+
+
+@pytest.mark.parametrize("report_formats,expected_files", [("json,markdown", ["report.json", "report.md"]), ("json", ["report.json"])])
+def test_command_line_names_reports_after_their_format(tmp_path, monkeypatch, report_formats, expected_files):
+    (tmp_path / "application.yml").write_text("""
+        application:
+          name: My test application
+          version: 1.0.0
+          modules:
+            - name: Module with unknown Sonar configuration
+              project_key: my_project_key
+              sonar_config: Unknown config
+              type: backend
+        """)
+    (tmp_path / "sonar.ini").write_text("")
+    monkeypatch.setattr(sys, "argv", ["rte_sonar_reports", "-a", str(tmp_path / "application.yml"), "-c", str(tmp_path / "sonar.ini"),
+                                      "-o", str(tmp_path / "report.pdf"), "--format", report_formats])
+    main()
+    assert json.loads((tmp_path / "report.json").read_text(encoding="utf-8"))["application"]["name"] == "My test application"
+    assert sorted(path.name for path in tmp_path.glob("report.*") if path.suffix != ".fingerprint") == expected_files
+    assert not (tmp_path / "report.pdf").exists()
+
+
+def test_command_line_does_not_import_unused_heavy_dependencies():
+    imported_modules = subprocess.run([sys.executable, "-c", "import sys, rte_sonar_reports.__main__; print(*sys.modules)"],
+                                      capture_output=True, text=True, check=True).stdout.split()
+    assert not {"reportlab", "svglib", "jsonschema", "requests", "asyncio"} & set(imported_modules)
+
+
+def test_command_line_does_not_parse_prescription_criteria_on_import():
+    parsed_criterias = subprocess.run([sys.executable, "-c", "import rte_sonar_reports.__main__, rte_sonar_reports.prescription_validator as p; "
+                                                             "print(p.get_all_criterias.cache_info().currsize)"],
+                                      capture_output=True, text=True, check=True).stdout.strip()
+    assert parsed_criterias == "0"
@@ -71,6 +71,30 @@ def test_module_should_provide_dependency_security_rating(returned_dependency_se
     assert my_module.dependency_security_rating() == returned_dependency_security_rating
 
 
+@pytest.mark.parametrize(
+    "returned_non_dependency_security_rating, returned_dependency_security_rating, non_dependency_severity_counts, dependency_severity_counts",
+    [
+        (app.Rating.A, app.Rating.A, {}, {}),
+        (app.Rating.A, app.Rating.E, {"MAJOR": 0}, {"BLOCKER": 2}),
+        (app.Rating.C, app.Rating.A, {"MAJOR": 3, "BLOCKER": 0}, {"INFO": 1}),
+        (app.Rating.D, app.Rating.B, {"INFO": 12, "CRITICAL": 1}, {"MINOR": 4, "CRITICAL": 0}),
+    ]
+)
+def test_module_should_provide_security_ratings_from_vulnerability_summary(returned_non_dependency_security_rating, returned_dependency_security_rating,
+                                                                          non_dependency_severity_counts, dependency_severity_counts):
+    my_module = app.Module("My module", vulnerability_summary=app.VulnerabilitySummary(dependency_severity_counts, non_dependency_severity_counts))
+    assert my_module.non_dependency_security_rating() == returned_non_dependency_security_rating
+    assert my_module.dependency_security_rating() == returned_dependency_security_rating
+
+
+def test_vulnerability_summary_from_vulnerabilities_counts_severities_by_rule_kind():
+    summary = app.VulnerabilitySummary.from_vulnerabilities([{"rule": "any", "severity": "MINOR"},
+                                                             {"rule": "any", "severity": "MINOR"},
+                                                             {"rule": DEPENDENCY_VULNERABILITY_RULE, "severity": "CRITICAL"}])
+    assert summary.non_dependency_severity_counts == {"MINOR": 2}
+    assert summary.dependency_severity_counts == {"CRITICAL": 1}
+
+
 def test_module_with_no_vulnerabilities_have_security_rating_not_calculated():
     my_module = app.Module("My module")
     assert my_module.non_dependency_security_rating() == app.Rating.NOT_CALCULATED
@@ -114,3 +138,15 @@ def test_module_should_have_provided_maintainability_rating(maintainability_rati
 def test_module_with_no_maintainability_rating_have_a_maintainability_rating_not_calculated():
     my_module = app.Module("My module")
     assert my_module.maintainability_rating == app.Rating.NOT_CALCULATED
+
+
+def test_module_security_ratings_are_recomputed_when_vulnerabilities_change():
+    my_module = app.Module("My module", vulnerabilities=[{"rule": "any", "severity": "MINOR"}])
+    assert my_module.non_dependency_security_rating() == app.Rating.B
+    my_module.vulnerabilities = [{"rule": "any", "severity": "BLOCKER"}]
+    assert my_module.non_dependency_security_rating() == app.Rating.E
+
+
+def test_module_has_no_instance_dictionary():
+    with pytest.raises(AttributeError):
+        app.Module("My module").unknown_attribute = 0
@@ -0,0 +1,77 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import io
+
+from reportlab import rl_config
+
+from rte_sonar_reports import pdf
+from rte_sonar_reports.app import Application, Module, Rating
+
+
+def export_to_bytes(app):
+    output = io.BytesIO()
+    pdf.export(output, app)
+    return output.getvalue()
+
+
+def test_svg_assets_are_parsed_once_per_process(monkeypatch):
+    parsed_assets = []
+    svg2rlg = pdf.svg2rlg
+    monkeypatch.setattr(pdf, "svg2rlg", lambda path: parsed_assets.append(path) or svg2rlg(path))
+    pdf.load_svg_asset.cache_clear()
+    app = Application("My application", "1.0.0")
+    app.add_module(Module("My module", branch_name="main"))
+    export_to_bytes(app)
+    export_to_bytes(app)
+    assert len(parsed_assets) == 2
+
+
+def test_svg_assets_are_written_as_form_objects():
+    app = Application("My application", "1.0.0")
+    app.add_module(Module("My module", branch_name="main"))
+    report = export_to_bytes(app)
+    assert report.startswith(b"%PDF")
+    assert report.count(b"/Subtype /Form") == 2
+
+
+def test_rating_and_coverage_cells_share_styles_by_color():
+    assert pdf.convert_rating(Rating.B, 'Normal').style is pdf.convert_rating(Rating.B, 'Normal').style
+    assert pdf.convert_coverage(65.0, 'Normal').style is pdf.convert_rating(Rating.B, 'Normal').style
+    assert pdf.convert_coverage(None, 'Title').style is pdf.convert_rating(Rating.NOT_CALCULATED, 'Title').style
+    assert pdf.convert_rating(Rating.B, 'Title').style is not pdf.convert_rating(Rating.B, 'Normal').style
+    assert pdf.convert_rating(None, 'Normal').text == "N/A"
+
+
+def test_detail_table_header_is_repeated_on_each_page(monkeypatch):
+    monkeypatch.setattr(rl_config, "pageCompression", 0)
+    app = Application("My application", "1.0.0")
+    for index in range(200):
+        app.add_module(Module(f"Module {index}", branch_name="main"))
+    report = export_to_bytes(app)
+    number_of_pages = report.count(b"/Type /Page\n")
+    assert number_of_pages > 2
+    assert report.count(b"pendances)") == number_of_pages
+
+
+def test_report_is_identical_for_same_generation_date(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1735689600")
+    app = Application("My application", "1.0.0")
+    app.add_module(Module("My module", branch_name="main", maintainability_rating=Rating.A))
+    assert export_to_bytes(app) == export_to_bytes(app)
+
+
+def test_trends_section_is_added_when_modules_have_history(monkeypatch):
+    monkeypatch.setattr(rl_config, "pageCompression", 0)
+    app = Application("My application", "1.0.0")
+    app.add_module(Module("My module", branch_name="main"))
+    assert b"(Tendances)" not in export_to_bytes(app)
+    app.add_module(Module("My module with history", branch_name="main", module_type=Module.Type.BACKEND,
+                          history={"lines_to_cover": [["2025-01-01T10:00:00+0000", "100"], ["2025-02-01T10:00:00+0000", "200"]],
+                                   "uncovered_lines": [["2025-01-01T10:00:00+0000", "50"], ["2025-02-01T10:00:00+0000", "20"]],
+                                   "sqale_rating": [["2025-01-01T10:00:00+0000", "2.0"]]}))
+    report = export_to_bytes(app)
+    assert b"(Tendances)" in report
+    assert b"(01/02/2025)" in report
+    assert b"(90.0%)" in report
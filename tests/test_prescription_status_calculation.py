@@ -2,47 +2,110 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import subprocess
+import sys
 from datetime import timedelta
 
 import pytest
 
-from rte_sonar_reports.app import Application, Rating
+from rte_sonar_reports.app import Application, Module, Rating
 from rte_sonar_reports.prescription_validator import compute_prescription_status, PrescriptionStatus, \
-    datetime_in_paris_timezone, SECURITY_CRITERIA_START_DATE, TEST_COVERAGE_CRITERIA_START_DATE, \
-    MAINTAINABILITY_CRITERIA_START_DATE
+    datetime_in_paris_timezone, parse_criterias, CriteriaPlan, Criteria, get_all_criterias, get_criteria, BACKEND_MEASURES_REQUIREMENT, \
+    VULNERABILITIES_REQUIREMENT, MEASURES_REQUIREMENT
 
-app = Application("TEST_APP", "0.0.0")
+SEVERITY_OF_RATING = {Rating.A: "INFO", Rating.B: "MINOR"}
+
+
+def create_application(security_rating, backend_coverage, maintainability_rating):
+    app = Application("TEST_APP", "0.0.0")
+    if backend_coverage is not None:
+        app.add_module(Module("Backend", module_type=Module.Type.BACKEND, maintainability_rating=Rating.A,
+                              lines_to_cover=1000, uncovered_lines=round(1000 - 10 * backend_coverage), vulnerabilities=[]))
+    app.add_module(Module("Frontend", module_type=Module.Type.FRONTEND, maintainability_rating=maintainability_rating,
+                          lines_to_cover=100, uncovered_lines=100,
+                          vulnerabilities=[{"rule": "any", "severity": SEVERITY_OF_RATING[security_rating]}]))
+    return app
 
 
 def test_all_criterias_validated():
-    app.worst_non_dependency_security_rating = lambda: Rating.A
-    app.aggregated_backend_coverage = lambda: 60.0
-    app.worst_maintainability_rating = lambda: Rating.A
+    app = create_application(Rating.A, 60.0, Rating.A)
     assert compute_prescription_status(app, datetime_in_paris_timezone(2020, 1, 1)) == PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED
     assert compute_prescription_status(app, datetime_in_paris_timezone(2024, 1, 1)) == PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED
     assert compute_prescription_status(app, datetime_in_paris_timezone(2026, 1, 1)) == PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED
 
 def test_coverage_criteria_on_backend_when_only_frontend_modules():
-    app.worst_non_dependency_security_rating = lambda: Rating.A
-    app.aggregated_backend_coverage = lambda: None
-    app.worst_maintainability_rating = lambda: Rating.A
+    app = create_application(Rating.A, None, Rating.A)
     assert compute_prescription_status(app, datetime_in_paris_timezone(2020, 1, 1)) == PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED
     assert compute_prescription_status(app, datetime_in_paris_timezone(2024, 1, 1)) == PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED
     assert compute_prescription_status(app, datetime_in_paris_timezone(2026, 1, 1)) == PrescriptionStatus.ALL_FUTURE_CRITERIA_VALIDATED
 
 @pytest.mark.parametrize(
-    "worst_security_rating, aggregated_backend_coverage, worst_maintainability_rating, limit_date",
+    "worst_security_rating, aggregated_backend_coverage, worst_maintainability_rating, failing_criteria_name",
     [
-        (Rating.B, 60.0, Rating.A, SECURITY_CRITERIA_START_DATE),
-        (Rating.A, 59.9, Rating.A, TEST_COVERAGE_CRITERIA_START_DATE),
-        (Rating.A, 60.0, Rating.B, MAINTAINABILITY_CRITERIA_START_DATE),
+        (Rating.B, 60.0, Rating.A, "security"),
+        (Rating.A, 59.9, Rating.A, "backend_coverage"),
+        (Rating.A, 60.0, Rating.B, "maintainability"),
     ]
 )
-def test_any_criteria_not_validated(worst_security_rating, aggregated_backend_coverage, worst_maintainability_rating, limit_date):
-    app.worst_non_dependency_security_rating = lambda: worst_security_rating
-    app.aggregated_backend_coverage = lambda: aggregated_backend_coverage
-    app.worst_maintainability_rating = lambda: worst_maintainability_rating
+def test_any_criteria_not_validated(worst_security_rating, aggregated_backend_coverage, worst_maintainability_rating, failing_criteria_name):
+    limit_date = get_criteria(failing_criteria_name).criteria_start_date
+    app = create_application(worst_security_rating, aggregated_backend_coverage, worst_maintainability_rating)
     assert compute_prescription_status(app, datetime_in_paris_timezone(2020, 1, 1)) == PrescriptionStatus.ONLY_CURRENT_CRITERIA_VALIDATED
     assert compute_prescription_status(app, limit_date - timedelta(seconds=1)) == PrescriptionStatus.ONLY_CURRENT_CRITERIA_VALIDATED
     assert compute_prescription_status(app, limit_date) == PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED
     assert compute_prescription_status(app, datetime_in_paris_timezone(2026, 1, 1)) == PrescriptionStatus.CURRENT_CRITERIA_NOT_VALIDATED
+
+
+def test_criteria_requirements_follow_their_metric():
+    assert [criteria.requirements for criteria in get_all_criterias()] == \
+           [[VULNERABILITIES_REQUIREMENT], [BACKEND_MEASURES_REQUIREMENT], [MEASURES_REQUIREMENT]]
+
+
+def test_criteria_plan_computes_shared_aggregates_in_a_single_pass():
+    criterias = parse_criterias("""
+        version: 1
+        criteria:
+          - name: frontend_coverage
+            metric: coverage
+            threshold: 50
+            module_types: [frontend]
+            start_date: "2026-01-01"
+          - name: strict_frontend_coverage
+            metric: coverage
+            threshold: 80
+            module_types: [frontend]
+            start_date: "2027-01-01"
+          - name: dependencies
+            metric: dependency_security_rating
+            threshold: B
+            start_date: "2026-01-01"
+        """)
+    visited_modules = []
+
+    class VisitedModules(list):
+        def __iter__(self):
+            visited_modules.append(True)
+            return super().__iter__()
+
+    app = create_application(Rating.A, 90.0, Rating.A)
+    app.modules = VisitedModules(list(app.modules) + [Module("Frontend 2", module_type=Module.Type.FRONTEND, lines_to_cover=100,
+                                                       uncovered_lines=0, vulnerabilities=[])])
+    plan = CriteriaPlan(criterias)
+    assert plan.evaluate(app) == {"frontend_coverage": True, "strict_frontend_coverage": False, "dependencies": True}
+    assert len(visited_modules) == 1
+    assert len(plan.aggregate_factories) == 2
+    assert plan.prescription_status(plan.evaluate(app), datetime_in_paris_timezone(2026, 6, 1)) == \
+           PrescriptionStatus.ONLY_CURRENT_CRITERIA_VALIDATED
+
+
+def test_criteria_file_with_unsupported_version_or_metric_is_rejected():
+    with pytest.raises(ValueError):
+        parse_criterias("version: 2\ncriteria: []\n")
+    with pytest.raises(ValueError):
+        Criteria("unknown", datetime_in_paris_timezone(2026, 1, 1), "unknown_metric", 1)
+
+
+def test_prescription_criteria_do_not_depend_on_sonar_retrieval():
+    imported_modules = subprocess.run([sys.executable, "-c", "import sys, rte_sonar_reports.prescription_validator; print(*sys.modules)"],
+                                      capture_output=True, text=True, check=True).stdout.split()
+    assert not {"rte_sonar_reports.loaders", "rte_sonar_reports.sonar", "rte_sonar_reports.cache"} & set(imported_modules)
@@ -0,0 +1,35 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import datetime
+import json
+
+import pytz
+
+from rte_sonar_reports.app import Application, Module, Rating
+from rte_sonar_reports.formats import PDF_FORMAT, JSON_FORMAT
+from rte_sonar_reports.rendering import render_reports
+
+
+def create_application(name):
+    app = Application(name, "1.0.0")
+    app.add_module(Module("Backend", branch_name="main", module_type=Module.Type.BACKEND, lines_to_cover=100,
+                          uncovered_lines=10, maintainability_rating=Rating.A, vulnerabilities=[]))
+    return app
+
+
+def test_reports_are_rendered_by_worker_processes(tmp_path):
+    apps = [create_application(f"Application {index}") for index in range(3)]
+    tasks = [(str(tmp_path / f"report_{index}{extension}"), app, report_format)
+             for index, app in enumerate(apps)
+             for report_format, extension in ((PDF_FORMAT, ".pdf"), (JSON_FORMAT, ".json"))]
+    generation_date = datetime.datetime(2025, 1, 1, tzinfo=pytz.utc)
+    assert render_reports(tasks, generation_date, workers=2) == [output_path for output_path, _, _ in tasks]
+    assert all((tmp_path / f"report_{index}.pdf").read_bytes().startswith(b"%PDF") for index in range(3))
+    report = json.loads((tmp_path / "report_2.json").read_text(encoding="utf-8"))
+    assert report["application"]["name"] == "Application 2"
+    assert report["generation_date"] == generation_date.isoformat()
+    assert report["summary"]["backend_coverage"] == 90.0
+    assert render_reports(tasks, generation_date, workers=2) == []
+    assert render_reports(tasks[:1], generation_date, workers=2, force=True) == [tasks[0][0]]
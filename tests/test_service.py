@@ -0,0 +1,122 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import configparser
+import http.client
+import json
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+from rte_sonar_reports.loaders import ApplicationLoader
+from rte_sonar_reports.service import ReportService, ReportServer
+
+APPLICATION_DESCRIPTION = """
+    application:
+      name: My test application
+      version: 1.0.0
+      modules:
+        - name: Backend module
+          project_key: backend_module
+          branch: main
+          sonar_config: Sonar config
+          type: backend
+    """
+
+
+@pytest.fixture
+def report_service(requests_mock):
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/component",
+                      json={"component": {"key": "backend_module", "measures": [
+                          {"metric": "sqale_rating", "value": "1.0"},
+                          {"metric": "lines_to_cover", "value": "100"},
+                          {"metric": "uncovered_lines", "value": "20"}]}})
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search",
+                      json={"p": 1, "ps": 1, "total": 0, "issues": [], "facets": [{"property": "severities", "values": []}]})
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config]
+        base_url = https://my-sonar-test-url.com
+        """)
+    report_service = ReportService(ApplicationLoader(sonar_configs), workers=1, queue_size=0)
+    yield report_service
+    report_service.close()
+
+
+@pytest.fixture
+def report_server_url(report_service):
+    server = ReportServer(("127.0.0.1", 0), report_service)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    server_thread.join()
+
+
+def post(url, body):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=body if isinstance(body, bytes) else body.encode(), method="POST")) as response:
+            return response.status, response.headers["Content-Type"], response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers["Content-Type"], e.read()
+
+
+def test_service_returns_prescription_status_of_posted_application(report_server_url):
+    status, content_type, body = post(report_server_url + "/prescription-status", APPLICATION_DESCRIPTION)
+    assert status == 200
+    assert content_type == "application/json"
+    assert json.loads(body) == {"name": "My test application", "version": "1.0.0",
+                                "prescription_status": "ALL_FUTURE_CRITERIA_VALIDATED"}
+
+
+def test_service_returns_pdf_report_of_posted_application(report_server_url):
+    status, content_type, body = post(report_server_url + "/reports", APPLICATION_DESCRIPTION)
+    assert status == 200
+    assert content_type == "application/pdf"
+    assert body.startswith(b"%PDF")
+
+
+def test_service_rejects_invalid_application_description(report_server_url):
+    status, _, body = post(report_server_url + "/reports", "application:\n  name: Without version\n")
+    assert status == 400
+    assert "Invalid application description" in json.loads(body)["error"]
+
+
+def test_service_rejects_application_description_that_is_not_utf8(report_server_url):
+    status, _, body = post(report_server_url + "/reports", b"\xff\xfe")
+    assert status == 400
+    assert "not valid UTF-8" in json.loads(body)["error"]
+
+
+@pytest.mark.parametrize("content_length", ["not-a-number", "-1"])
+def test_service_rejects_invalid_content_length(report_server_url, content_length):
+    connection = http.client.HTTPConnection(urllib.parse.urlparse(report_server_url).netloc)
+    connection.putrequest("POST", "/reports")
+    connection.putheader("Content-Length", content_length)
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 400
+    assert "Invalid Content-Length header" in json.loads(response.read())["error"]
+    connection.close()
+
+
+def test_report_service_warm_up_loads_svg_assets(report_service, monkeypatch):
+    from rte_sonar_reports import pdf
+    loaded = []
+    monkeypatch.setattr(pdf, "load_all_svg_assets", lambda: loaded.append(True))
+    report_service.warm_up()
+    assert loaded == [True]
+
+
+def test_service_rejects_reports_when_queue_is_full(report_service):
+    release = threading.Event()
+    blocking_request = report_service.submit(release.wait)
+    assert report_service.submit(release.wait) is None
+    release.set()
+    blocking_request.result()
+    assert report_service.submit(lambda: "done").result() == "done"
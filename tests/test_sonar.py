@@ -3,15 +3,19 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import configparser
+import urllib.parse
+from datetime import datetime
 
 import pytest
 
-from rte_sonar_reports.app import Rating, Module
+from rte_sonar_reports import sonar
+
+from rte_sonar_reports.app import Rating, Module, VulnerabilitySummary
 from rte_sonar_reports.loaders import ApplicationLoader
-from rte_sonar_reports.sonar import SonarClient, \
+from rte_sonar_reports.sonar import SonarClient, SonarClientRegistry, BranchCache, DEFAULT_POOL_SIZE, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, \
     MAINTAINABILITY_RATING_METRIC_KEY, LINES_TO_COVER_METRIC_KEY, \
     UNCOVERED_LINES_METRIC_KEY, CONDITIONS_TO_COVER_METRIC_KEY, \
-    UNCOVERED_CONDITIONS_METRIC_KEY
+    UNCOVERED_CONDITIONS_METRIC_KEY, SonarApiError
 
 FAKE_SONAR_CONFIG = {"base_url": "https://my-sonar-test-url.com",
                      "token": "my_sonar_token"}
@@ -172,6 +176,10 @@ def test_application_loading_with_sonar_configuration(requests_mock):
                                     "severity":"BLOCKER",
                                     "status":"OPEN","message":"Filename: ...",
                                     "type":"VULNERABILITY"
+                                    }],
+                                "facets": [{
+                                    "property": "severities",
+                                    "values": [{"val": "BLOCKER", "count": 1}, {"val": "MINOR", "count": 0}]
                                     }]
                                 }
                           """)
@@ -224,10 +232,26 @@ def test_application_loading_with_sonar_configuration(requests_mock):
                                     "severity":"MINOR",
                                     "status":"OPEN","message":"Filename: ...",
                                     "type":"VULNERABILITY"
+                                    }],
+                                "facets": [{
+                                    "property": "severities",
+                                    "values": [{"val": "BLOCKER", "count": 0}, {"val": "MINOR", "count": 1}]
                                     }]
                                 }
                           """)
-    app = ApplicationLoader(sonar_configs).load("""
+    requests_mock.get("https://my-sonar-test-url-v2.com/api/issues/search?rules=OWASP:UsingComponentWithKnownVulnerability",
+                      text="""{
+                                "p": 1,
+                                "ps": 100,
+                                "total": 0,
+                                "issues": [],
+                                "facets": [{
+                                    "property": "severities",
+                                    "values": [{"val": "BLOCKER", "count": 0}, {"val": "MINOR", "count": 0}]
+                                    }]
+                                }
+                          """)
+    app = ApplicationLoader(sonar_configs, batch_measures=False).load("""
         application:
           name: My complete test application
           version: 1.0.0
@@ -313,4 +337,351 @@ def test_sonar_get_all_vulnerabilities_with_multiple_pages(requests_mock):
                                         }
                                       """}])
     all_sorted_vulnerabilities = SonarClient(FAKE_SONAR_CONFIG).get_all_vulnerabilities_sorted(project_key, None)
-    assert len(all_sorted_vulnerabilities) == 3
\ No newline at end of file
+    assert len(all_sorted_vulnerabilities) == 3
+
+def test_sonar_client_session_is_configured_from_sonar_config():
+    sonar_client = SonarClient({"base_url": "https://my-sonar-test-url.com",
+                                "token": "my_sonar_token",
+                                "pool_size": "25"})
+    assert sonar_client.session.auth == ("my_sonar_token", SonarClient.EMPTY_PASSWORD_FIELD)
+    assert sonar_client.pool_size == 25
+    assert sonar_client.session.get_adapter("https://my-sonar-test-url.com")._pool_maxsize == 25
+
+
+def test_sonar_client_registry_reuses_one_client_per_sonar_config():
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config 1]
+        base_url = https://my-sonar-test-url-v1.com
+
+        [Sonar config 2]
+        base_url = https://my-sonar-test-url-v2.com
+        """)
+    registry = SonarClientRegistry(sonar_configs)
+    first_client = registry.get("Sonar config 1")
+    assert registry.get("Sonar config 1") is first_client
+    assert registry.get("Sonar config 2") is not first_client
+    assert registry.get("Sonar config 2").base_url == "https://my-sonar-test-url-v2.com"
+    assert first_client.pool_size == DEFAULT_POOL_SIZE
+
+
+def test_application_loading_reuses_sonar_session_for_modules_on_same_server(requests_mock):
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config]
+        base_url = https://my-sonar-test-url.com
+        token = my_sonar_token
+        """)
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/component",
+                      text="""{"component": {"key": "module", "measures": []}}""")
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search",
+                      text="""{"p": 1, "ps": 100, "total": 0, "issues": [], "facets": [{"property": "severities", "values": []}]}""")
+    loader = ApplicationLoader(sonar_configs)
+    app = loader.load("""
+        application:
+          name: My test application
+          version: 1.0.0
+          modules:
+            - name: First module
+              project_key: first_module
+              branch: main
+              sonar_config: Sonar config
+              type: backend
+            - name: Second module
+              project_key: second_module
+              branch: main
+              sonar_config: Sonar config
+              type: backend
+        """)
+    assert len(app.modules) == 2
+    assert list(loader.sonar_clients.clients.keys()) == ["Sonar config"]
+    assert all(request.headers["Authorization"].startswith("Basic ") for request in requests_mock.request_history)
+
+
+def test_sonar_get_all_vulnerabilities_fetches_next_pages_in_parallel_and_keeps_page_order(requests_mock):
+    project_key = "my_project_key"
+    number_of_pages = 6
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/issues/search",
+                      json={"p": 1, "ps": 500, "total": 500 * number_of_pages - 1,
+                            "issues": [{"key": "issue-1", "rule": "any", "severity": "MINOR"}]})
+    for page_num in range(2, number_of_pages + 1):
+        requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + f"/api/issues/search?p={page_num}",
+                          json={"p": page_num, "ps": 500, "total": 500 * number_of_pages - 1,
+                                "issues": [{"key": f"issue-{page_num}", "rule": "any", "severity": "MINOR"}]})
+    sonar_client = SonarClient({**FAKE_SONAR_CONFIG, "page_size": "500", "max_concurrency": "3"})
+    all_sorted_vulnerabilities = sonar_client.get_all_vulnerabilities_sorted(project_key, "main")
+    assert [vulnerability["key"] for vulnerability in all_sorted_vulnerabilities] == \
+           [f"issue-{page_num}" for page_num in range(1, number_of_pages + 1)]
+    assert all(request.qs["ps"] == ["500"] for request in requests_mock.request_history)
+
+
+@pytest.mark.parametrize(
+    "page_size_from_config, page_size",
+    [
+        (None, DEFAULT_PAGE_SIZE),
+        ("250", 250),
+        ("10000", MAX_PAGE_SIZE),
+    ]
+)
+def test_sonar_client_page_size_is_capped_to_maximum_allowed_by_sonar(page_size_from_config, page_size):
+    sonar_config = dict(FAKE_SONAR_CONFIG)
+    if page_size_from_config:
+        sonar_config["page_size"] = page_size_from_config
+    assert SonarClient(sonar_config).page_size == page_size
+
+
+def test_branch_cache_entries_expire_after_ttl(monkeypatch):
+    current_time = [100.0]
+    monkeypatch.setattr("rte_sonar_reports.sonar.time.monotonic", lambda: current_time[0])
+    branch_cache = BranchCache(ttl=60)
+    resolved_project_keys = []
+
+    def resolve(project_key):
+        resolved_project_keys.append(project_key)
+        return "main"
+
+    assert branch_cache.get_or_resolve("https://my-sonar-test-url.com", "my_project_key", resolve) == "main"
+    current_time[0] += 59
+    assert branch_cache.get_or_resolve("https://my-sonar-test-url.com", "my_project_key", resolve) == "main"
+    assert resolved_project_keys == ["my_project_key"]
+    current_time[0] += 2
+    assert branch_cache.get_or_resolve("https://my-sonar-test-url.com", "my_project_key", resolve) == "main"
+    assert resolved_project_keys == ["my_project_key", "my_project_key"]
+
+
+def test_application_loading_resolves_default_branch_once_per_server_and_project(requests_mock):
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config]
+        base_url = https://my-sonar-test-url.com
+        """)
+    requests_mock.get("https://my-sonar-test-url.com/api/project_branches/list",
+                      json={"branches": [{"name": "main", "isMain": True}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/search",
+                      json={"measures": [{"component": "backend", "metric": "sqale_rating", "value": "1.0"}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search",
+                      json={"p": 1, "ps": 100, "total": 0, "issues": [], "facets": [{"property": "severities", "values": []}]})
+    app = ApplicationLoader(sonar_configs).load("""
+        application:
+          name: My test application
+          version: 1.0.0
+          modules:
+            - name: First backend module
+              project_key: backend
+              sonar_config: Sonar config
+              type: backend
+            - name: Second backend module
+              project_key: backend
+              sonar_config: Sonar config
+              type: backend
+        """)
+    assert [module.branch_name for module in app.modules] == ["main", "main"]
+    branch_requests = [request for request in requests_mock.request_history
+                       if request.path == "/api/project_branches/list"]
+    assert len(branch_requests) == 1
+    assert all(request.qs["branch"] == ["main"] for request in requests_mock.request_history
+               if request.path == "/api/issues/search")
+
+
+@pytest.mark.parametrize("response_obj", [
+    {"p": 1, "ps": 1, "total": 4, "issues": []},
+    {"p": 1, "ps": 1, "total": 4, "issues": [], "facets": [{"property": "types", "values": []}]},
+    {"p": 1, "ps": 1, "total": 4, "issues": [], "facets": [{"property": "severities", "values": [{"val": "MAJOR", "count": 1}]}]},
+])
+def test_sonar_get_vulnerability_summary_fails_without_consistent_severities_facet(requests_mock, response_obj):
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/issues/search", json=response_obj)
+    with pytest.raises(SonarApiError, match="severities facet"):
+        SonarClient(FAKE_SONAR_CONFIG).get_vulnerability_summary("my_project_key", "main")
+    with pytest.raises(SonarApiError, match="severities facet"):
+        SonarClient(FAKE_SONAR_CONFIG).get_non_dependency_vulnerability_summary("my_project_key", "main")
+
+
+def test_sonar_get_vulnerability_summary_from_severities_facets(requests_mock):
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/issues/search",
+                      json={"p": 1, "ps": 1, "total": 12345,
+                            "issues": [{"rule": "any", "severity": "INFO"}],
+                            "facets": [{"property": "severities",
+                                        "values": [{"val": "BLOCKER", "count": 3}, {"val": "MAJOR", "count": 12000},
+                                                   {"val": "INFO", "count": 342}]}]})
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/issues/search?rules=OWASP:UsingComponentWithKnownVulnerability",
+                      json={"p": 1, "ps": 1, "total": 3,
+                            "issues": [{"rule": "OWASP:UsingComponentWithKnownVulnerability", "severity": "BLOCKER"}],
+                            "facets": [{"property": "severities",
+                                        "values": [{"val": "BLOCKER", "count": 3}, {"val": "MAJOR", "count": 0},
+                                                   {"val": "INFO", "count": 0}]}]})
+    summary = SonarClient(FAKE_SONAR_CONFIG).get_vulnerability_summary("my_project_key", "main")
+    assert summary.dependency_security_rating() == Rating.E
+    assert summary.non_dependency_security_rating() == Rating.C
+    assert len(requests_mock.request_history) == 2
+    assert all(request.qs["ps"] == ["1"] and request.qs["facets"] == ["severities"]
+               for request in requests_mock.request_history)
+
+
+def test_application_loading_with_vulnerability_details_keeps_all_vulnerabilities(requests_mock):
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config]
+        base_url = https://my-sonar-test-url.com
+        """)
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/component",
+                      json={"component": {"key": "backend", "measures": []}})
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search",
+                      json={"p": 1, "ps": 100, "total": 2,
+                            "issues": [{"rule": "any", "severity": "MAJOR"},
+                                       {"rule": "OWASP:UsingComponentWithKnownVulnerability", "severity": "MINOR"}]})
+    app = ApplicationLoader(sonar_configs, vulnerability_fetch_mode=ApplicationLoader.VulnerabilityFetchMode.DETAILS).load("""
+        application:
+          name: My test application
+          version: 1.0.0
+          modules:
+            - name: Backend module
+              project_key: backend
+              branch: main
+              sonar_config: Sonar config
+              type: backend
+        """)
+    assert len(app.modules[0].vulnerabilities) == 2
+    assert app.modules[0].non_dependency_security_rating() == Rating.C
+    assert app.modules[0].dependency_security_rating() == Rating.B
+    assert all("facets" not in request.qs for request in requests_mock.request_history)
+
+
+def test_sonar_get_all_default_branch_indicators_in_chunks_of_projects(requests_mock):
+    def measures_search(request, context):
+        return {"measures": [{"component": project_key, "metric": LINES_TO_COVER_METRIC_KEY, "value": project_key.split("_")[1]}
+                             for project_key in request.qs["projectkeys"][0].split(",")]}
+
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/measures/search", json=measures_search)
+    project_keys = [f"project_{index}" for index in range(120)]
+    indicators_by_project = SonarClient(FAKE_SONAR_CONFIG).get_all_default_branch_indicators(project_keys + ["project_0"])
+    assert len(requests_mock.request_history) == 3
+    assert sorted(len(request.qs["projectkeys"][0].split(",")) for request in requests_mock.request_history) == [20, 50, 50]
+    assert list(indicators_by_project.keys()) == project_keys
+    assert indicators_by_project["project_42"][LINES_TO_COVER_METRIC_KEY] == 42
+    assert indicators_by_project["project_42"][MAINTAINABILITY_RATING_METRIC_KEY] == Rating.NOT_CALCULATED
+
+
+def test_application_loading_batches_measures_of_modules_on_default_branch(requests_mock):
+    sonar_configs = configparser.ConfigParser()
+    sonar_configs.read_string("""
+        [Sonar config]
+        base_url = https://my-sonar-test-url.com
+        """)
+    requests_mock.get("https://my-sonar-test-url.com/api/project_branches/list",
+                      json={"branches": [{"name": "main", "isMain": True}, {"name": "v1.2", "isMain": False}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/search",
+                      json={"measures": [{"component": "backend", "metric": LINES_TO_COVER_METRIC_KEY, "value": "100"},
+                                         {"component": "frontend", "metric": LINES_TO_COVER_METRIC_KEY, "value": "200"}]})
+    requests_mock.get("https://my-sonar-test-url.com/api/measures/component",
+                      json={"component": {"key": "backend", "measures": [{"metric": LINES_TO_COVER_METRIC_KEY, "value": "300"}]}})
+    requests_mock.get("https://my-sonar-test-url.com/api/issues/search",
+                      json={"p": 1, "ps": 100, "total": 0, "issues": [], "facets": [{"property": "severities", "values": []}]})
+    app = ApplicationLoader(sonar_configs).load("""
+        application:
+          name: My test application
+          version: 1.0.0
+          modules:
+            - name: Backend module
+              project_key: backend
+              sonar_config: Sonar config
+              type: backend
+            - name: Frontend module
+              project_key: frontend
+              sonar_config: Sonar config
+              type: frontend
+            - name: Backend module on main branch
+              project_key: backend
+              branch: main
+              sonar_config: Sonar config
+              type: backend
+            - name: Backend module on release branch
+              project_key: backend
+              branch: v1.2
+              sonar_config: Sonar config
+              type: backend
+        """)
+    assert [module.lines_to_cover for module in app.modules] == [100, 200, 100, 300]
+    measures_requests = [request for request in requests_mock.request_history if request.path.startswith("/api/measures/")]
+    assert [(request.path, request.qs.get("projectkeys"), request.qs.get("branch")) for request in measures_requests] == \
+           [("/api/measures/search", ["backend,frontend"], None), ("/api/measures/component", None, ["v1.2"])]
+
+
+def stub_issues_search(issues):
+    def issues_search(request, context):
+        query = {key: values[0] for key, values in urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query).items()}
+        matching_issues = [issue for issue in issues
+                           if ("severities" not in query or issue["severity"] == query["severities"])
+                           and ("createdAfter" not in query or parse_search_date(issue["creationDate"]) >= parse_search_date(query["createdAfter"]))
+                           and ("createdBefore" not in query or parse_search_date(issue["creationDate"]) < parse_search_date(query["createdBefore"]))]
+        page_num, page_size = int(query.get("p", 1)), int(query["ps"])
+        assert page_num * page_size <= sonar.SEARCH_RESULTS_LIMIT
+        return {"p": page_num, "ps": page_size, "total": len(matching_issues),
+                "issues": matching_issues[(page_num - 1) * page_size:page_num * page_size]}
+    return issues_search
+
+
+def parse_search_date(value):
+    return datetime.strptime(value, sonar.SEARCH_DATE_FORMAT)
+
+
+def test_sonar_get_all_vulnerabilities_splits_searches_over_results_limit(requests_mock, monkeypatch):
+    monkeypatch.setattr(sonar, "SEARCH_RESULTS_LIMIT", 10)
+    issues = [{"key": f"issue-{issue_num}", "severity": "MAJOR" if issue_num % 4 else "MINOR",
+               "creationDate": f"2020-01-{issue_num % 28 + 1:02d}T{issue_num % 24:02d}:00:00+0000"} for issue_num in range(60)]
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/issues/search", json=stub_issues_search(issues))
+    sonar_client = SonarClient({**FAKE_SONAR_CONFIG, "page_size": "5"})
+    vulnerabilities = sonar_client.get_all_vulnerabilities_sorted("my_project_key", "main")
+    assert sorted(vulnerability["key"] for vulnerability in vulnerabilities) == sorted(issue["key"] for issue in issues)
+
+
+def test_sonar_get_all_vulnerabilities_keeps_outermost_search_slices_open_ended(requests_mock, monkeypatch):
+    monkeypatch.setattr(sonar, "SEARCH_RESULTS_LIMIT", 10)
+    issues = [{"key": f"issue-{issue_num}", "severity": "MAJOR",
+               "creationDate": f"2020-01-{issue_num % 28 + 1:02d}T00:00:00+0000"} for issue_num in range(20)]
+    issues += [{"key": "imported-issue", "severity": "MAJOR", "creationDate": "1995-06-01T00:00:00+0000"},
+               {"key": "clock-skewed-issue", "severity": "MAJOR", "creationDate": "2999-01-01T00:00:00+0000"}]
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/issues/search", json=stub_issues_search(issues))
+    sonar_client = SonarClient({**FAKE_SONAR_CONFIG, "page_size": "5"})
+    vulnerabilities = sonar_client.get_all_vulnerabilities_sorted("my_project_key", "main")
+    assert sorted(vulnerability["key"] for vulnerability in vulnerabilities) == sorted(issue["key"] for issue in issues)
+
+
+def test_sonar_get_all_vulnerabilities_truncates_searches_that_cannot_be_split(requests_mock, monkeypatch, caplog):
+    monkeypatch.setattr(sonar, "SEARCH_RESULTS_LIMIT", 10)
+    issues = [{"key": f"issue-{issue_num}", "severity": "MAJOR", "creationDate": "2020-01-01T00:00:00+0000"}
+              for issue_num in range(12)]
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/issues/search", json=stub_issues_search(issues))
+    sonar_client = SonarClient({**FAKE_SONAR_CONFIG, "page_size": "5"})
+    vulnerabilities = sonar_client.get_all_vulnerabilities_sorted("my_project_key", "main")
+    assert [vulnerability["key"] for vulnerability in vulnerabilities] == [f"issue-{issue_num}" for issue_num in range(10)]
+    assert "only the first ones are retrieved" in caplog.text
+
+
+def test_sonar_get_streamed_vulnerability_summary_folds_all_pages(requests_mock, monkeypatch):
+    monkeypatch.setattr(sonar, "SEARCH_RESULTS_LIMIT", 10)
+    issues = [{"key": f"issue-{issue_num}", "severity": "MAJOR" if issue_num % 3 else "BLOCKER",
+               "rule": "OWASP:UsingComponentWithKnownVulnerability" if issue_num % 5 == 0 else "any",
+               "creationDate": f"2020-02-{issue_num % 28 + 1:02d}T00:00:00+0000"} for issue_num in range(40)]
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/issues/search", json=stub_issues_search(issues))
+    sonar_client = SonarClient({**FAKE_SONAR_CONFIG, "page_size": "5"})
+    vulnerability_summary = sonar_client.get_streamed_vulnerability_summary("my_project_key", "main")
+    assert vulnerability_summary.to_dict() == VulnerabilitySummary.from_vulnerabilities(issues).to_dict()
+    assert vulnerability_summary.dependency_security_rating() == Rating.E
+
+
+def test_sonar_get_measures_history_fetches_all_pages_newer_than_last_point(requests_mock, monkeypatch):
+    monkeypatch.setattr(sonar, "HISTORY_PAGE_SIZE", 2)
+
+    def search_history(request, context):
+        page = int(request.qs["p"][0])
+        dates = ["2025-01-01T10:00:00+0000", "2025-01-02T10:00:00+0000", "2025-01-03T12:00:00+0200"][2 * (page - 1):2 * page]
+        return {"paging": {"pageIndex": page, "pageSize": 2, "total": 3},
+                "measures": [{"metric": LINES_TO_COVER_METRIC_KEY, "history": [{"date": date, "value": "10"} for date in dates]},
+                             {"metric": UNCOVERED_LINES_METRIC_KEY, "history": [{"date": date} for date in dates]}]}
+
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/measures/search_history", json=search_history)
+    points = SonarClient(FAKE_SONAR_CONFIG).get_measures_history("my_project_key", "main", "2025-01-01T10:00:00+0000")
+    assert points == [("2025-01-02T10:00:00+0000", LINES_TO_COVER_METRIC_KEY, "10"),
+                      ("2025-01-03T10:00:00+0000", LINES_TO_COVER_METRIC_KEY, "10")]
+    assert sorted(request.qs["p"][0] for request in requests_mock.request_history) == ["1", "2"]
+    assert all(request.qs["branch"] == ["main"] for request in requests_mock.request_history)
@@ -0,0 +1,190 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import asyncio
+import configparser
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from rte_sonar_reports.app import Rating, Module
+from rte_sonar_reports.cache import ModuleSnapshotStore, MetricHistoryStore
+from rte_sonar_reports.loaders import ApplicationLoader
+from rte_sonar_reports.sonar import MAINTAINABILITY_RATING_METRIC_KEY, LINES_TO_COVER_METRIC_KEY, \
+    UNCOVERED_LINES_METRIC_KEY
+from rte_sonar_reports.sonar_async import AsyncSonarClient
+
+ISSUES_PAGES = {
+    "1": {"p": 1, "ps": 2, "total": 3, "issues": [
+        {"rule": "OWASP:UsingComponentWithKnownVulnerability", "severity": "CRITICAL"},
+        {"rule": "any", "severity": "MINOR"}]},
+    "2": {"p": 2, "ps": 2, "total": 3, "issues": [
+        {"rule": "OWASP:UsingComponentWithKnownVulnerability", "severity": "INFO"}]},
+}
+
+
+def stub_sonar_application(received_requests):
+    async def project_branches(request):
+        received_requests.append(request)
+        return web.json_response({"branches": [{"name": "develop", "isMain": False},
+                                               {"name": "main", "isMain": True, "analysisDate": "2025-01-02T10:00:00+0000"}]})
+
+    async def measures(request):
+        received_requests.append(request)
+        return web.json_response({"component": {"key": request.query["component"], "measures": [
+            {"metric": MAINTAINABILITY_RATING_METRIC_KEY, "value": "2.0"},
+            {"metric": LINES_TO_COVER_METRIC_KEY, "value": "100"},
+            {"metric": UNCOVERED_LINES_METRIC_KEY, "value": "25"}]}})
+
+    async def measures_search(request):
+        received_requests.append(request)
+        return web.json_response({"measures": [
+            {"component": project_key, "metric": MAINTAINABILITY_RATING_METRIC_KEY, "value": "2.0"}
+            for project_key in request.query["projectKeys"].split(",")]})
+
+    async def issues(request):
+        received_requests.append(request)
+        if "facets" not in request.query:
+            return web.json_response(ISSUES_PAGES[request.query.get("p", "1")])
+        severity_counts = {}
+        for page in ISSUES_PAGES.values():
+            for issue in page["issues"]:
+                if request.query.get("rules", issue["rule"]) == issue["rule"]:
+                    severity_counts[issue["severity"]] = severity_counts.get(issue["severity"], 0) + 1
+        return web.json_response({"p": 1, "ps": 1, "total": sum(severity_counts.values()), "issues": [],
+                                  "facets": [{"property": "severities", "values": [
+                                      {"val": severity, "count": count} for severity, count in severity_counts.items()]}]})
+
+    async def measures_history(request):
+        received_requests.append(request)
+        return web.json_response({"paging": {"pageIndex": 1, "pageSize": 1000, "total": 1}, "measures": [
+            {"metric": LINES_TO_COVER_METRIC_KEY, "history": [{"date": "2025-01-02T10:00:00+0000", "value": "100"}]}]})
+
+    stub_application = web.Application()
+    stub_application.router.add_get("/api/project_branches/list", project_branches)
+    stub_application.router.add_get("/api/measures/component", measures)
+    stub_application.router.add_get("/api/measures/search", measures_search)
+    stub_application.router.add_get("/api/issues/search", issues)
+    stub_application.router.add_get("/api/measures/search_history", measures_history)
+    return stub_application
+
+
+async def with_stub_sonar_server(received_requests, test):
+    async with TestServer(stub_sonar_application(received_requests)) as server:
+        return await test(str(server.make_url("")).rstrip("/"))
+
+
+def test_async_sonar_client_retrieves_default_branch_indicators_and_all_vulnerabilities():
+    received_requests = []
+
+    async def test(base_url):
+        sonar_client = AsyncSonarClient({"base_url": base_url, "token": "my_sonar_token"})
+        try:
+            return (await sonar_client.find_default_branch("my_project_key"),
+                    await sonar_client.get_all_indicators("my_project_key", "main"),
+                    await sonar_client.get_all_vulnerabilities_sorted("my_project_key", "main"))
+        finally:
+            await sonar_client.close()
+
+    branch_name, indicators, vulnerabilities = asyncio.run(with_stub_sonar_server(received_requests, test))
+    assert branch_name == "main"
+    assert indicators[MAINTAINABILITY_RATING_METRIC_KEY] == Rating.B
+    assert indicators[LINES_TO_COVER_METRIC_KEY] == 100
+    assert indicators[UNCOVERED_LINES_METRIC_KEY] == 25
+    assert [vulnerability["severity"] for vulnerability in vulnerabilities] == ["CRITICAL", "MINOR", "INFO"]
+    assert all(request.headers["Authorization"].startswith("Basic ") for request in received_requests)
+
+
+def test_application_async_loading_keeps_description_order():
+    received_requests = []
+
+    async def test(base_url):
+        sonar_configs = configparser.ConfigParser()
+        sonar_configs.read_string(f"""
+            [Sonar config]
+            base_url = {base_url}
+            max_concurrency = 2
+            """)
+        return await ApplicationLoader(sonar_configs).load_async("""
+            application:
+              name: My test application
+              version: 1.0.0
+              modules:
+                - name: Backend module
+                  project_key: backend_module
+                  sonar_config: Sonar config
+                  type: backend
+                - name: Frontend module
+                  project_key: frontend_module
+                  branch: develop
+                  sonar_config: Sonar config
+                  type: frontend
+                - name: Unknown module
+                  project_key: unknown_module
+                  sonar_config: Unknown config
+                  type: other
+            """)
+
+    app = asyncio.run(with_stub_sonar_server(received_requests, test))
+    assert [module.name for module in app.modules] == ["Backend module", "Frontend module", "Unknown module"]
+    assert app.modules[0].branch_name == "main"
+    assert app.modules[0].module_type == Module.Type.BACKEND
+    assert app.modules[0].maintainability_rating == Rating.B
+    assert app.modules[0].dependency_security_rating() == Rating.D
+    assert app.modules[0].non_dependency_security_rating() == Rating.B
+    assert app.modules[1].branch_name == "develop"
+    assert app.modules[2].maintainability_rating == Rating.NOT_CALCULATED
+    assert app.modules[2].non_dependency_security_rating() == Rating.NOT_CALCULATED
+    assert [request.query["projectKeys"] for request in received_requests
+            if request.path == "/api/measures/search"] == ["backend_module"]
+    assert [request.query["branch"] for request in received_requests
+            if request.path == "/api/measures/component"] == ["develop"]
+
+
+def test_async_sonar_client_streams_vulnerability_pages_into_summary():
+    received_requests = []
+
+    async def test(base_url):
+        sonar_client = AsyncSonarClient({"base_url": base_url, "token": "my_sonar_token"})
+        try:
+            return await sonar_client.get_streamed_vulnerability_summary("my_project_key", "main")
+        finally:
+            await sonar_client.close()
+
+    vulnerability_summary = asyncio.run(with_stub_sonar_server(received_requests, test))
+    assert vulnerability_summary.dependency_severity_counts == {"CRITICAL": 1, "INFO": 1}
+    assert vulnerability_summary.non_dependency_severity_counts == {"MINOR": 1}
+    assert [request.query.get("p", "1") for request in received_requests] == ["1", "2"]
+
+
+def test_application_async_loading_uses_snapshot_and_history_stores(tmp_path):
+    received_requests = []
+    snapshot_store = ModuleSnapshotStore(str(tmp_path / "snapshots.db"))
+    history_store = MetricHistoryStore(str(tmp_path / "history.db"))
+
+    async def test(base_url):
+        sonar_configs = configparser.ConfigParser()
+        sonar_configs.read_string(f"""
+            [Sonar config]
+            base_url = {base_url}
+            """)
+        application_description = """
+            application:
+              name: My test application
+              version: 1.0.0
+              modules:
+                - name: Backend module
+                  project_key: backend_module
+                  sonar_config: Sonar config
+                  type: backend
+            """
+        await ApplicationLoader(sonar_configs, snapshot_store=snapshot_store, history_store=history_store).load_async(application_description)
+        received_requests.clear()
+        return await ApplicationLoader(sonar_configs, snapshot_store=snapshot_store,
+                                       history_store=history_store).load_async(application_description)
+
+    app = asyncio.run(with_stub_sonar_server(received_requests, test))
+    assert app.modules[0].maintainability_rating == Rating.B
+    assert app.modules[0].history[LINES_TO_COVER_METRIC_KEY] == [["2025-01-02T10:00:00+0000", "100"]]
+    assert [request.path for request in received_requests] == ["/api/project_branches/list", "/api/measures/search_history"]
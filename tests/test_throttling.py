@@ -0,0 +1,87 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import email.utils
+import time
+
+import pytest
+
+from rte_sonar_reports.sonar import SonarClient, SonarApiError
+from rte_sonar_reports.throttling import AdaptiveRateLimiter, retry_after_delay, backoff_delay, BACKOFF_MAX_DELAY
+
+FAKE_SONAR_CONFIG = {"base_url": "https://my-sonar-test-url.com",
+                     "token": "my_sonar_token"}
+BRANCHES_RESPONSE = {"branches": [{"name": "main", "isMain": True}]}
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded_sleeps = []
+    monkeypatch.setattr(time, "sleep", recorded_sleeps.append)
+    return recorded_sleeps
+
+
+def test_retry_after_delay_accepts_seconds_and_http_dates():
+    assert retry_after_delay("3") == 3
+    assert retry_after_delay(None) is None
+    assert retry_after_delay("soon") is None
+    assert 8 < retry_after_delay(email.utils.formatdate(time.time() + 10, usegmt=True)) <= 10
+    assert retry_after_delay(email.utils.formatdate(time.time() - 10, usegmt=True)) == 0
+
+
+def test_retry_after_delay_is_capped():
+    assert retry_after_delay("86400") == BACKOFF_MAX_DELAY
+    assert retry_after_delay(email.utils.formatdate(time.time() + 86400, usegmt=True)) == BACKOFF_MAX_DELAY
+
+
+def test_backoff_delay_is_capped():
+    assert all(0 <= backoff_delay(attempt) <= BACKOFF_MAX_DELAY for attempt in range(20))
+
+
+def test_rate_limiter_spaces_requests_and_slows_down_when_throttled():
+    rate_limiter = AdaptiveRateLimiter(requests_per_second=10)
+    assert rate_limiter.reserve() == 0
+    assert rate_limiter.reserve() == pytest.approx(0.1, abs=0.01)
+    rate_limiter.on_throttled(2)
+    assert rate_limiter.rate == 5
+    assert rate_limiter.reserve() == pytest.approx(2, abs=0.01)
+    for _ in range(100):
+        rate_limiter.on_success()
+    assert rate_limiter.rate == 10
+
+
+def test_rate_limiter_without_rate_only_pauses_when_throttled():
+    rate_limiter = AdaptiveRateLimiter()
+    assert rate_limiter.reserve() == 0
+    rate_limiter.on_throttled(1)
+    assert rate_limiter.reserve() == pytest.approx(1, abs=0.01)
+
+
+def test_sonar_client_retries_after_throttling(requests_mock, sleeps):
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/project_branches/list",
+                      [{"status_code": 429, "headers": {"Retry-After": "2"}},
+                       {"status_code": 503},
+                       {"json": BRANCHES_RESPONSE}])
+    sonar_client = SonarClient(FAKE_SONAR_CONFIG)
+    assert sonar_client.find_default_branch("my_project_key") == "main"
+    assert requests_mock.call_count == 3
+    assert sleeps[0] == pytest.approx(2, abs=0.01)
+
+
+def test_sonar_client_gives_up_after_max_retries(requests_mock, sleeps):
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/project_branches/list", status_code=429)
+    sonar_client = SonarClient({**FAKE_SONAR_CONFIG, "max_retries": "2"})
+    with pytest.raises(SonarApiError) as error:
+        sonar_client.find_default_branch("my_project_key")
+    assert error.value.status_code == 429
+    assert requests_mock.call_count == 3
+
+
+def test_sonar_client_reports_client_errors_without_retrying(requests_mock, sleeps):
+    requests_mock.get(FAKE_SONAR_CONFIG["base_url"] + "/api/project_branches/list", status_code=404,
+                      json={"errors": [{"msg": "Project 'my_project_key' not found"}]})
+    sonar_client = SonarClient(FAKE_SONAR_CONFIG)
+    with pytest.raises(SonarApiError, match="404.*not found"):
+        sonar_client.find_default_branch("my_project_key")
+    assert requests_mock.call_count == 1